@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+
+# Executa o controller no próprio processo, com os dados em um diretório temporário
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+
+DATA_FILES = (os.path.join("server", "data", "feira_de_santana_stations.csv"),
+              os.path.join("server", "data", "car_models.json"))
+
+
+def batch(controller, items, **options):
+    """Envia um BATCH pelo route_request e retorna as respostas dos itens."""
+    response = controller.route_request({
+        "type": "BATCH", "data": {"requests": items, **options},
+        "status": {"code": 200, "message": ""}, "timestamp": ""
+    })
+    return response["data"]["responses"]
+
+
+def login(user_name):
+    return {"type": "LOGIN", "data": {"user_name": user_name, "selected_car": "Tesla Model 3", "battery_car": 30}}
+
+
+def check_references(controller):
+    """Referências válidas são resolvidas; textos com "$" fora da gramática passam sem alteração."""
+    problems = []
+
+    # Valores literais começando com "$" não são referências
+    for user_name in ("$bob", "$", "$1", "$0.", "$user_id_x", "$$user_id"):
+        responses = batch(controller, [login(user_name)])
+        if responses[0]["status"]["code"] != 200:
+            problems.append(f"LOGIN com user_name {user_name!r}: {responses[0]['status']}")
+
+    navigation = {"type": "NAVIGATION", "data": {"user_id": None, "route_distance": 5}}
+    for reference in ("$user_id", "$0.user_id"):
+        item = {**navigation, "data": {**navigation["data"], "user_id": reference}}
+        responses = batch(controller, [login("ref"), item])
+        if responses[1]["status"]["code"] != 200:
+            problems.append(f"referência {reference}: {responses[1]['status']}")
+
+    # Referências bem formadas que não apontam para nada continuam sendo erro
+    for reference in ("$user_id", "$3.user_id", "$0.missing"):
+        item = {**navigation, "data": {**navigation["data"], "user_id": reference}}
+        items = [item] if reference == "$user_id" else [login("ref"), item]
+        code = batch(controller, items)[-1]["status"]["code"]
+        if code != 400:
+            problems.append(f"referência inválida {reference} retornou {code}")
+    return problems
+
+
+def main():
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "server", "data"))
+        for path in DATA_FILES:
+            shutil.copy(os.path.join(ROOT_DIR, path), os.path.join(work_dir, path))
+        os.chdir(work_dir)
+
+        controller = importlib.import_module("controller")
+        controller.load_station_state()
+        controller.start_services()
+        try:
+            problems = check_references(controller)
+        finally:
+            controller.shutdown()
+            os.chdir(ROOT_DIR)
+
+    if problems:
+        for problem in problems:
+            print(f"FALHA: {problem}")
+        sys.exit(1)
+    print("OK: referências do BATCH resolvidas e valores literais com \"$\" preservados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+# Exercita o StationStore do servidor diretamente, sem rede
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+from store.station_store import StationStore
+from store.journal import StationJournal
+from store.slot_table import SharedSlotTable
+from utils.metrics import metrics
+
+
+def create_stations(stations_dir, count, slots):
+    """Grava `count` postos com `slots` vagas cada no diretório de snapshot."""
+    os.makedirs(stations_dir, exist_ok=True)
+    for station_id in range(1, count + 1):
+        station_data = {"id": station_id, "max_slots": slots, "available_slots": slots, "vehicles": {}}
+        with open(os.path.join(stations_dir, f"station_{station_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(station_data, f)
+
+
+def hammer(store, worker, args):
+    """Reserva e libera vagas em um punhado de postos. Retorna as operações confirmadas pelo store."""
+    rng = random.Random(f"{args.seed}-{worker}")
+    station_ids = store.station_ids()
+    reserved, released, held, holds = [], [], [], []
+    for operation in range(args.operations):
+        if held and rng.random() < args.release_rate:
+            station_id, user_id = held.pop(rng.randrange(len(held)))
+            station_data = store.release(station_id, [user_id])
+            if user_id in station_data["vehicles"]:
+                raise AssertionError(f"{user_id} continua no posto {station_id} após a liberação")
+            released.append((station_id, user_id))
+        else:
+            station_id = rng.choice(station_ids)
+            user_id = f"{worker}-{operation}"
+            if rng.random() < args.hold_rate:
+                # Pré-reserva seguida de confirmação: a confirmação nunca pode falhar por falta de vaga
+                if not store.reserve(station_id, user_id, 1e12, hold=True):
+                    continue
+                holds.append((station_id, user_id))
+                if not store.reserve(station_id, user_id, 1e12 + operation):
+                    raise AssertionError(f"pré-reserva de {user_id} no posto {station_id} não confirmada")
+                reserved.append((station_id, user_id))
+                held.append((station_id, user_id))
+            elif store.reserve(station_id, user_id, 1e12 + operation):
+                reserved.append((station_id, user_id))
+                held.append((station_id, user_id))
+    return reserved, released, holds
+
+
+def run_threads(store, args, prefix):
+    """Executa `args.threads` threads concorrentes sobre o mesmo store."""
+    results, errors = [], []
+
+    def target(index):
+        try:
+            results.append(hammer(store, f"{prefix}t{index}", args))
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reserved = [op for result in results for op in result[0]]
+    released = [op for result in results for op in result[1]]
+    holds = [op for result in results for op in result[2]]
+    return reserved, released, holds, errors
+
+
+def run_process(store, journal_dir, args, index, queue):
+    """Processo filho: journal próprio, mesma tabela compartilhada (como no modo --workers)."""
+    journal = StationJournal(journal_dir, name=f"stations-p{index}")
+    journal.open()
+    store.journal = journal
+    reserved, released, holds, errors = run_threads(store, args, f"p{index}")
+    journal.close()
+    queue.put((reserved, released, holds, errors, metrics.counter("station_cas_retries_total")))
+
+
+def verify(store, reserved, released, holds):
+    """Confere vagas e veículos de cada posto contra as operações confirmadas."""
+    expected = {}
+    for station_id, user_id in reserved:
+        expected.setdefault(station_id, set()).add(user_id)
+    for station_id, user_id in released:
+        expected[station_id].discard(user_id)
+
+    problems = []
+    for station_id in store.station_ids():
+        station_data = store.get_station(station_id)
+        vehicles = set(station_data["vehicles"])
+        occupied = station_data["max_slots"] - station_data["available_slots"]
+        if len(vehicles) > station_data["max_slots"] or station_data["available_slots"] < 0:
+            problems.append(f"posto {station_id}: vagas reservadas em dobro ({len(vehicles)} veículos)")
+        if occupied != len(vehicles):
+            problems.append(f"posto {station_id}: {occupied} vagas ocupadas para {len(vehicles)} veículos (vaga perdida)")
+        if vehicles != expected.get(station_id, set()):
+            missing = expected.get(station_id, set()) - vehicles
+            extra = vehicles - expected.get(station_id, set())
+            problems.append(f"posto {station_id}: reservas perdidas {sorted(missing)[:5]}, inesperadas {sorted(extra)[:5]}")
+        writes = sum(1 for operations in (reserved, released, holds) for s, _ in operations if s == station_id)
+        if station_data["version"] != writes:
+            problems.append(f"posto {station_id}: versão {station_data['version']} para {writes} escritas")
+    return problems
+
+
+def verify_recovery(store, stations_dir, journal_dir):
+    """Reconstrói o estado a partir do snapshot inicial + journal e compara com a memória."""
+    recovered = StationStore(stations_dir)
+    recovered.load()
+    recovered.recover(StationJournal(journal_dir))
+    problems = []
+    for station_id in store.station_ids():
+        live, replayed = store.get_station(station_id), recovered.get_station(station_id)
+        for field in ("version", "available_slots", "vehicles"):
+            if live[field] != replayed[field]:
+                problems.append(f"posto {station_id}: {field} diverge após reaplicar o journal")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica reservas concorrentes no StationStore (sem vagas perdidas ou duplicadas)")
+    parser.add_argument("--stations", type=int, default=3, help="Quantidade de postos disputados")
+    parser.add_argument("--slots", type=int, default=4, help="Vagas por posto")
+    parser.add_argument("--threads", type=int, default=16, help="Threads por processo")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Processos com a tabela de vagas compartilhada (como --workers do servidor)")
+    parser.add_argument("--operations", type=int, default=2000, help="Operações por thread")
+    parser.add_argument("--release-rate", type=float, default=0.5, help="Probabilidade de liberar uma vaga em vez de reservar")
+    parser.add_argument("--hold-rate", type=float, default=0.3,
+                        help="Fração das reservas feitas como pré-reserva seguida de confirmação")
+    parser.add_argument("--seed", type=int, default=1, help="Semente das operações")
+    args = parser.parse_args()
+
+    # Trocas de thread frequentes aumentam a disputa entre leitura e compare-and-swap
+    sys.setswitchinterval(1e-6)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stations_dir = os.path.join(tmp_dir, "stations")
+        journal_dir = os.path.join(tmp_dir, "journal")
+        create_stations(stations_dir, args.stations, args.slots)
+        store = StationStore(stations_dir)
+        store.load()
+
+        if args.processes > 1:
+            store.share(SharedSlotTable(store.stations, lock_file=os.path.join(journal_dir, "stations.lock")))
+            context = multiprocessing.get_context("fork")
+            queue = context.Queue()
+            processes = [context.Process(target=run_process, args=(store, journal_dir, args, index, queue))
+                         for index in range(args.processes)]
+            for process in processes:
+                process.start()
+            outcomes = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            reserved = [op for outcome in outcomes for op in outcome[0]]
+            released = [op for outcome in outcomes for op in outcome[1]]
+            holds = [op for outcome in outcomes for op in outcome[2]]
+            errors = [error for outcome in outcomes for error in outcome[3]]
+            retries = sum(outcome[4] for outcome in outcomes)
+        else:
+            journal = StationJournal(journal_dir)
+            journal.open()
+            store.journal = journal
+            reserved, released, holds, errors = run_threads(store, args, "")
+            journal.close()
+            retries = metrics.counter("station_cas_retries_total")
+
+        problems = errors + verify(store, reserved, released, holds) + verify_recovery(store, stations_dir, journal_dir)
+
+    print(f"Reservas: {len(reserved)} ({len(holds)} via pré-reserva)  Liberações: {len(released)}  Conflitos de compare-and-swap: {retries}")
+    if problems:
+        for problem in problems:
+            print(f"FALHA: {problem}")
+        sys.exit(1)
+    print("OK: nenhuma vaga perdida ou reservada em dobro; o journal reproduz o estado final")
+
+
+if __name__ == "__main__":
+    main()
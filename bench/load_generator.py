@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows: sem ajuste do limite de descritores
+    resource = None
+
+# Reaproveita o cabeçalho e os códigos de tipo do formato binário do servidor
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+from utils.wire import HEADER, TYPE_CODES, TYPE_NAMES
+
+# Catálogo copiado para o diretório temporário do servidor iniciado com --spawn-server
+DATA_FILES = (os.path.join("server", "data", "feira_de_santana_stations.csv"),
+              os.path.join("server", "data", "car_models.json"))
+
+# Cenários disponíveis para --mix
+SCENARIOS = ["journey", "start", "nearest", "status"]
+
+
+class Stats:
+    def __init__(self):
+        """Latências (segundos) e erros por tipo de requisição."""
+        self.latencies = {}
+        self.errors = {}
+        self.journeys = 0
+        self.connection_errors = 0
+
+    def record(self, request_type, latency, status_code):
+        self.latencies.setdefault(request_type, []).append(latency)
+        if status_code >= 400:
+            self.errors[request_type] = self.errors.get(request_type, 0) + 1
+
+    def report(self, elapsed):
+        """Resumo com vazão e percentis por tipo de requisição."""
+        total = sum(len(values) for values in self.latencies.values())
+        types = {}
+        for request_type, values in sorted(self.latencies.items()):
+            values.sort()
+            types[request_type] = {
+                "count": len(values),
+                "errors": self.errors.get(request_type, 0),
+                "throughput": len(values) / elapsed,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "p999_ms": percentile(values, 99.9) * 1000,
+                "max_ms": values[-1] * 1000
+            }
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "throughput": total / elapsed,
+            "journeys": self.journeys,
+            "connection_errors": self.connection_errors,
+            "types": types
+        }
+
+
+def percentile(sorted_values, p):
+    """Percentil por posto mais próximo sobre uma lista ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(text):
+    """Converte 'journey=70,start=10,...' em (cenários, pesos)."""
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"cenário desconhecido: {name} (use {', '.join(SCENARIOS)})")
+        try:
+            weights[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"peso inválido para {name}: {weight}")
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError("o mix precisa de ao menos um peso positivo")
+    return list(weights), list(weights.values())
+
+
+class Connection:
+    def __init__(self, reader, writer, encoding=None):
+        """Conexão de cliente que envia requisições encadeadas e lê as respostas em ordem."""
+        self.reader = reader
+        self.writer = writer
+        self.encoding = encoding  # Codificação binária negociada; None = JSON por linha
+        if encoding == "msgpack":
+            import msgpack
+            self.dumps, self.loads = msgpack.packb, msgpack.unpackb
+        else:
+            self.dumps = lambda data: json.dumps(data, separators=(",", ":")).encode("utf-8")
+            self.loads = json.loads
+
+    @classmethod
+    async def open(cls, host, port, binary):
+        reader, writer = await asyncio.open_connection(host, port, limit=16 * 1024 * 1024)
+        if not binary:
+            return cls(reader, writer)
+        hello = {"type": "HELLO", "data": {"protocol": "binary"}, "status": {"code": 0, "message": ""}, "timestamp": ""}
+        writer.write(json.dumps(hello).encode("utf-8") + b"\n")
+        response = json.loads(await reader.readline())
+        if response["data"].get("protocol") != "binary":
+            writer.close()
+            raise RuntimeError("servidor recusou o formato binário")
+        return cls(reader, writer, response["data"]["encoding"])
+
+    def encode(self, request_type, data):
+        if self.encoding:
+            body = self.dumps(data)
+            return HEADER.pack(len(body), TYPE_CODES[request_type], 0) + body
+        envelope = {
+            "type": request_type,
+            "data": data,
+            "status": {"code": 0, "message": ""},
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        }
+        return json.dumps(envelope).encode("utf-8") + b"\n"
+
+    async def read_response(self):
+        """Retorna (tipo, código de status, data) da próxima resposta."""
+        if self.encoding:
+            length, type_code, status_code = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+            data, _ = self.loads(await self.reader.readexactly(length))
+            return TYPE_NAMES.get(type_code, "error"), status_code, data
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("conexão encerrada pelo servidor")
+        response = json.loads(line)
+        return response["type"], response["status"]["code"], response["data"]
+
+    def close(self):
+        self.writer.close()
+
+
+class SimulatedClient:
+    def __init__(self, catalog, args, rng):
+        """Cliente simulado: cada cenário é um gerador cujo passo seguinte depende da resposta anterior."""
+        self.catalog = catalog
+        self.args = args
+        self.rng = rng
+        self.scenario = None
+        self.steps = None
+        self.journeys = 0  # Jornadas concluídas até o PAYMENT
+
+    def next_request(self, last_response):
+        """Próxima requisição (tipo, data), iniciando um novo cenário quando o atual termina."""
+        if self.steps is not None:
+            try:
+                return self.steps.send(last_response)
+            except StopIteration:
+                pass
+        names, weights = self.args.mix
+        self.scenario = self.rng.choices(names, weights=weights)[0]
+        self.steps = getattr(self, f"_{self.scenario}")()
+        return next(self.steps)
+
+    def _start(self):
+        yield "START", {}
+
+    def _nearest(self):
+        latitude, longitude = self._position()
+        yield "NEAREST_STATIONS", {"latitude": latitude, "longitude": longitude, "k": 5}
+
+    def _status(self):
+        station_ids = self.catalog["station_ids"]
+        yield "STATION_STATUS", {"stations": self.rng.sample(station_ids, min(10, len(station_ids)))}
+
+    def _journey(self):
+        station_ids = self.catalog["station_ids"]
+        response = yield "LOGIN", {
+            "user_name": f"bench_{self.rng.randrange(1 << 30)}",
+            "selected_car": self.rng.choice(self.catalog["car_models"]),
+            "battery_car": round(self.rng.uniform(20, 90), 1)  # Percentual da bateria
+        }
+        user_id = response[2].get("user_id")
+        if not user_id:
+            return
+        yield "NAVIGATION", {"user_id": user_id, "route_distance": self.rng.randint(10, 400)}
+
+        if self.rng.random() < 0.5:
+            # Candidatos informados pelo cliente, como no fluxo original
+            selection = {
+                "user_id": user_id,
+                "list_stations": {
+                    station_id: {"distance_origin_position": round(self.rng.uniform(0.5, 30), 2)}
+                    for station_id in self.rng.sample(station_ids, min(5, len(station_ids)))
+                }
+            }
+        else:
+            # Candidatos obtidos pelo índice espacial do servidor
+            latitude, longitude = self._position()
+            selection = {"user_id": user_id, "latitude": latitude, "longitude": longitude}
+        response = yield "SELECTION_STATION", selection
+
+        yield "PAYMENT", {
+            "user_id": user_id,
+            "id_station": response[2].get("id_station") or self.rng.choice(station_ids),
+            "confirmation": self.rng.random() < self.args.confirm_rate
+        }
+        self.journeys += 1
+
+    def _position(self):
+        lat_min, lat_max, lon_min, lon_max = self.catalog["bounds"]
+        return self.rng.uniform(lat_min, lat_max), self.rng.uniform(lon_min, lon_max)
+
+
+async def run_connection(index, args, catalog, stats, deadline, connect_gate):
+    """Uma conexão com `pipeline` clientes simulados intercalados."""
+    rng = random.Random(args.seed * 1_000_003 + index)
+    async with connect_gate:
+        try:
+            connection = await Connection.open(args.host, args.port, args.binary)
+        except (OSError, RuntimeError) as e:
+            stats.connection_errors += 1
+            if stats.connection_errors == 1:
+                print(f"Erro ao conectar: {e}")
+            return
+
+    clients = [SimulatedClient(catalog, args, rng) for _ in range(args.pipeline)]
+    responses = [None] * len(clients)
+    try:
+        while time.monotonic() < deadline:
+            # Um pedido de cada cliente simulado, enviados juntos (pipeline)
+            batch = [client.next_request(response) for client, response in zip(clients, responses)]
+            payload = b"".join(connection.encode(request_type, data) for request_type, data in batch)
+            sent_at = time.perf_counter()
+            connection.writer.write(payload)
+            await connection.writer.drain()
+
+            for position, (request_type, _) in enumerate(batch):
+                response = await connection.read_response()
+                stats.record(request_type, time.perf_counter() - sent_at, response[1])
+                responses[position] = response
+    except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+        stats.connection_errors += 1
+        if stats.connection_errors == 1:
+            print(f"Erro na conexão: {e}")
+    finally:
+        stats.journeys += sum(client.journeys for client in clients)
+        connection.close()
+
+
+async def fetch_catalog(args):
+    """Obtém modelos de carro e postos via START, como um cliente real."""
+    connection = await Connection.open(args.host, args.port, False)
+    connection.writer.write(connection.encode("START", {}))
+    _, status_code, data = await connection.read_response()
+    connection.close()
+    if status_code != 200:
+        raise RuntimeError(f"START falhou com status {status_code}")
+
+    stations = data["station_models"]
+    coordinates = []
+    for station in stations.values():
+        try:
+            coordinates.append((float(station["latitude"]), float(station["longitude"])))
+        except (KeyError, TypeError, ValueError):
+            continue  # Postos sem coordenadas válidas ficam fora da área sorteada
+    coordinates = coordinates or [(-12.27, -38.97)]
+    lats = [lat for lat, _ in coordinates]
+    lons = [lon for _, lon in coordinates]
+    return {
+        "car_models": list(data["car_models"]),
+        "station_ids": list(stations),
+        "bounds": (min(lats), max(lats), min(lons), max(lons))
+    }
+
+
+async def run(args):
+    catalog = await fetch_catalog(args)
+    stats = Stats()
+    connect_gate = asyncio.Semaphore(args.connect_concurrency)  # Evita estourar o backlog do listen
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        run_connection(index, args, catalog, stats, deadline, connect_gate)
+        for index in range(args.connections)
+    ))
+    return stats.report(time.monotonic() - started)
+
+
+def raise_fd_limit(needed):
+    """Eleva o limite de descritores abertos até o máximo permitido, se necessário."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def stop_server(process):
+    """Encerra o servidor iniciado com --spawn-server.
+
+    SIGTERM, e não SIGINT: com --workers, o processo pai ignora SIGINT e só repassa SIGTERM aos filhos.
+    """
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def spawn_server(args, work_dir):
+    """Inicia um servidor local na porta do teste e aguarda ele aceitar conexões.
+
+    O servidor roda em `work_dir`, sobre uma cópia do catálogo: as reservas do teste não tocam server/data.
+    """
+    os.makedirs(os.path.join(work_dir, "server", "data"))
+    for path in DATA_FILES:
+        shutil.copy(os.path.join(ROOT_DIR, path), os.path.join(work_dir, path))
+    command = [sys.executable, "-u", os.path.join(ROOT_DIR, "server", "server.py"), str(args.port)] + args.server_args.split()
+    process = subprocess.Popen(command, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection((args.host, args.port), timeout=0.1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("o servidor encerrou durante a inicialização")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("o servidor não começou a aceitar conexões")
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requisições em {report['elapsed_s']:.1f} s "
+          f"({report['throughput']:.0f} req/s, {report['journeys']} jornadas completas, "
+          f"{report['connection_errors']} erros de conexão)")
+    print(f"{'tipo':<20}{'qtd':>9}{'erros':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p999 ms':>10}{'max ms':>10}")
+    for request_type, row in report["types"].items():
+        print(f"{request_type:<20}{row['count']:>9}{row['errors']:>7}{row['throughput']:>10.0f}"
+              f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['p999_ms']:>10.2f}{row['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerador de carga TCP para o servidor de carregamento")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço do servidor (padrão: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8888, help="Porta do servidor (padrão: 8888)")
+    parser.add_argument("--connections", type=int, default=1000, help="Conexões simultâneas")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="Requisições em voo por conexão (clientes simulados intercalados)")
+    parser.add_argument("--duration", type=float, default=10, help="Duração do teste em segundos")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("journey=85,start=5,nearest=5,status=5"),
+                        help="Pesos dos cenários, ex.: journey=85,start=5,nearest=5,status=5")
+    parser.add_argument("--confirm-rate", type=float, default=0.1,
+                        help="Fração dos pagamentos confirmados (reservam vaga)")
+    parser.add_argument("--binary", action="store_true", help="Usa o formato binário negociado por HELLO")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Conexões abertas em paralelo")
+    parser.add_argument("--seed", type=int, default=1, help="Semente dos clientes simulados")
+    parser.add_argument("--spawn-server", action="store_true",
+                        help="Inicia um servidor local na porta indicada durante o teste")
+    parser.add_argument("--server-args", default="", help="Argumentos extras do servidor iniciado com --spawn-server")
+    parser.add_argument("--output", help="Grava o relatório em JSON neste arquivo")
+    parser.add_argument("--max-p99-ms", type=float,
+                        help="Falha (código de saída 1) se o p99 de algum tipo ultrapassar este valor")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.connections + 256)
+    with tempfile.TemporaryDirectory() if args.spawn_server else nullcontext() as work_dir:
+        server = spawn_server(args, work_dir) if args.spawn_server else None
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            if server:
+                stop_server(server)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    slow = [t for t, row in report["types"].items() if args.max_p99_ms is not None and row["p99_ms"] > args.max_p99_ms]
+    if slow or report["connection_errors"]:
+        print(f"Regressão: p99 acima do limite em {', '.join(slow)}" if slow else "Regressão: erros de conexão")
+        sys.exit(1)
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib
+
+# Executa o controller no próprio processo, com os dados em um diretório temporário
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+
+DATA_FILES = (os.path.join("server", "data", "feira_de_santana_stations.csv"),
+              os.path.join("server", "data", "car_models.json"))
+INF = float("inf")
+
+
+def request(controller, request_type, data):
+    return controller.route_request({"type": request_type, "data": data,
+                                     "status": {"code": 200, "message": ""}, "timestamp": ""})
+
+
+def fill_stations(controller, rng, now):
+    """Ocupa vagas ao acaso (algumas já vencidas), para que haja postos lotados entre os candidatos."""
+    store = controller.station_store
+    for station_id in store.station_ids():
+        for n in range(rng.randint(0, store.get_station(station_id)["max_slots"])):
+            store.reserve(station_id, f"bench-{station_id}-{n}", now + rng.uniform(-60, 3600), hold=rng.random() < 0.2)
+
+
+def check_vectors(controller, rng, now):
+    """Os vetores coletados por índice batem com a leitura posto a posto."""
+    store = controller.station_store
+    vectors = store.vectors
+    problems = []
+    positions = rng.sample(range(len(vectors)), min(200, len(vectors)))
+    kept, _, slots, releases = store.gather(vectors, positions, [1.0] * len(positions), now)
+    for position, available, release in zip(kept, slots, releases):
+        station_id = vectors.ids[position]
+        station_data = store.get_station(station_id)
+        expected = store.next_release(station_id, now) if station_data["available_slots"] <= 0 else INF
+        if available != station_data["available_slots"] or release != expected:
+            problems.append(f"posto {station_id}: vetores ({available}, {release}), "
+                            f"leitura ({station_data['available_slots']}, {expected})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os vetores dos postos com a leitura direta e mede a seleção.")
+    parser.add_argument("--stations", type=int, default=2000, help="Postos gerados para a medição")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=50, help="Candidatos por SELECTION_STATION")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "server", "data"))
+        for path in DATA_FILES:
+            shutil.copy(os.path.join(ROOT_DIR, path), os.path.join(work_dir, path))
+        os.chdir(work_dir)
+
+        bootstrap = importlib.import_module("bootstrap")
+        bootstrap.generate_stations(args.stations, bootstrap.STATIONS_CSV, seed=1)
+        controller = importlib.import_module("controller")
+        controller.load_station_state()
+        controller.start_services()
+        try:
+            fill_stations(controller, rng, time.time())
+            problems = check_vectors(controller, rng, time.time())
+
+            user_id = request(controller, "LOGIN", {"user_name": "bench", "selected_car": "Tesla Model 3",
+                                                    "battery_car": 80})["data"]["user_id"]
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                response = request(controller, "SELECTION_STATION", {
+                    "user_id": user_id, "k": args.k,
+                    "latitude": -12.27 + rng.uniform(-0.1, 0.1), "longitude": -38.96 + rng.uniform(-0.1, 0.1)
+                })
+                if response["status"]["code"] != 200:
+                    problems.append(f"SELECTION_STATION: {response['status']}")
+                    break
+            elapsed = time.perf_counter() - start
+        finally:
+            controller.shutdown()
+            os.chdir(ROOT_DIR)
+
+    if problems:
+        for problem in problems[:20]:
+            print(f"FALHA: {problem}")
+        sys.exit(1)
+    print(f"OK: vetores iguais à leitura direta; {args.requests} seleções com k={args.k} "
+          f"em {elapsed:.2f} s ({elapsed / args.requests * 1e6:.0f} µs por seleção)")
+
+
+if __name__ == "__main__":
+    main()
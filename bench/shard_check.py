@@ -0,0 +1,224 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+
+# Sobe shards e roteador como processos locais, cada um com os dados em um diretório temporário
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+from utils.hash_ring import HashRing
+
+STATIONS_CSV = os.path.join("server", "data", "feira_de_santana_stations.csv")
+CAR_MODELS = os.path.join("server", "data", "car_models.json")
+
+
+class Client:
+    def __init__(self, port):
+        """Cliente bloqueante do protocolo JSON por linha."""
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+        self.stream = self.sock.makefile("rb")
+
+    def request(self, request_type, data, **envelope):
+        message = {"type": request_type, "data": data, "status": {"code": 200, "message": ""},
+                   "timestamp": "", **envelope}
+        self.sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        return json.loads(self.stream.readline())
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def spawn(work_dir, port, server_args, log_file):
+    """Inicia um processo servidor no diretório de trabalho e aguarda ele aceitar conexões."""
+    command = [sys.executable, "-u", os.path.join(ROOT_DIR, "server", "server.py"), str(port)] + server_args
+    process = subprocess.Popen(command, cwd=work_dir, stdout=log_file, stderr=subprocess.STDOUT)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"o processo da porta {port} encerrou durante a inicialização")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"o processo da porta {port} não começou a aceitar conexões")
+
+
+def stop(process):
+    """Encerra o processo com SIGTERM (com --workers, o processo pai ignora SIGINT)."""
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def check_ownership(ring, station_ids, shard_clients):
+    """Cada posto está em exatamente um shard: o dono indicado pelo anel."""
+    problems, owned = [], {}
+    for node, client in shard_clients.items():
+        stations = client.request("STATION_STATUS", {})["data"]["stations"]
+        for station in stations:
+            station_id = station["id_station"]
+            if station_id in owned:
+                problems.append(f"posto {station_id} carregado por {owned[station_id]} e {node}")
+            owned[station_id] = node
+            if ring.owner(station_id) != node:
+                problems.append(f"posto {station_id} em {node}, mas o dono no anel é {ring.owner(station_id)}")
+    missing = set(station_ids) - set(owned)
+    if missing:
+        problems.append(f"postos sem shard: {sorted(missing)[:5]}")
+    counts = {node: sum(1 for owner in owned.values() if owner == node) for node in shard_clients}
+    return problems, counts
+
+
+def run_journeys(router, station_ids, args):
+    """LOGIN, duas seleções com pré-reserva (a segunda troca de posto) e PAYMENT, pelo roteador."""
+    rng = random.Random(args.seed)
+    problems, paid = [], {}
+    for i in range(args.users):
+        login = {"user_name": f"shard_{i}", "selected_car": "Tesla Model 3", "battery_car": 30}
+        user_id = router.request("LOGIN", login, idempotency_key=f"login-{i}")["data"]["user_id"]
+
+        candidates = rng.sample(station_ids, args.candidates)
+        distances = [round(rng.uniform(1, 20), 2) for _ in candidates]
+        selected = None
+        # A segunda seleção inverte as distâncias: a pré-reserva anterior, em outro shard, é devolvida
+        for order in (distances, distances[::-1]):
+            list_stations = {station_id: {"distance_origin_position": d} for station_id, d in zip(candidates, order)}
+            response = router.request("SELECTION_STATION", {"user_id": user_id, "list_stations": list_stations, "hold": True})
+            if response["status"]["code"] != 200:
+                problems.append(f"SELECTION_STATION de {user_id}: {response['status']}")
+                break
+            selected = response["data"]["id_station"]
+        if selected is None:
+            continue
+
+        response = router.request("PAYMENT", {"user_id": user_id, "id_station": selected, "confirmation": True},
+                                  idempotency_key=f"payment-{i}")
+        if response["data"].get("confirmation"):
+            paid[selected] = paid.get(selected, 0) + 1
+    return problems, paid
+
+
+def check_occupancy(router, shard_clients, station_ids, paid):
+    """Ocupação vista pelo roteador = pagamentos confirmados (nenhuma pré-reserva esquecida) = soma dos shards."""
+    problems = []
+    through_router = {s["id_station"]: s for s in router.request("STATION_STATUS", {"stations": station_ids})["data"]["stations"]}
+    direct = {}
+    for client in shard_clients.values():
+        for station in client.request("STATION_STATUS", {})["data"]["stations"]:
+            direct[station["id_station"]] = station
+    for station_id in station_ids:
+        occupied = through_router[station_id]["occupied_slots"]
+        if occupied != paid.get(station_id, 0):
+            problems.append(f"posto {station_id}: {occupied} vagas ocupadas para {paid.get(station_id, 0)} pagamentos")
+        # next_release_in é relativo ao instante de cada consulta: compara apenas as vagas
+        fields = ("occupied_slots", "available_slots", "max_slots")
+        if any(through_router[station_id][field] != direct[station_id][field] for field in fields):
+            problems.append(f"posto {station_id}: roteador e shard divergem")
+    return problems
+
+
+def check_declined_session(router, station_ids):
+    """Um PAYMENT recusado remove o usuário no shard; o roteador deixa de aceitá-lo em seguida."""
+    login = {"user_name": "shard_declined", "selected_car": "Tesla Model 3", "battery_car": 30}
+    user_id = router.request("LOGIN", login)["data"]["user_id"]
+    navigation = {"user_id": user_id, "route_distance": 5}
+    if router.request("NAVIGATION", navigation)["status"]["code"] != 200:
+        return ["NAVIGATION recusada antes do PAYMENT"]
+    router.request("PAYMENT", {"user_id": user_id, "id_station": station_ids[0], "confirmation": False})
+
+    problems = []
+    if router.request("NAVIGATION", navigation)["status"]["code"] != 404:
+        problems.append("roteador aceitou NAVIGATION de usuário removido pelo shard")
+    list_stations = {station_ids[0]: {"distance_origin_position": 1}}
+    response = router.request("SELECTION_STATION", {"user_id": user_id, "list_stations": list_stations, "hold": True})
+    if response["status"]["code"] != 404:
+        problems.append("roteador aceitou SELECTION_STATION de usuário removido pelo shard")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica a divisão dos postos entre shards locais e o roteador")
+    parser.add_argument("--shards", type=int, default=3, help="Quantidade de processos shard")
+    parser.add_argument("--base-port", type=int, default=9100, help="Porta do primeiro shard; o roteador usa a seguinte ao último")
+    parser.add_argument("--users", type=int, default=60, help="Jornadas completas pelo roteador")
+    parser.add_argument("--candidates", type=int, default=5, help="Postos candidatos por seleção")
+    parser.add_argument("--engine", choices=["selectors", "asyncio"], default="selectors", help="Motor do roteador")
+    parser.add_argument("--seed", type=int, default=1, help="Semente das jornadas")
+    args = parser.parse_args()
+
+    nodes = [f"127.0.0.1:{args.base_port + index}" for index in range(args.shards)]
+    router_port = args.base_port + args.shards
+    ring = HashRing(nodes)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "server", "data"))
+        for path in (STATIONS_CSV, CAR_MODELS):
+            shutil.copy(os.path.join(ROOT_DIR, path), os.path.join(work_dir, path))
+        with open(os.path.join(work_dir, STATIONS_CSV), encoding="utf-8") as f:
+            station_ids = [row["id"] for row in csv.DictReader(f, delimiter=";")]
+
+        log_file = open(os.path.join(work_dir, "servers.log"), "w")
+        processes = []
+        try:
+            for index, node in enumerate(nodes):
+                processes.append(spawn(work_dir, args.base_port + index,
+                                       ["--shards", ",".join(nodes), "--shard-index", str(index)], log_file))
+            processes.append(spawn(work_dir, router_port, ["--shards", ",".join(nodes), "--engine", args.engine], log_file))
+
+            shard_clients = {node: Client(args.base_port + index) for index, node in enumerate(nodes)}
+            router = Client(router_port)
+
+            problems, counts = check_ownership(ring, station_ids, shard_clients)
+            print("Postos por shard: " + ", ".join(f"{node}={count}" for node, count in counts.items()))
+
+            started = time.perf_counter()
+            journey_problems, paid = run_journeys(router, station_ids, args)
+            elapsed = time.perf_counter() - started
+            problems += journey_problems + check_occupancy(router, shard_clients, station_ids, paid)
+            problems += check_declined_session(router, station_ids)
+            print(f"Jornadas: {args.users} em {elapsed:.2f} s, {sum(paid.values())} pagamentos confirmados")
+
+            # Com um shard fora do ar, o roteador responde 503 apenas para os postos dele
+            stop(processes[0])
+            lost = next(station_id for station_id in station_ids if ring.owner(station_id) == nodes[0])
+            kept = next((station_id for station_id in station_ids if ring.owner(station_id) != nodes[0]), None)
+            if router.request("STATION_STATUS", {"stations": [lost]})["status"]["code"] != 503:
+                problems.append("roteador não sinalizou o shard fora do ar com 503")
+            if kept and router.request("STATION_STATUS", {"stations": [kept]})["status"]["code"] != 200:
+                problems.append("shard fora do ar afetou postos de outro shard")
+
+            router.close()
+            for client in shard_clients.values():
+                client.close()
+        finally:
+            for process in processes:
+                stop(process)
+            log_file.close()
+
+        if problems:
+            with open(os.path.join(work_dir, "servers.log"), encoding="utf-8") as f:
+                print(f.read()[-3000:])
+
+    if problems:
+        for problem in problems:
+            print(f"FALHA: {problem}")
+        sys.exit(1)
+    print("OK: cada posto pertence a um único shard e o roteador combina as respostas corretamente")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from controller import route_request, error_response, shutdown, subscribe_stations, station_deltas, change_feed
+from utils.codec import encode_response, loads, JSONDecodeError
+from utils.time_utils import pin_timestamp, unpin_timestamp
+from utils.wire import negotiate, HEADER
+from utils.metrics import metrics
+from utils.log import get_logger
+
+log = get_logger("async_server")
+
+
+def _uvloop_policy():
+    """Retorna a política do uvloop ou None se o pacote não estiver instalado."""
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.EventLoopPolicy()
+
+
+# Políticas de event loop disponíveis para o motor asyncio
+LOOP_POLICIES = {
+    "asyncio": asyncio.DefaultEventLoopPolicy,
+    "uvloop": _uvloop_policy
+}
+
+
+def _route_pinned(request):
+    """Executa o handler na thread do executor com um único instante para toda a requisição."""
+    pin_timestamp()
+    try:
+        return route_request(request)
+    finally:
+        unpin_timestamp()
+
+
+class AsyncServer:
+    def __init__(self, host='0.0.0.0', port=8888, max_connections=10000, loop_policy="asyncio",
+                 executor_workers=8, max_line_size=16 * 1024 * 1024, reuse_port=False,
+                 listen_backlog=1024, idle_timeout=300, write_timeout=30, max_output_buffer=16 * 1024 * 1024,
+                 feed_interval=0.1):
+        """Inicializa o servidor asyncio com o mesmo protocolo JSON delimitado por linha."""
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections  # Conexões simultâneas; acima disso recusa com 503
+        self.listen_backlog = listen_backlog
+        self.idle_timeout = idle_timeout    # Sem requisições por esse tempo, a conexão é encerrada
+        self.write_timeout = write_timeout  # Cliente que não lê as respostas por esse tempo é desconectado
+        self.max_output_buffer = max_output_buffer  # Mudanças não lidas por um inscrito acima disso encerram a conexão
+        self.feed_interval = feed_interval  # Segundos entre envios das mudanças de vagas (SUBSCRIBE_STATIONS)
+        self.subscribers = {}  # StreamWriter inscrito -> codec binário da conexão (None = JSON)
+        self.connections = 0
+        self.loop_policy = loop_policy
+        self.executor_workers = executor_workers  # Limite de handlers bloqueantes simultâneos
+        self.max_line_size = max_line_size
+        self.reuse_port = reuse_port  # Vários processos escutando a mesma porta
+        self.executor = None
+        self.running = False
+
+    def start(self):
+        """Inicializa e executa o servidor."""
+        self._install_loop_policy()
+        self.executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix="handler")
+        self.running = True
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            log.info("Servidor interrompido pelo usuário")
+        except Exception as e:
+            log.exception("Erro no servidor", error=e)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Encerra o servidor de forma segura."""
+        if not self.running:
+            return
+        log.info("Encerrando servidor")
+        self.running = False
+        self.executor.shutdown(wait=True)
+        shutdown()
+        log.info("Servidor encerrado")
+
+    def _install_loop_policy(self):
+        """Instala a política de event loop escolhida, com fallback para a padrão."""
+        policy = LOOP_POLICIES[self.loop_policy]()
+        if policy is None:
+            log.warning("Política de loop indisponível. Usando asyncio padrão.", loop=self.loop_policy)
+            policy = asyncio.DefaultEventLoopPolicy()
+        asyncio.set_event_loop_policy(policy)
+
+    async def _serve(self):
+        """Aceita conexões até o servidor ser interrompido."""
+        server = await asyncio.start_server(
+            self._handle_client, self.host, self.port,
+            backlog=self.listen_backlog, limit=self.max_line_size, reuse_address=True,
+            reuse_port=self.reuse_port
+        )
+        log.info("Servidor (asyncio) iniciado", host=self.host, port=self.port)
+        feed_task = asyncio.create_task(self._push_station_deltas())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            feed_task.cancel()
+
+    async def _push_station_deltas(self):
+        """A cada tick, envia aos inscritos as mudanças de vagas, serializadas uma vez por protocolo."""
+        while True:
+            await asyncio.sleep(self.feed_interval)
+            for writers, response in station_deltas():
+                encoded = {}  # Codificação da conexão (None = JSON por linha) -> bytes
+                for writer in writers:
+                    codec = self.subscribers[writer]
+                    encoding = codec.encoding if codec else None
+                    if encoding not in encoded:
+                        encoded[encoding] = codec.encode_response(response) if codec else encode_response(response)
+                    if writer.transport.get_write_buffer_size() > self.max_output_buffer:
+                        # Inscrito não lê as mudanças: encerra em vez de acumulá-las
+                        log.warning("Cliente lento desconectado", address=writer.get_extra_info("peername"))
+                        metrics.inc("connections_evicted_total")
+                        self._unsubscribe(writer)
+                        writer.transport.abort()
+                        continue
+                    writer.write(encoded[encoding])
+                    metrics.inc("feed_pushes_total")
+                    metrics.inc("bytes_sent_total", len(encoded[encoding]))
+
+    def _subscribe(self, writer, codec, request):
+        """SUBSCRIBE_STATIONS: inscreve a conexão no feed, guardando o protocolo dos envios."""
+        response = subscribe_stations(writer, request)
+        if change_feed.is_subscribed(writer):
+            self.subscribers[writer] = codec
+        else:
+            self.subscribers.pop(writer, None)
+        return response
+
+    def _unsubscribe(self, writer):
+        change_feed.unsubscribe(writer)
+        self.subscribers.pop(writer, None)
+
+    async def _handle_client(self, reader, writer):
+        """Lê mensagens delimitadas por '\\n' e responde na ordem recebida."""
+        address = writer.get_extra_info("peername")
+        if self.connections >= self.max_connections:
+            log.debug("Conexão recusada: limite atingido", address=address, limit=self.max_connections)
+            metrics.inc("connections_rejected_total")
+            writer.write(encode_response(error_response(503, "Servidor lotado. Tente novamente mais tarde")))
+            writer.close()
+            return
+        log.debug("Conexão aceita", address=address)
+        metrics.inc("connections_accepted_total")
+        self.connections += 1
+        codec = None  # BinaryCodec após o handshake HELLO
+        try:
+            while True:
+                # Conexão inscrita em SUBSCRIBE_STATIONS não está ociosa enquanto aguarda mudanças
+                idle_timeout = None if writer in self.subscribers else self.idle_timeout
+                if codec:
+                    try:
+                        header = await asyncio.wait_for(reader.readexactly(HEADER.size), idle_timeout)
+                        fields = HEADER.unpack(header)
+                        if fields[0] > self.max_line_size:
+                            writer.write(codec.encode_response(error_response(413, "Mensagem excede o tamanho máximo")))
+                            await writer.drain()
+                            break
+                        body = await asyncio.wait_for(reader.readexactly(fields[0]), self.idle_timeout)
+                    except asyncio.IncompleteReadError:
+                        break
+                    response = await self._process_binary_message(writer, codec, fields + (body,))
+                    metrics.inc("bytes_received_total", HEADER.size + len(body))
+                    metrics.inc("bytes_sent_total", len(response))
+                    writer.write(response)
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+                    continue
+
+                try:
+                    raw_message = await asyncio.wait_for(reader.readuntil(b'\n'), idle_timeout)
+                except asyncio.IncompleteReadError:
+                    break  # Cliente encerrou a conexão
+                except asyncio.LimitOverrunError:
+                    writer.write(encode_response(error_response(413, "Mensagem excede o tamanho máximo")))
+                    await writer.drain()
+                    break
+
+                response, codec = await self._process_message(writer, address, raw_message[:-1])
+                metrics.inc("bytes_received_total", len(raw_message))
+                metrics.inc("bytes_sent_total", len(response))
+                writer.write(response)
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+        except asyncio.TimeoutError:
+            if writer.transport.get_write_buffer_size():
+                log.warning("Cliente lento desconectado", address=address)
+                metrics.inc("connections_evicted_total")
+            else:
+                log.debug("Conexão ociosa encerrada", address=address)
+                metrics.inc("connections_idle_closed_total")
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug("Conexão resetada pelo cliente", address=address)
+        except Exception as e:
+            log.exception("Erro ao processar dados do cliente", address=address, error=e)
+        finally:
+            log.debug("Fechando conexão", address=address)
+            self._unsubscribe(writer)
+            metrics.inc("connections_closed_total")
+            self.connections -= 1
+            writer.close()
+
+    async def _process_message(self, writer, address, raw_message):
+        """Processa uma mensagem JSON, executando o handler fora do event loop.
+
+        Retorna os bytes da resposta e o codec binário, se a mensagem foi um handshake HELLO aceito.
+        """
+        codec = None
+        try:
+            request = loads(raw_message)
+            log.sample("Requisição recebida", payload=raw_message, address=address)
+
+            if isinstance(request, dict) and request.get("type") == "HELLO":
+                response, codec = negotiate(request)
+            elif isinstance(request, dict) and request.get("type") == "SUBSCRIBE_STATIONS":
+                response = self._subscribe(writer, None, request)  # Só lê a memória: roda no próprio loop
+            else:
+                # Handlers fazem E/S bloqueante: rodam no executor para não travar o loop
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(self.executor, _route_pinned, request)
+
+        except JSONDecodeError:
+            response = error_response(400, "JSON inválido")
+        except Exception as e:
+            response = error_response(500, f"Erro interno: {str(e)}", cached=False)
+
+        return encode_response(response), codec
+
+    async def _process_binary_message(self, writer, codec, frame):
+        """Processa um frame binário com o codec negociado na conexão."""
+        try:
+            request = codec.decode_request(frame)
+        except Exception:
+            return codec.encode_response(error_response(400, "Frame inválido"))
+        try:
+            if request["type"] == "SUBSCRIBE_STATIONS":
+                response = self._subscribe(writer, codec, request)
+            else:
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(self.executor, _route_pinned, request)
+        except Exception as e:
+            response = error_response(500, f"Erro interno: {str(e)}", cached=False)
+        return codec.encode_response(response)
@@ -1,11 +1,23 @@
 import os
 import csv
 import json
+import glob
+import math
+import time
 import uuid
 import random
+import argparse
+import multiprocessing
 from datetime import datetime, timezone
+from store.session_store import FileSessionBackend, create_session_backend, SQLITE_DB_FILE
+from store.station_store import StationStore
+from store.journal import StationJournal
 
-def check_and_create_stations(csv_file="server/data/feira_de_santana_stations.csv", output_folder="server/data/stations"):
+# CSV dos postos; STATIONS_CSV permite usar um conjunto sintético gerado por este script
+STATIONS_CSV = os.environ.get("STATIONS_CSV", "server/data/feira_de_santana_stations.csv")
+CSV_FIELDS = ["id", "nomeDoPosto", "endereço", "latitude", "longitude", "quantidadeDeVeiculosSimultaneos"]
+
+def check_and_create_stations(csv_file=STATIONS_CSV, output_folder="server/data/stations"):
     os.makedirs(output_folder, exist_ok=True)
     expected_ids = set()
     
@@ -29,7 +41,7 @@ def check_and_create_stations(csv_file="server/data/feira_de_santana_stations.cs
         return
 
     if missing_ids:
-        print(f"Arquivos faltantes detectados: {missing_ids}")
+        print(f"Arquivos faltantes detectados: {len(missing_ids)}")
         with open(csv_file, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f, delimiter=";")
             for row in reader:
@@ -43,13 +55,16 @@ def check_and_create_stations(csv_file="server/data/feira_de_santana_stations.cs
                     }
                     filepath = os.path.join(output_folder, f"station_{station_id}.json")
                     if not os.path.exists(filepath):
-                        with open(filepath, "w", encoding="utf-8") as json_file:
+                        # Troca atômica: vários shards podem criar os mesmos arquivos ao iniciar juntos
+                        tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+                        with open(tmp_filepath, "w", encoding="utf-8") as json_file:
                             json.dump(station_data, json_file, indent=4)
-                        print(f"Arquivo criado: {filepath}")
+                        os.replace(tmp_filepath, filepath)
+        print(f"Arquivos de postos criados em {output_folder}")
     else:
         print("Todos os arquivos das estações estão presentes.")
 
-def initialize_data(car_models_file="server/data/car_models.json", stations_file="server/data/feira_de_santana_stations.csv"):
+def initialize_data(car_models_file="server/data/car_models.json", stations_file=STATIONS_CSV):
     """Carrega dados iniciais na memória ao iniciar o servidor."""
     if not os.path.exists(car_models_file):
         raise FileNotFoundError(f"Arquivo {car_models_file} não encontrado")
@@ -75,82 +90,192 @@ def initialize_data(car_models_file="server/data/car_models.json", stations_file
         "station_models": stations
     }
 
-def populate_clients(num_clients=150, users_dir="server/data/users", stations_dir="server/data/stations", car_models_file="server/data/car_models.json"):
-    """Cria clientes e os aloca aleatoriamente em postos de carregamento."""
-    # Cria diretórios se não existirem
+def generate_stations(count, csv_file, template_csv="server/data/feira_de_santana_stations.csv", seed=None):
+    """Gera um CSV com `count` postos sintéticos, com a mesma densidade dos postos de Feira de Santana.
+
+    A área do modelo é ampliada em torno do mesmo centro na proporção da quantidade de postos.
+    """
+    latitudes, longitudes = [], []
+    with open(template_csv, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            try:
+                latitude, longitude = float(row["latitude"]), float(row["longitude"])
+            except (ValueError, TypeError):
+                continue  # Ignora coordenadas inválidas do modelo
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+    scale = math.sqrt(count / len(latitudes))
+    center = ((min(latitudes) + max(latitudes)) / 2, (min(longitudes) + max(longitudes)) / 2)
+    half_span = ((max(latitudes) - min(latitudes)) / 2 * scale, (max(longitudes) - min(longitudes)) / 2 * scale)
+
+    rng = random.Random(seed)
+    with open(csv_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(CSV_FIELDS)
+        for station_id in range(1, count + 1):
+            writer.writerow([
+                station_id,
+                f"Posto Sintético {station_id}",
+                f"Endereço sintético, {station_id}",
+                f"{center[0] + rng.uniform(-half_span[0], half_span[0]):.4f}",
+                f"{center[1] + rng.uniform(-half_span[1], half_span[1]):.4f}",
+                rng.randint(2, 6)
+            ])
+    print(f"{count} postos sintéticos gerados em {csv_file}")
+
+def reset_data(stations_dir="server/data/stations", journal_dir="server/data/journal", users_dir=None, backend="file"):
+    """Remove os arquivos dos postos e o journal (e, com `users_dir`, as sessões) antes de um novo povoamento."""
+    # Inclui os temporários de gravações interrompidas (snapshots e sessões gravam em *.tmp antes da troca)
+    paths = glob.glob(os.path.join(stations_dir, "station_*.json")) + glob.glob(os.path.join(stations_dir, "*.tmp"))
+    # Sem o journal (inclusive o dos shards e do roteador, em subdiretórios), registros antigos
+    # não são reaplicados sobre os postos recriados
+    for pattern in ("*.log", "*.old"):
+        paths += glob.glob(os.path.join(journal_dir, "**", pattern), recursive=True)
+    if users_dir is not None:
+        if backend == "file":
+            paths += glob.glob(os.path.join(users_dir, "*.json")) + glob.glob(os.path.join(users_dir, "*.tmp"))
+        else:
+            # Sem os arquivos do WAL, um banco recriado não recebe páginas do banco removido
+            paths += [SQLITE_DB_FILE + suffix for suffix in ("", "-wal", "-shm")]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def journal_dirs(journal_dir="server/data/journal"):
+    """Diretório do journal e os subdiretórios dos shards e do roteador."""
+    if not os.path.isdir(journal_dir):
+        return [journal_dir]
+    return [journal_dir] + sorted(entry.path for entry in os.scandir(journal_dir) if entry.is_dir())
+
+def open_session_backend(backend, users_dir):
+    """Backend de sessões usado pelo servidor ("file" grava em `users_dir`)."""
+    return FileSessionBackend(users_dir) if backend == "file" else create_session_backend(backend)
+
+def _save_users(job):
+    """Grava um lote de usuários (executado em um processo do pool)."""
+    backend_name, users_dir, batch = job
+    backend = open_session_backend(backend_name, users_dir)
+    try:
+        backend.save_many(batch)
+    finally:
+        backend.close()
+    return len(batch)
+
+def populate_clients(num_clients=150, users_dir="server/data/users", stations_dir="server/data/stations",
+                     car_models_file="server/data/car_models.json", seed=None, backend="file",
+                     processes=1, batch_size=1000, journal_dir="server/data/journal"):
+    """Cria clientes e os aloca aleatoriamente em postos de carregamento, em lote.
+
+    As vagas são sorteadas em memória e reservadas pelo StationStore do servidor: o journal
+    deixado por uma parada abrupta é reaplicado antes do sorteio, e cada posto alterado é gravado
+    uma única vez com uma versão nova. Os usuários são gravados em lotes pelo backend de sessões
+    do servidor ("file" ou "sqlite").
+    Com `processes` > 1, os lotes do backend de arquivos são gravados em paralelo. A mesma
+    `seed` gera sempre os mesmos usuários e a mesma alocação.
+    """
+    started = time.perf_counter()
     os.makedirs(users_dir, exist_ok=True)
     os.makedirs(stations_dir, exist_ok=True)
 
     # Carrega modelos de carros
     with open(car_models_file, "r", encoding="utf-8") as f:
         car_models = json.load(f)
-    car_list = list(car_models.keys())
+    car_list = sorted(car_models.keys())
 
-    # Lista de arquivos de postos
-    station_files = [f for f in os.listdir(stations_dir) if f.startswith("station_") and f.endswith(".json")]
-    if not station_files:
+    # Estado atual dos postos: snapshot mais os registros do journal ainda não incorporados
+    # (do servidor, dos workers e dos shards). A recuperação grava o resultado e descarta os
+    # segmentos, então nada é reaplicado de novo sobre as vagas sorteadas aqui.
+    station_store = StationStore(stations_dir)
+    station_store.load()
+    for directory in journal_dirs(journal_dir):
+        station_store.recover(StationJournal(directory))
+    # Ordem fixa, para a alocação ser reproduzível
+    stations = {station_data["id"]: station_data for station_data in station_store.stations.values()}
+    if not stations:
         raise FileNotFoundError("Nenhum arquivo de posto encontrado em stations_dir")
 
-    # Gera clientes
+    # Uma entrada por vaga livre, embaralhada: cada cliente fica com a próxima vaga sorteada
+    rng = random.Random(seed)
+    free_slots = [station_id for station_id in sorted(stations) for _ in range(stations[station_id]["available_slots"])]
+    rng.shuffle(free_slots)
+
+    current_time = datetime.now(timezone.utc).timestamp()
+    users = {}
+    changed = set()
     for i in range(num_clients):
-        user_id = str(uuid.uuid4())
-        user_name = f"Cliente_{i+1}"
-        selected_car = random.choice(car_list)
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        selected_car = rng.choice(car_list)
         car_data = car_models[selected_car]
-        
+
         # Bateria aleatória entre 10% e 100%
         battery_capacity = car_data["battery_capacity"]
-        current_battery = random.uniform(0.1 * battery_capacity, battery_capacity)
+        current_battery = rng.uniform(0.1 * battery_capacity, battery_capacity)
 
-        # Cria arquivo do usuário
-        user_data = {
-            "user_name": user_name,
+        users[user_id] = {
+            "user_id": user_id,
+            "user_name": f"Cliente_{i+1}",
             "user_car": {
                 "brand": car_data["brand"],
                 "model": selected_car,
                 "battery_capacity": battery_capacity,
+                "current_battery": current_battery,
                 "energy_consumption": car_data["energy_consumption"],
-                "max_speed": car_data["max_speed"],
-                "current_battery": current_battery
+                "max_speed": car_data["max_speed"]
             }
         }
-        user_filepath = os.path.join(users_dir, f"{user_id}.json")
-        with open(user_filepath, "w", encoding="utf-8") as f:
-            json.dump(user_data, f, indent=4)
-        print(f"Criado usuário: {user_filepath}")
-
-        # Aloca o cliente em um posto
-        random.shuffle(station_files)  # Embaralha para alocação aleatória
-        allocated = False
-        for station_file in station_files:
-            station_filepath = os.path.join(stations_dir, station_file)
-            with open(station_filepath, "r", encoding="utf-8") as f:
-                station_data = json.load(f)
-
-            if station_data["available_slots"] > 0:
-                # Calcula tempo de carga até 80% (50 kW padrão)
-                charge_rate = 50  # kW
-                energy_needed = min(battery_capacity * 0.8 - current_battery, battery_capacity - current_battery)
-                charge_time = (energy_needed / charge_rate) * 3600  # Segundos
-                current_time = datetime.now(timezone.utc).timestamp()
-                estimated_timestamp = current_time + charge_time
-
-                # Atualiza o posto
-                station_data["available_slots"] -= 1
-                station_data["vehicles"][user_id] = {
-                    "estimated_timestamp": estimated_timestamp
-                }
-
-                # Salva as alterações
-                with open(station_filepath, "w", encoding="utf-8") as f:
-                    json.dump(station_data, f, indent=4)
-                print(f"Cliente {user_id} alocado no posto {station_data['id']}")
-                allocated = True
-                break
-
-        if not allocated:
-            print(f"Cliente {user_id} não alocado: todos os postos estão lotados")
+
+        if i < len(free_slots):
+            # Calcula tempo de carga até 80% (50 kW padrão)
+            charge_rate = 50  # kW
+            energy_needed = min(battery_capacity * 0.8 - current_battery, battery_capacity - current_battery)
+            charge_time = (energy_needed / charge_rate) * 3600  # Segundos
+
+            # Sem journal: a nova versão só vai para o disco no snapshot abaixo
+            station_store.reserve(free_slots[i], user_id, current_time + charge_time)
+            changed.add(free_slots[i])
+
+    # Cada posto alterado é gravado uma única vez (atômico, com a versão da última reserva)
+    station_store.snapshot()
+
+    items = list(users.items())
+    batches = [dict(items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+    jobs = [(backend, users_dir, batch) for batch in batches]
+    if processes > 1 and backend == "file" and len(jobs) > 1:
+        with multiprocessing.Pool(processes) as pool:
+            for _ in pool.imap_unordered(_save_users, jobs):
+                pass
+    else:
+        # SQLite tem um único escritor: uma transação por lote no processo atual
+        for job in jobs:
+            _save_users(job)
+
+    allocated = min(num_clients, len(free_slots))
+    print(f"{num_clients} usuários criados ({allocated} alocados em {len(changed)} postos, "
+          f"{num_clients - allocated} sem vaga) em {time.perf_counter() - started:.1f}s")
 
 if __name__ == "__main__":
-    check_and_create_stations()
-    populate_clients()
+    parser = argparse.ArgumentParser(description="Cria os postos e povoa o sistema com usuários simulados")
+    parser.add_argument("--clients", type=int, default=150, help="Quantidade de usuários (padrão: 150)")
+    parser.add_argument("--seed", type=int, help="Semente para gerar sempre os mesmos dados")
+    parser.add_argument("--backend", choices=["file", "sqlite"], default=os.environ.get("SESSION_BACKEND", "file"),
+                        help="Backend de sessões que receberá os usuários (padrão: SESSION_BACKEND ou file)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Processos gravando os lotes de usuários em paralelo (backend file)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Usuários por lote de gravação")
+    parser.add_argument("--synthetic-stations", type=int,
+                        help="Gera N postos sintéticos em server/data/synthetic_stations.csv "
+                             "(inicie o servidor com STATIONS_CSV apontando para ele)")
+    parser.add_argument("--reset", action="store_true",
+                        help="Apaga postos, journal e usuários existentes antes de povoar")
+    args = parser.parse_args()
+
+    csv_file = STATIONS_CSV
+    if args.synthetic_stations:
+        csv_file = "server/data/synthetic_stations.csv"
+        generate_stations(args.synthetic_stations, csv_file, seed=args.seed)
+    if args.reset or args.synthetic_stations:
+        # Um novo conjunto de postos substitui os arquivos dos postos anteriores
+        reset_data(users_dir="server/data/users" if args.reset else None, backend=args.backend)
+    check_and_create_stations(csv_file=csv_file)
+    populate_clients(args.clients, seed=args.seed, backend=args.backend,
+                     processes=args.processes, batch_size=args.batch_size)
@@ -1,53 +1,328 @@
+import os
+import re
 import json
+import time
 from handlers.auth import AuthManager
 from handlers.start import StartManager
 from handlers.trip import TripManager
 from handlers.station import StationManager
-from utils.time_utils import get_current_timestamp
+from handlers.router import ShardRouter
+from store.station_store import StationStore
+from store.journal import StationJournal
+from store.session_store import SessionStore, create_session_backend
+from store.slot_table import SharedSlotTable
+from store.change_feed import StationChangeFeed
+from store.idempotency import IdempotencyCache, CONFLICT, IN_PROGRESS, FULL
+from station_monitor import StationMonitor
+from utils.geo import StationSpatialIndex
+from utils.hash_ring import HashRing
+from utils.shard_client import ShardClient
+from utils.metrics import metrics
+from utils.codec import build_response
 import bootstrap
 
 # Carrega dados na inicialização
 bootstrap.check_and_create_stations()
 data = bootstrap.initialize_data()
 
-start_manager = StartManager(car_models=data["car_models"], station_models=data["station_models"])
-auth_manager = AuthManager(car_models=data["car_models"])
-trip_manager = TripManager()
-station_manager = StationManager()
+# Estado dos postos mantido em memória: snapshot + reaplicação do journal (ver load_station_state)
+station_store = StationStore()
+# Mudanças de vagas enviadas às conexões com SUBSCRIBE_STATIONS (coletadas pelo servidor a cada tick)
+change_feed = StationChangeFeed(station_store)
+station_store.on_change = change_feed.notify
+journal_dir = "server/data/journal"
+shard_ring = None  # HashRing dos shards (modo shard ou roteador)
+shard_node = None  # Nó deste processo no anel; None no roteador
 
-handlers = {
-    "START": start_manager.handle_start,
-    "LOGIN": auth_manager.handle_login,
-    "NAVIGATION": trip_manager.handle_navigation,
-    "SELECTION_STATION": station_manager.handle_selection_station,
-    "PAYMENT": station_manager.handle_payment
-}
+station_journal = None
+session_store = None
+station_monitor = None
+idempotency_cache = None
+catalog_refresh = None  # Recarrega o catálogo (START) se car_models.json ou o CSV de postos mudaram
+handlers = {}
+handler_latency = {}  # Tipo de requisição -> histograma de latência do handler
+
+def configure_shards(nodes, index=None):
+    """Divide os postos entre `nodes` ("host:porta") por hash consistente.
+
+    Com `index`, este processo é o shard `nodes[index]`: possui apenas os postos que o anel lhe
+    atribui, com o journal em um subdiretório próprio. Sem `index`, é o roteador na frente deles.
+    """
+    global shard_ring, shard_node, journal_dir
+    shard_ring = HashRing(nodes)
+    shard_node = nodes[index] if index is not None else None
+    # Diretório próprio: a recuperação de um processo não reaplica nem remove os segmentos dos outros
+    journal_dir = os.path.join(journal_dir, "shard-" + shard_node.replace(":", "-") if shard_node else "router")
+
+def load_station_state():
+    """Carrega o snapshot dos postos e reaplica o journal (em um shard, só os postos dele).
+
+    Nenhuma thread é iniciada aqui (a de escrita dos logs é parada e reiniciada em cada fork),
+    então é seguro criar processos em seguida.
+    """
+    owns = None
+    if shard_ring is not None:
+        owns = lambda station_id: shard_ring.owner(station_id) == shard_node  # Roteador: nenhum posto
+    station_store.load(owns)
+    station_store.recover(StationJournal(journal_dir))
+
+def share_station_state():
+    """Move o estado dos postos para memória compartilhada (modo com vários processos)."""
+    station_store.share(SharedSlotTable(station_store.stations))
+
+def start_services(worker_id=None):
+    """Inicia journal, sessões e handlers no processo que atenderá as requisições."""
+    global station_journal, session_store, station_monitor, idempotency_cache, catalog_refresh
+
+    # Cada processo servidor grava o seu próprio segmento de journal
+    station_journal = StationJournal(journal_dir, name="stations" if worker_id is None else f"stations-w{worker_id}")
+    station_store.journal = station_journal
+    station_journal.open()
+    station_store.start()
+
+    # Sessões de usuários: cache LRU com escrita em segundo plano ("file" ou "sqlite").
+    # Com vários processos (workers, shards e roteador) a escrita é síncrona, para que todos enxerguem
+    # o login, e as leituras vão ao backend: o LRU de um processo não vê as remoções dos outros.
+    single_process = worker_id is None and shard_ring is None
+    session_store = SessionStore(
+        create_session_backend(os.environ.get("SESSION_BACKEND", "file")),
+        write_behind=single_process,
+        read_cache=single_process
+    )
+    session_store.start()
+
+    # Libera cada vaga quando o carregamento termina (agendado pelos pagamentos)
+    station_monitor = StationMonitor(station_store, session_store)
+    station_monitor.start()
+
+    # Respostas de LOGIN e PAYMENT repetidas para a mesma idempotency_key (por processo)
+    idempotency_cache = IdempotencyCache(
+        capacity=int(os.environ.get("IDEMPOTENCY_CAPACITY", 10000)),
+        ttl=float(os.environ.get("IDEMPOTENCY_TTL", 300))
+    )
+
+    auth_manager = AuthManager(session_store=session_store, car_models=data["car_models"])
+    trip_manager = TripManager(session_store=session_store)
+    station_options = dict(
+        station_store=station_store,
+        session_store=session_store,
+        spatial_index=StationSpatialIndex(data["station_models"]),
+        station_models=data["station_models"],
+        release_scheduler=station_monitor,
+        # Prazo (segundos) das pré-reservas de SELECTION_STATION com "hold": true
+        hold_ttl=float(os.environ.get("HOLD_TTL", 60))
+    )
+    if shard_ring is not None and shard_node is None:
+        # Roteador: os postos ficam nos shards
+        station_manager = ShardRouter(shard_ring, ShardClient(), **station_options)
+    else:
+        station_manager = StationManager(**station_options)
+
+    def apply_catalog(catalog):
+        """Propaga o catálogo recarregado pelo StartManager ao LOGIN e às consultas de postos."""
+        data.update(catalog)
+        auth_manager.car_models = catalog["car_models"]
+        station_manager.use_spatial_index(StationSpatialIndex(catalog["station_models"]))
+        station_manager.station_models = catalog["station_models"]
+
+    start_manager = StartManager(
+        car_models=data["car_models"],
+        station_models=data["station_models"],
+        loader=bootstrap.initialize_data,
+        watch_files=["server/data/car_models.json", bootstrap.STATIONS_CSV],
+        on_reload=apply_catalog
+    )
+    catalog_refresh = start_manager.refresh_if_changed
+
+    handlers.update({
+        "START": start_manager.handle_start,
+        "LOGIN": auth_manager.handle_login,
+        "NAVIGATION": trip_manager.handle_navigation,
+        "SELECTION_STATION": station_manager.handle_selection_station,
+        "PAYMENT": station_manager.handle_payment,
+        "NEAREST_STATIONS": station_manager.handle_nearest_stations,
+        "STATION_STATUS": station_manager.handle_station_status,
+        "BATCH": handle_batch,
+        "METRICS": handle_metrics
+    })
+    if shard_node is not None:
+        # Consultas internas do roteador aos postos deste shard
+        handlers.update({
+            "STATION_LOOKUP": station_manager.handle_station_lookup,
+            "STATION_HOLD": station_manager.handle_station_hold
+        })
+    handler_latency.update({
+        request_type: metrics.histogram("request_latency_seconds", ("type", request_type))
+        for request_type in handlers
+    })
 
 required_fields = ["type", "data", "status", "timestamp"]
+MAX_BATCH_SIZE = 100  # Sub-requisições por BATCH
+REFERENCE = re.compile(r"\$(?:user_id|(\d+)\.(\w+))")  # Referências nos dados dos itens de um BATCH
+IDEMPOTENT_TYPES = {"LOGIN", "PAYMENT"}  # Tipos que aceitam idempotency_key no envelope
+CATALOG_TYPES = {"LOGIN", "SELECTION_STATION", "NEAREST_STATIONS"}  # Usam o catálogo além do START
+MAX_IDEMPOTENCY_KEY = 128  # Caracteres
 
 def route_request(request: dict) -> dict:
     if not validate_request(request, required_fields):
-        return {
-            "type": request.get("type", "error"),
-            "data": {},
-            "status": {"code": 400, "message": "Campos obrigatórios ausentes"},
-            "timestamp": get_current_timestamp()
-        }
+        return build_response(request.get("type", "error"), {}, 400, "Campos obrigatórios ausentes", cached=False)
+
+    if request["type"] not in handlers:
+        return build_response(request.get("type", "error"), {}, 404, "Ação desconhecida", cached=False)
+
+    if not isinstance(request["data"], dict):
+        return build_response(request["type"], {}, 400, "data deve ser um objeto")
 
-    if request["type"] in handlers:
-        print("REQUEST: " + request["type"])
+    key = request.get("idempotency_key")
+    if key is None or request["type"] not in IDEMPOTENT_TYPES:
+        return dispatch(request)
+
+    # Repetições da mesma requisição devolvem a resposta original sem executar o handler
+    if not isinstance(key, str) or not 0 < len(key) <= MAX_IDEMPOTENCY_KEY:
+        return build_response(request["type"], {}, 400, f"idempotency_key deve ser um texto de 1 a {MAX_IDEMPOTENCY_KEY} caracteres")
+    outcome, response = idempotency_cache.execute((request["type"], key), request["data"], lambda: dispatch(request))
+    if outcome == CONFLICT:
+        return build_response(request["type"], {}, 422, "idempotency_key já utilizada com outros dados")
+    if outcome == IN_PROGRESS:
+        return build_response(request["type"], {}, 409, "Requisição com esta idempotency_key ainda em processamento")
+    if outcome == FULL:
+        return build_response(request["type"], {}, 503, "Muitas requisições com idempotency_key em processamento. Tente novamente mais tarde")
+    return response
+
+def dispatch(request):
+    """Executa o handler do tipo da requisição, registrando a latência."""
+    start = time.perf_counter()
+    try:
+        if request["type"] in CATALOG_TYPES:
+            catalog_refresh()
         return handlers[request["type"]](request)
+    finally:
+        handler_latency[request["type"]].record(time.perf_counter() - start)
+
+def subscribe_stations(subscriber, request):
+    """Inscreve a conexão `subscriber` nas mudanças de vagas dos postos (ou cancela a inscrição).
+
+    Tratado pelo servidor, e não por route_request, porque depende da conexão. A resposta traz
+    as vagas livres atuais; depois, o servidor envia STATIONS_DELTA só com os postos alterados.
+    """
+    if not validate_request(request, required_fields) or not isinstance(request["data"], dict):
+        return build_response("SUBSCRIBE_STATIONS", {}, 400, "Campos obrigatórios ausentes")
+    if shard_ring is not None and shard_node is None:
+        return build_response("SUBSCRIBE_STATIONS", {"stations": {}, "message": "No roteador, assine diretamente nos shards"},
+                              400, "Erro na requisição")
+
+    data = request["data"]
+    if data.get("unsubscribe") is True:
+        change_feed.unsubscribe(subscriber)
+        return build_response("SUBSCRIBE_STATIONS", {"stations": {}, "not_found": [], "subscribed": False})
+    station_ids = data.get("stations")
+    if station_ids is not None and not isinstance(station_ids, list):
+        return build_response("SUBSCRIBE_STATIONS", {"stations": {}, "message": "stations deve ser uma lista de IDs"},
+                              400, "Erro na requisição")
+
+    stations, not_found = change_feed.subscribe(subscriber, station_ids)
+    return build_response("SUBSCRIBE_STATIONS", {"stations": stations, "not_found": not_found, "subscribed": True})
+
+def station_deltas():
+    """Mudanças de vagas do tick: [(inscritos, resposta STATIONS_DELTA), ...]."""
+    return [
+        (subscribers, build_response("STATIONS_DELTA", {"stations": delta}))
+        for subscribers, delta in change_feed.tick()
+    ]
+
+def handle_batch(request):
+    """Executa em ordem uma lista de sub-requisições e devolve todas as respostas em um único frame.
 
-    return {
-        "type": request.get("type", "error"),
-        "data": {},
-        "status": {"code": 404, "message": "Ação desconhecida"},
-        "timestamp": get_current_timestamp()
-    }
+    Valores "$user_id" nos dados referenciam o último user_id retornado no lote, e
+    "$<índice>.<campo>" o campo `data` da resposta de um item anterior (ex.: "$2.id_station").
+    """
+    sub_requests = request["data"].get("requests")
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return build_response("BATCH", {"responses": [], "message": "requests ausente ou inválido"},
+                              400, "Erro na requisição")
+    if len(sub_requests) > MAX_BATCH_SIZE:
+        return build_response("BATCH", {"responses": [], "message": f"Máximo de {MAX_BATCH_SIZE} requisições por lote"},
+                              400, "Erro na requisição")
+    stop_on_error = request["data"].get("stop_on_error", False)
+
+    responses = []
+    last_user_id = None
+    for sub_request in sub_requests:
+        if not isinstance(sub_request, dict) or not isinstance(sub_request.get("data", {}), dict):
+            response = error_response(400, "Sub-requisição inválida")
+        elif sub_request.get("type") == "BATCH":
+            response = error_response(400, "BATCH não pode ser aninhado")
+        else:
+            try:
+                data = resolve_references(sub_request.get("data", {}), responses, last_user_id)
+            except LookupError as e:
+                response = error_response(400, f"Referência inválida: {e}", cached=False)
+            else:
+                # Status e timestamp são opcionais nos itens: herdam os do envelope do lote
+                try:
+                    response = route_request({
+                        "type": sub_request.get("type"),
+                        "data": data,
+                        "status": sub_request.get("status", request["status"]),
+                        "timestamp": sub_request.get("timestamp", request["timestamp"]),
+                        "idempotency_key": sub_request.get("idempotency_key")
+                    })
+                except Exception as e:
+                    # Falha de um item não descarta as respostas dos anteriores
+                    response = error_response(500, f"Erro interno: {str(e)}", cached=False)
+
+        responses.append(response)
+        user_id = response.get("data", {}).get("user_id")
+        if user_id:
+            last_user_id = user_id
+        if stop_on_error and response["status"]["code"] >= 400:
+            break
+
+    return build_response("BATCH", {"responses": responses})
+
+def handle_metrics(request):
+    """Retorna os histogramas de latência, contadores e medidores do processo."""
+    return build_response("METRICS", metrics.snapshot())
+
+def resolve_references(data, responses, last_user_id):
+    """Substitui referências a respostas anteriores do lote pelos valores correspondentes.
+
+    Só "$user_id" e "$<índice>.<campo>" são referências; outros textos, mesmo começando
+    com "$" (ex.: user_name "$bob"), passam sem alteração.
+    """
+    resolved = {}
+    for field, value in data.items():
+        match = REFERENCE.fullmatch(value) if isinstance(value, str) else None
+        if match and value == "$user_id":
+            if last_user_id is None:
+                raise LookupError("nenhum user_id retornado antes de $user_id")
+            value = last_user_id
+        elif match:
+            index, ref_field = match.groups()
+            try:
+                value = responses[int(index)]["data"][ref_field]
+            except (IndexError, KeyError, TypeError):
+                raise LookupError(value) from None
+        resolved[field] = value
+    return resolved
 
 def validate_request(data, required_fields):
     return all(field in data for field in required_fields)
 
+def error_response(code, message, cached=True):
+    """Monta a resposta de erro de protocolo (JSON inválido, falha interna); ver build_response sobre `cached`."""
+    return build_response("error", {}, code, message, cached)
+
+def shutdown():
+    """Persiste o estado em memória antes de encerrar o servidor."""
+    if station_monitor:
+        station_monitor.stop()
+    station_store.stop()
+    if station_journal:
+        station_journal.close()
+    if session_store:
+        session_store.stop()
+
 if __name__ == "__main__":
     # Lista de requisições para teste, todas visando sucesso
     test_requests = [
@@ -127,6 +402,8 @@ if __name__ == "__main__":
         }
     ]
 
+    load_station_state()
+    start_services()
     print("=== Iniciando Teste de Requisições ===")
     user_id = None
     station_id = None
@@ -160,4 +437,5 @@ if __name__ == "__main__":
             station_id = response["data"]["id_station"]
             print(f"Station ID selecionado: {station_id}")
 
+    shutdown()
     print("\n=== Teste Concluído ===")
\ No newline at end of file
@@ -0,0 +1,152 @@
+import threading
+from utils.codec import build_response
+from utils.scoring import INF
+from utils.log import get_logger
+from handlers.station import StationManager
+
+log = get_logger("router")
+
+
+class ShardRouter(StationManager):
+    def __init__(self, ring, shard_client, **kwargs):
+        """StationManager do roteador: os postos ficam nos shards, escolhidos pelo anel de hash.
+
+        A seleção, as pré-reservas e a ocupação consultam os shards donos dos postos candidatos
+        (uma rodada em paralelo por etapa) e combinam as respostas; o PAYMENT é repassado ao dono
+        do posto. Sessões, validação e pontuação continuam as mesmas do StationManager.
+        """
+        super().__init__(**kwargs)
+        self.ring = ring
+        self.shards = shard_client
+        self.selection = threading.local()  # user_id e estado lido dos shards na seleção em andamento
+
+    def _internal(self, request_type, data):
+        """Envelope de uma requisição interna do roteador para um shard."""
+        return {"type": request_type, "data": data, "status": {"code": 200, "message": ""}, "timestamp": ""}
+
+    def _lookup(self, station_ids, user_id=None):
+        """Estado dos postos nos shards donos: {station_id: dados parciais do posto}."""
+        groups = self.ring.partition([str(station_id) for station_id in station_ids])
+        responses = self.shards.fan_out({
+            node: self._internal("STATION_LOOKUP", {"stations": ids, "user_id": user_id})
+            for node, ids in groups.items()
+        })
+        stations = {}
+        for response in responses.values():
+            stations.update(response["data"].get("stations", {}))
+        return stations
+
+    def _unavailable(self, response_type, error):
+        """Resposta quando um shard não responde."""
+        log.warning("Shard indisponível", type=response_type, error=error)
+        return build_response(response_type, {"message": "Shard indisponível"}, 503, "Serviço indisponível")
+
+    def load_candidates(self, vectors, positions, distances, current_time):
+        """Mesmos vetores do StationManager, com o estado lido dos shards em uma única rodada.
+
+        A consulta leva o user_id da seleção, para que place_hold saiba onde o usuário tem pré-reservas.
+        """
+        station_ids = [vectors.ids[position] for position in positions]
+        stations = self._lookup(station_ids, self.selection.user_id) if station_ids else {}
+        self.selection.stations = stations
+        kept_positions, kept_distances, available_slots, next_release = [], [], [], []
+        for position, station_id, distance in zip(positions, station_ids, distances):
+            station_data = stations.get(station_id)
+            if not station_data:
+                continue  # Posto inexistente no shard dono
+            kept_positions.append(position)
+            kept_distances.append(distance)
+            available_slots.append(station_data["available_slots"])
+            release = station_data.get("next_release")
+            next_release.append(release if release is not None else INF)
+        return kept_positions, kept_distances, available_slots, next_release
+
+    def station_details(self, station_id, user_id):
+        """Endereço e entrada do usuário lidos dos shards em load_candidates."""
+        station_data = self.selection.stations[station_id]
+        return station_data.get("address", "Endereço não disponível"), station_data["vehicles"].get(user_id)
+
+    def station_availability(self, station_ids):
+        """Vagas livres lidas dos shards donos."""
+        if not station_ids:
+            return {}
+        stations = self._lookup(station_ids)
+        return {
+            station_id: stations[str(station_id)]["available_slots"]
+            for station_id in station_ids if str(station_id) in stations
+        }
+
+    def place_hold(self, user_id, station_id, candidate_ids, current_time):
+        """Pré-reserva no shard dono do posto, devolvendo as pré-reservas do usuário nos demais shards."""
+        stations = self.selection.stations
+        releases = {}
+        for other_id in candidate_ids:
+            vehicle = stations[other_id]["vehicles"].get(user_id)
+            if other_id != station_id and vehicle is not None and vehicle.get("hold"):
+                releases.setdefault(self.ring.owner(str(other_id)), []).append(other_id)
+
+        owner = self.ring.owner(str(station_id))
+        requests = {
+            node: self._internal("STATION_HOLD", {"user_id": user_id, "release": ids})
+            for node, ids in releases.items()
+        }
+        requests[owner] = self._internal("STATION_HOLD", {
+            "user_id": user_id, "id_station": station_id, "release": releases.get(owner, [])
+        })
+        return self.shards.fan_out(requests)[owner]["data"].get("hold_expires_in")
+
+    def handle_selection_station(self, request):
+        self.selection.user_id = request["data"].get("user_id")
+        self.selection.stations = {}
+        try:
+            return super().handle_selection_station(request)
+        except OSError as e:
+            return self._unavailable("SELECTION_STATION", e)
+        finally:
+            self.selection.stations = {}
+
+    def handle_nearest_stations(self, request):
+        try:
+            return super().handle_nearest_stations(request)
+        except OSError as e:
+            return self._unavailable("NEAREST_STATIONS", e)
+
+    def handle_payment(self, request):
+        """Repassa o PAYMENT ao shard dono do posto, que reserva a vaga e agenda a liberação."""
+        id_station = request["data"].get("id_station")
+        if not id_station:
+            return super().handle_payment(request)  # Erro de validação, sem consultar shards
+        try:
+            return self.shards.request(self.ring.owner(str(id_station)), request)
+        except OSError as e:
+            return self._unavailable("PAYMENT", e)
+
+    def handle_station_status(self, request):
+        """Consulta a ocupação nos shards donos e combina as respostas na ordem pedida."""
+        station_ids = request["data"].get("stations")
+        if station_ids is not None and not isinstance(station_ids, list):
+            return super().handle_station_status(request)  # Erro de validação
+
+        if station_ids is None:
+            # Todos os postos: cada shard retorna os seus
+            requests = {node: self._internal("STATION_STATUS", {}) for node in self.ring.nodes}
+        else:
+            groups = self.ring.partition([str(station_id) for station_id in station_ids])
+            requests = {node: self._internal("STATION_STATUS", {"stations": ids}) for node, ids in groups.items()}
+        try:
+            responses = self.shards.fan_out(requests)
+        except OSError as e:
+            return self._unavailable("STATION_STATUS", e)
+
+        found, not_found = {}, []
+        for response in responses.values():
+            for station in response["data"].get("stations", []):
+                found[station["id_station"]] = station
+            not_found.extend(response["data"].get("not_found", []))
+        if station_ids is None:
+            stations = list(found.values())
+        else:
+            stations = [found[str(station_id)] for station_id in station_ids if str(station_id) in found]
+            missing = set(map(str, not_found))
+            not_found = [station_id for station_id in station_ids if str(station_id) in missing]
+        return build_response("STATION_STATUS", {"stations": stations, "not_found": not_found})
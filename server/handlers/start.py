@@ -1,59 +1,102 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from utils.codec import ResponseTemplate, build_response
 from utils.time_utils import get_current_timestamp
+from utils.log import get_logger
+
+log = get_logger("start")
 
 class StartManager:
-    def __init__(self, car_models, station_models):
-        """Inicializa com dados pré-carregados."""
+    def __init__(self, car_models, station_models, loader=None, watch_files=None, check_interval=1, on_reload=None):
+        """Inicializa com dados pré-carregados e a resposta de START já serializada."""
         self.car_models = car_models if car_models is not None else {}
         self.station_models = station_models if station_models is not None else {}
+        self.loader = loader  # Recarrega {"car_models", "station_models"} quando os arquivos mudam
+        self.watch_files = watch_files or []
+        self.check_interval = check_interval  # Intervalo mínimo entre verificações dos arquivos
+        self.on_reload = on_reload  # Recebe o catálogo recarregado (demais handlers que usam o catálogo)
+        self.lock = threading.Lock()
+        self.mtimes = self._read_mtimes()
+        self.last_check = time.monotonic()
+        self._build_cache()
 
-    def handle_start(self, request):
-        """Retorna os dados iniciais de modelos de carros e postos com tratamento de erros."""
-        # Verifica se os dados estão vazios
-        if not self.car_models and not self.station_models:
-            return {
-                "type": "START",
-                "data": {},
-                "status": {
-                    "code": 500,
-                    "message": "Erro interno: Nenhum dado de carros ou postos disponível"
-                },
-                "timestamp": get_current_timestamp()
-            }
-        elif not self.car_models:
-            return {
-                "type": "START",
-                "data": {
-                    "station_models": self.station_models
-                },
-                "status": {
-                    "code": 500,
-                    "message": "Erro interno: Modelos de carros não disponíveis"
-                },
-                "timestamp": get_current_timestamp()
-            }
-        elif not self.station_models:
-            return {
-                "type": "START",
-                "data": {
-                    "car_models": self.car_models
-                },
-                "status": {
-                    "code": 500,
-                    "message": "Erro interno: Postos de carregamento não disponíveis"
-                },
-                "timestamp": get_current_timestamp()
-            }
+    def _read_mtimes(self):
+        """Lê a data de modificação dos arquivos de origem do catálogo."""
+        mtimes = {}
+        for path in self.watch_files:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[path] = None
+        return mtimes
 
-        # Sucesso: retorna todos os dados
-        return {
+    def _build_cache(self):
+        """Calcula a versão do catálogo e pré-serializa a resposta de sucesso."""
+        catalog = {"car_models": self.car_models, "station_models": self.station_models}
+        encoded = json.dumps(catalog, sort_keys=True).encode("utf-8")
+        self.version = hashlib.sha256(encoded).hexdigest()[:16]
+        self.template = ResponseTemplate({
             "type": "START",
             "data": {
                 "car_models": self.car_models,
-                "station_models": self.station_models
+                "station_models": self.station_models,
+                "version": self.version
             },
             "status": {
                 "code": 200,
                 "message": "Dados iniciais carregados com sucesso"
-            },
-            "timestamp": get_current_timestamp()
-        }
\ No newline at end of file
+            }
+        })
+
+    def refresh_if_changed(self):
+        """Reconstrói o cache se os modelos de carros ou o CSV de postos mudaram.
+
+        Chamado antes das requisições que usam o catálogo; no máximo uma verificação dos
+        arquivos por `check_interval`.
+        """
+        if self.loader is None or time.monotonic() - self.last_check < self.check_interval:
+            return
+        with self.lock:
+            self.last_check = time.monotonic()
+            mtimes = self._read_mtimes()
+            if mtimes == self.mtimes:
+                return
+            try:
+                data = self.loader()
+            except Exception as e:
+                log.error("Erro ao recarregar catálogo", error=e)
+                return
+            self.mtimes = mtimes
+            self.car_models = data["car_models"]
+            self.station_models = data["station_models"]
+            self._build_cache()
+            if self.on_reload is not None:
+                self.on_reload(data)
+            log.info("Catálogo recarregado", version=self.version)
+
+    def handle_start(self, request):
+        """Retorna os dados iniciais de modelos de carros e postos com tratamento de erros."""
+        self.refresh_if_changed()
+
+        # Verifica se os dados estão vazios
+        if not self.car_models and not self.station_models:
+            return build_response("START", {}, 500, "Erro interno: Nenhum dado de carros ou postos disponível")
+        elif not self.car_models:
+            return build_response("START", {
+                "station_models": self.station_models
+            }, 500, "Erro interno: Modelos de carros não disponíveis")
+        elif not self.station_models:
+            return build_response("START", {
+                "car_models": self.car_models
+            }, 500, "Erro interno: Postos de carregamento não disponíveis")
+
+        # O cliente já possui o catálogo atual: resposta mínima
+        data = request["data"]
+        if isinstance(data, dict) and data.get("version") == self.version:
+            return build_response("START", {"version": self.version, "not_modified": True}, 304, "Catálogo não modificado")
+
+        # Sucesso: corpo já serializado, apenas o timestamp é inserido
+        return self.template.render(get_current_timestamp())
@@ -1,77 +1,87 @@
-import os
-import json
-import threading
-from models.electric_car import ElectricCar
 from utils.time_utils import get_current_timestamp
+from utils.codec import build_response
+from utils.scoring import score_stations, INF
+
+TRAVEL_SPEED_FACTOR = 0.7  # Velocidade média de viagem: 70% da velocidade máxima
 
 class StationManager:
-    def __init__(self, users_dir="server/data/users", stations_dir="server/data/stations"):
-        """Inicializa com diretórios de usuários e postos, e locks por recurso."""
-        self.users_dir = users_dir
-        self.stations_dir = stations_dir
-        self.locks = {}        # Locks por station_id
-        self.user_locks = {}   # Locks por user_id
+    def __init__(self, station_store, session_store, spatial_index=None, station_models=None,
+                 default_candidates=10, max_candidates=50, release_scheduler=None, hold_ttl=60):
+        """Inicializa com os armazenamentos de postos e de sessões compartilhados."""
+        self.station_store = station_store
+        self.session_store = session_store
+        self.spatial_index = None  # Índice espacial dos postos (construído na inicialização)
+        self.use_spatial_index(spatial_index)
+        self.station_models = station_models if station_models is not None else {}
+        self.default_candidates = default_candidates  # k padrão nas consultas por posição
+        self.max_candidates = max_candidates
+        self.release_scheduler = release_scheduler  # StationMonitor: libera a vaga no término da carga
+        self.hold_ttl = hold_ttl  # Segundos que uma pré-reserva de SELECTION_STATION aguarda o PAYMENT
+
+    def use_spatial_index(self, spatial_index):
+        """Passa a usar o índice espacial, alinhando a ele os vetores dos postos no armazenamento."""
+        if spatial_index is not None:
+            self.station_store.index_by(spatial_index.ids)
+        self.spatial_index = spatial_index
 
     def get_user_car(self, user_id):
-        """Carrega o carro do usuário a partir do arquivo JSON com lock."""
-        filepath = os.path.join(self.users_dir, f"{user_id}.json")
-        if not os.path.exists(filepath):
-            return None
+        """Obtém o carro do usuário a partir do armazenamento de sessões."""
+        return self.session_store.get_car(user_id)
 
-        # Cria ou obtém o lock para este user_id
-        if user_id not in self.user_locks:
-            self.user_locks[user_id] = threading.Lock()
-        lock = self.user_locks[user_id]
-
-        # Adquire o lock e lê o arquivo
-        with lock:
-            with open(filepath, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
-            car_data = user_data["user_car"]
-            return ElectricCar(
-                brand=car_data["brand"],
-                model=car_data["model"],
-                battery_capacity=car_data["battery_capacity"],
-                energy_consumption=car_data["energy_consumption"],
-                max_speed=car_data["max_speed"],
-                current_battery=car_data["current_battery"]
-            )
-
-    def delete_user_file(self, user_id):
-        """Remove o arquivo do usuário com lock."""
-        filepath = os.path.join(self.users_dir, f"{user_id}.json")
-        if not os.path.exists(filepath):
-            return
-
-        # Cria ou obtém o lock para este user_id
-        if user_id not in self.user_locks:
-            self.user_locks[user_id] = threading.Lock()
-        lock = self.user_locks[user_id]
-
-        # Adquire o lock e deleta o arquivo
-        with lock:
-            if os.path.exists(filepath):  # Revalida após adquirir o lock
-                os.remove(filepath)
+    def delete_user(self, user_id):
+        """Remove a sessão do usuário."""
+        self.session_store.delete(user_id)
 
     def get_station_data(self, station_id):
-        """Carrega os dados do posto a partir do arquivo JSON com lock."""
-        filepath = os.path.join(self.stations_dir, f"station_{station_id}.json")
-        if not os.path.exists(filepath):
+        """Retorna os dados do posto a partir do armazenamento em memória."""
+        return self.station_store.get_station(station_id)
+
+    def parse_position(self, data):
+        """Extrai (latitude, longitude) válidas dos dados da requisição, ou None."""
+        try:
+            latitude = float(data.get("latitude"))
+            longitude = float(data.get("longitude"))
+        except (ValueError, TypeError):
             return None
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return None
+        return latitude, longitude
+
+    def parse_candidates(self, data):
+        """Quantidade de candidatos pedida (k), limitada ao máximo configurado."""
+        try:
+            k = int(data.get("k", self.default_candidates))
+        except (ValueError, TypeError):
+            k = self.default_candidates
+        return max(1, min(k, self.max_candidates))
+
+    def nearby_stations(self, latitude, longitude, k, max_distance=None):
+        """Consulta o índice espacial e monta o mesmo formato de list_stations enviado pelos clientes."""
+        if self.spatial_index is None:
+            return {}
+        return {
+            # Distância mínima positiva: o carro pode estar exatamente sobre o posto
+            station_id: {"distance_origin_position": max(distance, 0.01)}
+            for station_id, distance in self.spatial_index.nearest(latitude, longitude, k, max_distance)
+        }
 
-        # Cria ou obtém o lock para este station_id
-        if station_id not in self.locks:
-            self.locks[station_id] = threading.Lock()
-        lock = self.locks[station_id]
-
-        # Adquire o lock e lê o arquivo
-        with lock:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
+    def nearby_candidates(self, vectors, latitude, longitude, k):
+        """Candidatos do índice espacial a partir da posição do carro: (posições em `vectors`, distâncias)."""
+        spatial_index = self.spatial_index
+        if spatial_index is None:
+            return [], []
+        indexes, distances = spatial_index.nearest_indices(latitude, longitude, k)
+        distances = [max(distance, 0.01) for distance in distances]  # O carro pode estar sobre o posto
+        if vectors.source is spatial_index.ids:
+            return indexes, distances  # Vetores na ordem do índice: as posições são os próprios índices
+        # Catálogo recarregado durante a seleção: os vetores seguem outra ordem, então remapeia pelos IDs
+        pairs = [(vectors.positions[spatial_index.ids[index]], distance) for index, distance in zip(indexes, distances)
+                 if spatial_index.ids[index] in vectors.positions]
+        return [position for position, _ in pairs], [distance for _, distance in pairs]
 
     def calculate_travel_time(self, car, distance):
         """Calcula o tempo de viagem em segundos (70% da velocidade máxima)."""
-        speed = car.max_speed * 0.7  # km/h
+        speed = car.max_speed * TRAVEL_SPEED_FACTOR  # km/h
         return (distance / speed) * 3600  # Convertido para segundos
 
     def calculate_charge_time(self, car):
@@ -80,135 +90,217 @@ class StationManager:
         energy_needed = min(car.battery_capacity * 0.8 - car.current_battery, car.battery_capacity - car.current_battery)
         return (energy_needed / charge_rate) * 3600  # Segundos
 
+    def parse_distances(self, list_stations, vectors):
+        """Candidatos de list_stations com distância válida: (posições em `vectors`, distâncias)."""
+        positions, distances = [], []
+        for station_id, station_info in list_stations.items():
+            try:
+                distance = float(station_info.get("distance_origin_position"))
+            except (ValueError, TypeError, AttributeError):
+                continue  # Ignora estações com distância inválida
+            position = vectors.positions.get(str(station_id))
+            if distance > 0 and position is not None:  # IDs fora dos vetores são postos inexistentes
+                positions.append(position)
+                distances.append(distance)
+        return positions, distances
+
+    def load_candidates(self, vectors, positions, distances, current_time):
+        """Coleta por índice, nos vetores do armazenamento, o estado dos candidatos existentes.
+
+        Retorna (posições, distâncias, vagas livres, próxima liberação), alinhados entre si.
+        """
+        return self.station_store.gather(vectors, positions, distances, current_time)
+
+    def station_details(self, station_id, user_id):
+        """Endereço do posto escolhido e a entrada do usuário nele (ou None)."""
+        station_data = self.get_station_data(station_id)
+        return station_data.get("address", "Endereço não disponível"), station_data["vehicles"].get(user_id)
+
+    def station_availability(self, station_ids):
+        """Vagas livres de cada posto existente: {station_id: vagas}."""
+        availability = {}
+        for station_id in station_ids:
+            station_data = self.get_station_data(station_id)
+            if station_data:
+                availability[station_id] = station_data["available_slots"]
+        return availability
+
+    def place_hold(self, user_id, station_id, candidate_ids, current_time):
+        """Pré-reserva uma vaga no posto recomendado até o PAYMENT.
+
+        Retorna o prazo em segundos, ou None se nenhuma pré-reserva foi feita (vaga tomada desde
+        a leitura, ou o usuário já tem a vaga confirmada pelo PAYMENT no posto).
+        """
+        # Uma nova seleção substitui as pré-reservas do usuário nos outros candidatos
+        for other_id in candidate_ids:
+            if other_id == station_id:
+                continue
+            vehicle = self.get_station_data(other_id)["vehicles"].get(user_id)
+            if vehicle is not None and vehicle.get("hold"):
+                self.station_store.release(other_id, [user_id], holds_only=True)
+
+        expires_at = current_time + self.hold_ttl
+        if not self.station_store.reserve(station_id, user_id, expires_at, hold=True):
+            return None  # Vaga tomada desde a leitura: segue apenas como recomendação
+        vehicle = self.station_store.get_station(station_id)["vehicles"].get(user_id)
+        if vehicle is None or not vehicle.get("hold"):
+            return None  # Reserva já confirmada: reserve() não a rebaixa para pré-reserva
+        # A pré-reserva não confirmada é devolvida pelo mesmo agendador das liberações
+        if self.release_scheduler:
+            self.release_scheduler.schedule(station_id, user_id, expires_at)
+        return self.hold_ttl
+
     def handle_selection_station(self, request):
-        """Seleciona o posto mais adequado com base no tempo total."""
+        """Seleciona o posto mais adequado com base no tempo total.
+
+        Com `hold: true`, também pré-reserva uma vaga no posto recomendado por `hold_ttl` segundos.
+        """
         data = request["data"]
         user_id = data.get("user_id")
         list_stations = data.get("list_stations")
 
         # Validação dos campos
         if not user_id:
-            return {
-                "type": "SELECTION_STATION",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": None,
-                    "price_loading": 0,
-                    "message": "user_id ausente"
-                },
-                "status": {"code": 400, "message": "Erro na requisição"},
-                "timestamp": get_current_timestamp()
-            }
-
-        if not list_stations or not isinstance(list_stations, dict):
-            return {
-                "type": "SELECTION_STATION",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": None,
-                    "price_loading": 0,
-                    "message": "list_stations ausente ou inválido"
-                },
-                "status": {"code": 400, "message": "Erro na requisição"},
-                "timestamp": get_current_timestamp()
-            }
+            return build_response("SELECTION_STATION", {
+                "user_id": user_id,
+                "id_station": None,
+                "price_loading": 0,
+                "message": "user_id ausente"
+            }, 400, "Erro na requisição")
+
+        # Sem lista do cliente: candidatos vêm do índice espacial a partir da posição do carro
+        vectors = self.station_store.vectors  # Mesma ordem durante toda a seleção
+        position = self.parse_position(data)
+        candidates = None
+        if not list_stations and position:
+            candidates = self.nearby_candidates(vectors, *position, self.parse_candidates(data))
+            if not candidates[0]:
+                candidates = None
+        elif list_stations and isinstance(list_stations, dict):
+            candidates = self.parse_distances(list_stations, vectors)
+
+        if candidates is None:
+            return build_response("SELECTION_STATION", {
+                "user_id": user_id,
+                "id_station": None,
+                "price_loading": 0,
+                "message": "list_stations ausente ou inválido"
+            }, 400, "Erro na requisição")
 
         # Carrega o carro do usuário
         car = self.get_user_car(user_id)
         if not car:
-            return {
-                "type": "SELECTION_STATION",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": None,
-                    "price_loading": 0,
-                    "message": "Usuário não encontrado"
-                },
-                "status": {"code": 404, "message": "Usuário não encontrado"},
-                "timestamp": get_current_timestamp()
-            }
+            return build_response("SELECTION_STATION", {
+                "user_id": user_id,
+                "id_station": None,
+                "price_loading": 0,
+                "message": "Usuário não encontrado"
+            }, 404, "Usuário não encontrado")
 
         # Calcula a autonomia atual para referência
         autonomy = car.current_range()
 
-        # Avalia os postos
-        viable_stations = []
-        for station_id, station_info in list_stations.items():
-            distance = station_info.get("distance_origin_position")
-            try:
-                distance = float(distance)
-                if distance <= 0:
-                    continue  # Ignora distâncias inválidas
-            except (ValueError, TypeError):
-                continue  # Ignora estações com distância inválida
-
-            # Verifica se o carro pode chegar ao posto
-            if not car.can_complete_trip(distance):
-                continue
+        current_time = get_current_timestamp(as_float=True)  # Timestamp em segundos
+        positions, distances, available_slots, next_release = self.load_candidates(vectors, *candidates, current_time)
+
+        # Alcance, viagem, espera e tempo total de todos os candidatos de uma vez
+        charge_time = self.calculate_charge_time(car)  # Segundos
+        best = score_stations(
+            distances, available_slots, next_release, current_time,
+            car.current_battery, car.energy_consumption, car.max_speed * TRAVEL_SPEED_FACTOR, charge_time
+        )
+        if best is None:
+            return build_response("SELECTION_STATION", {
+                "user_id": user_id,
+                "id_station": None,
+                "price_loading": 0,
+                "message": f"Nenhum posto alcançável ou disponível encontrado. Autonomia atual: {autonomy:.2f} km"
+            }, 200, "Nenhum posto disponível")
+
+        # Posto com menor tempo total
+        index, travel_time, wait_time, total_time = best
+        station_id = vectors.ids[positions[index]]
+        address, vehicle = self.station_details(station_id, user_id)
+        price_loading = charge_time * 0.1  # Exemplo: 0.1 unidade por segundo
+        travel_minutes = travel_time / 60
+
+        response = build_response("SELECTION_STATION", {
+            "user_id": user_id,
+            "id_station": station_id,
+            "price_loading": price_loading,
+            "message": f"Posto recomendado: {address}. Distância: {float(distances[index])} km, tempo estimado de chegada: {travel_minutes:.1f} minutos"
+        })
+        if data.get("hold") is True:
+            # Só há o que pré-reservar (ou renovar) se o posto tem vaga livre agora
+            can_hold = available_slots[index] > 0 or vehicle is not None
+            candidate_ids = [vectors.ids[position] for position in positions]
+            hold_expires_in = self.place_hold(user_id, station_id, candidate_ids, current_time) if can_hold else None
+            if hold_expires_in is not None:
+                response["data"]["hold_expires_in"] = hold_expires_in
+        return response
+
+    def handle_nearest_stations(self, request):
+        """Retorna os k postos mais próximos da posição do carro (alcançáveis, se user_id for informado)."""
+        data = request["data"]
+        user_id = data.get("user_id")
 
-            # Carrega dados do posto com lock
-            station_data = self.get_station_data(station_id)
-            if not station_data:
-                continue  # Ignora postos inexistentes
-
-            # Calcula tempos
-            travel_time = self.calculate_travel_time(car, distance)  # Segundos
-            charge_time = self.calculate_charge_time(car)  # Segundos
-            wait_time = 0
-
-            # Verifica disponibilidade de vagas
-            if station_data["available_slots"] == 0:
-                # Calcula o tempo até a próxima vaga liberar
-                min_time_to_finish = float("inf")
-                current_time = get_current_timestamp(as_float=True)  # Timestamp em segundos
-                for vehicle in station_data["vehicles"].values():
-                    remaining_time = vehicle["estimated_timestamp"] - current_time
-                    if remaining_time > 0:
-                        min_time_to_finish = min(min_time_to_finish, remaining_time)
-                if min_time_to_finish == float("inf"):
-                    continue  # Nenhum veículo está carregando (erro nos dados)
-                wait_time = max(0, min_time_to_finish - travel_time)
-
-            total_time = travel_time + wait_time + charge_time
-            viable_stations.append({
-                "id": station_id,
-                "distance": distance,
-                "total_time": total_time,
-                "travel_time": travel_time,
-                "wait_time": wait_time,
-                "charge_time": charge_time,
-                "address": station_data.get("address", "Endereço não disponível")
+        position = self.parse_position(data)
+        if not position:
+            return build_response("NEAREST_STATIONS", {"stations": [], "message": "latitude e longitude ausentes ou inválidas"},
+                                  400, "Erro na requisição")
+
+        # Com user_id, descarta postos além da autonomia atual do carro
+        max_distance = None
+        if user_id:
+            car = self.get_user_car(user_id)
+            if not car:
+                return build_response("NEAREST_STATIONS", {"stations": [], "message": "Usuário não encontrado"},
+                                      404, "Usuário não encontrado")
+            max_distance = car.current_range()
+
+        nearby = self.nearby_stations(*position, self.parse_candidates(data), max_distance)
+        availability = self.station_availability(list(nearby))
+        stations = []
+        for station_id, station_info in nearby.items():
+            station_model = self.station_models.get(station_id, {})
+            stations.append({
+                "id_station": station_id,
+                "distance": round(station_info["distance_origin_position"], 3),
+                "name_station": station_model.get("name_station"),
+                "address": station_model.get("address"),
+                "available_slots": availability.get(station_id, 0)
             })
 
-        if not viable_stations:
-            return {
-                "type": "SELECTION_STATION",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": None,
-                    "price_loading": 0,
-                    "message": f"Nenhum posto alcançável ou disponível encontrado. Autonomia atual: {autonomy:.2f} km"
-                },
-                "status": {"code": 200, "message": "Nenhum posto disponível"},
-                "timestamp": get_current_timestamp()
-            }
+        return build_response("NEAREST_STATIONS", {"stations": stations})
 
-        # Escolhe o posto com menor tempo total
-        best_station = min(viable_stations, key=lambda x: x["total_time"])
-        price_loading = best_station["charge_time"] * 0.1  # Exemplo: 0.1 unidade por segundo
-        travel_minutes = best_station["travel_time"] / 60
+    def handle_station_status(self, request):
+        """Retorna a ocupação atual de vários postos em uma única chamada (todos, se a lista for omitida)."""
+        data = request["data"]
+        station_ids = data.get("stations")
+        if station_ids is None:
+            station_ids = self.station_store.station_ids()
+        if not isinstance(station_ids, list):
+            return build_response("STATION_STATUS", {"stations": [], "message": "stations deve ser uma lista de IDs"},
+                                  400, "Erro na requisição")
+
+        current_time = get_current_timestamp(as_float=True)
+        stations, not_found = [], []
+        for station_id in station_ids:
+            occupancy = self.station_store.occupancy(station_id, current_time)
+            if occupancy is None:
+                not_found.append(station_id)
+                continue
+            occupied, max_slots, next_release = occupancy
+            stations.append({
+                "id_station": str(station_id),
+                "occupied_slots": occupied,
+                "available_slots": max_slots - occupied,
+                "max_slots": max_slots,
+                # Segundos até a próxima vaga liberar (None se não há reservas ativas)
+                "next_release_in": round(max(0, next_release - current_time), 1) if next_release != INF else None
+            })
 
-        return {
-            "type": "SELECTION_STATION",
-            "data": {
-                "user_id": user_id,
-                "id_station": best_station["id"],
-                "price_loading": price_loading,
-                "message": f"Posto recomendado: {best_station['address']}. Distância: {best_station['distance']} km, tempo estimado de chegada: {travel_minutes:.1f} minutos"
-            },
-            "status": {"code": 200, "message": "Sucesso"},
-            "timestamp": get_current_timestamp()
-        }
+        return build_response("STATION_STATUS", {"stations": stations, "not_found": not_found})
 
     def handle_payment(self, request):
         """Processa o pagamento e reserva a vaga no posto, ou deleta o usuário se não confirmado."""
@@ -219,125 +311,124 @@ class StationManager:
 
         # Validação dos campos
         if not all([user_id, id_station, confirmation is not None]):
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": False,
-                    "message": "Campos obrigatórios ausentes (user_id, id_station, confirmation)"
-                },
-                "status": {"code": 400, "message": "Erro na requisição"},
-                "timestamp": get_current_timestamp()
-            }
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "Campos obrigatórios ausentes (user_id, id_station, confirmation)"
+            }, 400, "Erro na requisição")
 
         if not isinstance(confirmation, bool):
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": False,
-                    "message": "confirmation deve ser true ou false"
-                },
-                "status": {"code": 400, "message": "Erro na requisição"},
-                "timestamp": get_current_timestamp()
-            }
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "confirmation deve ser true ou false"
+            }, 400, "Erro na requisição")
 
         # Carrega o carro do usuário
         car = self.get_user_car(user_id)
         if not car:
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": False,
-                    "message": "Usuário não encontrado"
-                },
-                "status": {"code": 404, "message": "Usuário não encontrado"},
-                "timestamp": get_current_timestamp()
-            }
-
-        # Caminho do arquivo do posto
-        filepath = os.path.join(self.stations_dir, f"station_{id_station}.json")
-        if not os.path.exists(filepath):
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": False,
-                    "message": "Posto não encontrado"
-                },
-                "status": {"code": 404, "message": "Posto não encontrado"},
-                "timestamp": get_current_timestamp()
-            }
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "Usuário não encontrado"
+            }, 404, "Usuário não encontrado")
+
+        # Verifica se o posto existe
+        if self.get_station_data(id_station) is None:
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "Posto não encontrado"
+            }, 404, "Posto não encontrado")
 
-        # Se o usuário não confirmar o pagamento, deleta o arquivo do usuário
+        # Se o usuário não confirmar o pagamento, devolve a pré-reserva e remove a sessão do usuário
         if not confirmation:
-            self.delete_user_file(user_id)
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": False,
-                    "message": "Pagamento não confirmado. Usuário removido do sistema."
-                },
-                "status": {"code": 200, "message": "Sucesso"},
-                "timestamp": get_current_timestamp()
-            }
+            self.station_store.release(id_station, [user_id], holds_only=True)
+            self.delete_user(user_id)
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "Pagamento não confirmado. Usuário removido do sistema."
+            })
 
-        # Cria ou obtém o lock para este station_id
-        if id_station not in self.locks:
-            self.locks[id_station] = threading.Lock()
-        lock = self.locks[id_station]
-
-        # Adquire o lock e processa a reserva
-        with lock:
-            # Lê o estado atual do posto
-            with open(filepath, "r", encoding="utf-8") as f:
-                station_data = json.load(f)
-
-            # Verifica se ainda há vagas disponíveis
-            if station_data["available_slots"] <= 0:
-                return {
-                    "type": "PAYMENT",
-                    "data": {
-                        "user_id": user_id,
-                        "id_station": id_station,
-                        "confirmation": False,
-                        "message": "Nenhuma vaga disponível no posto no momento"
-                    },
-                    "status": {"code": 200, "message": "Sem vagas disponíveis"},
-                    "timestamp": get_current_timestamp()
-                }
-
-            # Calcula o tempo de carregamento
-            charge_time = self.calculate_charge_time(car)  # Segundos
-            current_time = get_current_timestamp(as_float=True)  # Timestamp atual em segundos
-            estimated_timestamp = current_time + charge_time  # Timestamp estimado de término
-
-            # Atualiza os dados do posto
-            station_data["available_slots"] -= 1
-            station_data["vehicles"][user_id] = {
-                "estimated_timestamp": estimated_timestamp
-            }
+        # Calcula o tempo de carregamento
+        charge_time = self.calculate_charge_time(car)  # Segundos
+        current_time = get_current_timestamp(as_float=True)  # Timestamp atual em segundos
+        estimated_timestamp = current_time + charge_time  # Timestamp estimado de término
 
-            # Escreve o arquivo atualizado
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(station_data, f, indent=4)
-
-            return {
-                "type": "PAYMENT",
-                "data": {
-                    "user_id": user_id,
-                    "id_station": id_station,
-                    "confirmation": True,
-                    "message": f"Reserva realizada com sucesso no posto {id_station}. Carregamento estimado para terminar em {charge_time / 60:.1f} minutos."
-                },
-                "status": {"code": 200, "message": "Sucesso"},
-                "timestamp": get_current_timestamp()
+        # Reserva a vaga no armazenamento, confirmando a pré-reserva de SELECTION_STATION se houver
+        reserved = self.station_store.reserve(id_station, user_id, estimated_timestamp)
+        if not reserved:
+            return build_response("PAYMENT", {
+                "user_id": user_id,
+                "id_station": id_station,
+                "confirmation": False,
+                "message": "Nenhuma vaga disponível no posto no momento"
+            }, 200, "Sem vagas disponíveis")
+
+        # Agenda a liberação da vaga para o término estimado do carregamento
+        if self.release_scheduler:
+            self.release_scheduler.schedule(id_station, user_id, estimated_timestamp)
+
+        return build_response("PAYMENT", {
+            "user_id": user_id,
+            "id_station": id_station,
+            "confirmation": True,
+            "message": f"Reserva realizada com sucesso no posto {id_station}. Carregamento estimado para terminar em {charge_time / 60:.1f} minutos."
+        })
+
+    def handle_station_lookup(self, request):
+        """Estado dos postos candidatos deste shard, consultado pelo roteador (uso interno).
+
+        Para cada posto existente retorna as vagas livres, a próxima liberação (se lotado),
+        o endereço e, em `vehicles`, apenas a entrada do próprio usuário, se houver.
+        """
+        data = request["data"]
+        user_id = data.get("user_id")
+        station_ids = data.get("stations")
+        if not isinstance(station_ids, list):
+            return build_response("STATION_LOOKUP", {"stations": {}, "message": "stations deve ser uma lista de IDs"},
+                                  400, "Erro na requisição")
+
+        current_time = get_current_timestamp(as_float=True)
+        stations = {}
+        for station_id in station_ids:
+            station_data = self.get_station_data(station_id)
+            if not station_data:
+                continue
+            vehicle = station_data["vehicles"].get(user_id)
+            next_release = (self.station_store.next_release(station_id, current_time)
+                            if station_data["available_slots"] <= 0 else INF)
+            view = {
+                "available_slots": station_data["available_slots"],
+                "next_release": next_release if next_release != INF else None,
+                "vehicles": {user_id: vehicle} if vehicle is not None else {}
             }
-        
\ No newline at end of file
+            if "address" in station_data:
+                view["address"] = station_data["address"]
+            stations[str(station_id)] = view
+
+        return build_response("STATION_LOOKUP", {"stations": stations})
+
+    def handle_station_hold(self, request):
+        """Devolve as pré-reservas do usuário em `release` e pré-reserva `id_station` (uso interno do roteador)."""
+        data = request["data"]
+        user_id = data.get("user_id")
+        if not user_id:
+            return build_response("STATION_HOLD", {"hold_expires_in": None, "message": "user_id ausente"},
+                                  400, "Erro na requisição")
+
+        for station_id in data.get("release") or []:
+            self.station_store.release(station_id, [user_id], holds_only=True)
+
+        hold_expires_in = None
+        station_id = data.get("id_station")
+        if station_id is not None and self.get_station_data(station_id):
+            # As outras pré-reservas já foram devolvidas pelo roteador: nenhum candidato a revisar
+            hold_expires_in = self.place_hold(user_id, str(station_id), [], get_current_timestamp(as_float=True))
+        return build_response("STATION_HOLD", {"hold_expires_in": hold_expires_in})
@@ -1,17 +1,46 @@
+import os
+import time
 import socket
 import json
+import signal
 import selectors
-import sys
-import traceback
-from controller import route_request
-from utils.time_utils import get_current_timestamp
+import argparse
+import controller
+from controller import route_request, error_response, shutdown, subscribe_stations, station_deltas, change_feed
+from utils.codec import encode_response, loads, JSONDecodeError
+from utils.time_utils import pin_timestamp
+from utils.framing import FrameBuffer, OutputQueue
+from utils.timer_wheel import TimerWheel
+from utils.wire import negotiate
+from utils.hash_ring import parse_nodes, node_address
+from utils.metrics import metrics, start_metrics_server
+from utils.log import get_logger, configure_logging, flush_logging, LOG_FORMATS
+from async_server import AsyncServer, LOOP_POLICIES
+
+log = get_logger("server")
 
 
 class Server:
-    def __init__(self, host='0.0.0.0', port=8888, max_connections=100):
+    def __init__(self, host='0.0.0.0', port=8888, max_connections=10000, reuse_port=False,
+                 inbound_high_water=4 * 1024 * 1024, outbound_high_water=1024 * 1024,
+                 listen_backlog=1024, idle_timeout=300, write_timeout=30, max_output_buffer=16 * 1024 * 1024,
+                 feed_interval=0.1):
         self.host = host
         self.port = port
-        self.max_connections = max_connections
+        self.max_connections = max_connections  # Conexões simultâneas; acima disso recusa com 503
+        self.listen_backlog = listen_backlog
+        self.reuse_port = reuse_port  # Vários processos escutando a mesma porta
+        # Limites por conexão: acima deles o servidor para de ler até a saída esvaziar
+        self.inbound_high_water = inbound_high_water
+        self.outbound_high_water = outbound_high_water
+        # Conexões sem tráfego por idle_timeout, ou com saída parada por write_timeout, são encerradas
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.max_output_buffer = max_output_buffer  # Saída não lida acima disso encerra a conexão
+        self.feed_interval = feed_interval  # Segundos entre envios das mudanças de vagas (SUBSCRIBE_STATIONS)
+        self.next_feed = 0.0
+        self.timers = TimerWheel(tick=1.0, now=time.monotonic())  # Prazo de inatividade por conexão
+        self.connections = 0
         self.selector = selectors.DefaultSelector()
         self.running = False
 
@@ -21,8 +50,11 @@ class Server:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             # Permite reutilizar o endereço/porta
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                # O kernel distribui as novas conexões entre os processos
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(self.max_connections)
+            self.server_socket.listen(self.listen_backlog)
             # Define o socket como não-bloqueante
             self.server_socket.setblocking(False)
 
@@ -30,11 +62,13 @@ class Server:
             self.selector.register(self.server_socket, selectors.EVENT_READ, data=None)
 
             self.running = True
-            print(f"Servidor iniciado em {self.host}:{self.port}")
+            log.info("Servidor iniciado", host=self.host, port=self.port)
 
             while self.running:
-                # Aguarda eventos em qualquer socket registrado
-                events = self.selector.select(timeout=1)
+                # Aguarda eventos em qualquer socket registrado; com inscritos, acorda a cada tick do feed
+                events = self.selector.select(timeout=self.feed_interval if change_feed.has_subscribers() else 1)
+                # Um único instante por volta do loop para todas as respostas montadas nela
+                pin_timestamp()
                 for key, mask in events:
                     if key.data is None:
                         # Caso seja o socket do servidor, aceita nova conexão
@@ -42,18 +76,23 @@ class Server:
                     else:
                         # Caso seja um socket de cliente, processa os dados
                         self._handle_client_data(key, mask)
+                # Só as conexões cujo prazo venceu neste tick são examinadas
+                now = time.monotonic()
+                self._expire_connections(now)
+                if now >= self.next_feed:
+                    self.next_feed = now + self.feed_interval
+                    self._push_station_deltas()
 
         except KeyboardInterrupt:
-            print("Servidor interrompido pelo usuário")
+            log.info("Servidor interrompido pelo usuário")
         except Exception as e:
-            print(f"Erro no servidor: {e}")
-            traceback.print_exc()
+            log.exception("Erro no servidor", error=e)
         finally:
             self.stop()
 
     def stop(self):
         """Encerra o servidor de forma segura."""
-        print("Encerrando servidor...")
+        log.info("Encerrando servidor")
         self.running = False
 
         # Fecha todos os sockets registrados
@@ -65,68 +104,164 @@ class Server:
                 pass
 
         self.selector.close()
-        print("Servidor encerrado")
+        shutdown()
+        log.info("Servidor encerrado")
 
     def _accept_connection(self, server_socket):
         """Aceita uma nova conexão de cliente."""
         try:
             client_socket, client_address = server_socket.accept()
-            print(f"Conexão aceita de {client_address}")
+            if self.connections >= self.max_connections:
+                self._reject_connection(client_socket, client_address)
+                return
+            log.debug("Conexão aceita", address=client_address)
+            metrics.inc("connections_accepted_total")
+            self.connections += 1
 
             # Define o socket do cliente como não-bloqueante
             client_socket.setblocking(False)
 
             # Cria estrutura de dados para acompanhar esta conexão
             data = {
+                "socket": client_socket,  # Identifica a conexão no feed de mudanças dos postos
                 "address": client_address,
-                "inb": b"",  # Buffer de entrada
-                "outb": b"",  # Buffer de saída
-                "connected": True
+                "inb": FrameBuffer(),  # Buffer de entrada (recv_into, sem cópias)
+                "outb": OutputQueue(),  # Blocos de saída (enviados com sendmsg)
+                "connected": True,
+                "codec": None,  # BinaryCodec após o handshake HELLO; None = JSON por linha
+                "events": selectors.EVENT_READ,  # Interesse registrado no seletor
+                "last_active": time.monotonic()  # Último byte recebido ou enviado
             }
 
-            # Registra o novo socket para leitura e escrita
-            self.selector.register(client_socket, selectors.EVENT_READ | selectors.EVENT_WRITE, data=data)
+            # Registra apenas leitura: escrita só é monitorada com saída pendente
+            self.selector.register(client_socket, selectors.EVENT_READ, data=data)
+            self.timers.schedule(client_socket, data["last_active"] + self.idle_timeout)
 
         except Exception as e:
-            print(f"Erro ao aceitar conexão: {e}")
+            log.error("Erro ao aceitar conexão", error=e)
 
     def _handle_client_data(self, key, mask):
         """Processa dados de um cliente."""
         client_socket = key.fileobj
         data = key.data
 
-        if not data["connected"]:
-            self._close_connection(client_socket)
-            return
-
         try:
-            if mask & selectors.EVENT_READ:
-                recv_data = client_socket.recv(4096)
-
-                if recv_data:
-                    data["inb"] += recv_data
-                    while b'\n' in data["inb"]:
-                        raw_message, data["inb"] = data["inb"].split(b'\n', 1)
-                        self._process_message(data, raw_message)
+            if mask & selectors.EVENT_READ and data["connected"]:
+                received = data["inb"].recv_into(client_socket)
+                metrics.inc("bytes_received_total", received)
+                # Atividade só atualiza o horário: a roda confere o prazo quando ele vencer
+                data["last_active"] = time.monotonic()
+
+                if received:
+                    self._process_pending(data)
                 else:
-                    print(f"Conexão fechada pelo cliente {data['address']}")
+                    log.debug("Conexão fechada pelo cliente", address=data["address"])
                     data["connected"] = False
 
-            if mask & selectors.EVENT_WRITE and data["outb"]:
-                sent = client_socket.send(data["outb"])
-                data["outb"] = data["outb"][sent:]
-
-                if not data["outb"] and not data["connected"]:
-                    self._close_connection(client_socket)
-
-        except ConnectionResetError:
-            print(f"Conexão resetada pelo cliente {data['address']}")
+            if data["outb"]:
+                # Escrita otimista: tenta enviar já, sem esperar outra volta do seletor
+                try:
+                    sent = data["outb"].send(client_socket)
+                except BlockingIOError:
+                    sent = 0
+                if sent:
+                    metrics.inc("bytes_sent_total", sent)
+                    data["last_active"] = time.monotonic()
+                if len(data["outb"]) < self.outbound_high_water:
+                    # Saída drenou abaixo do limite: retoma as requisições já recebidas
+                    self._process_pending(data)
+
+            if not data["connected"] and not data["outb"]:
+                self._close_connection(client_socket)
+                return
+            if len(data["outb"]) > self.max_output_buffer:
+                # Cliente não lê as respostas: descarta a saída em vez de acumulá-la
+                log.warning("Cliente lento desconectado", address=data["address"], pending=len(data["outb"]))
+                metrics.inc("connections_evicted_total")
+                self._close_connection(client_socket)
+                return
+
+            self._update_interest(client_socket, data)
+
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente encerrou a conexão durante a leitura ou o envio: não é erro do servidor
+            log.debug("Conexão resetada pelo cliente", address=data["address"])
             self._close_connection(client_socket)
         except Exception as e:
-            print(f"Erro ao processar dados do cliente {data['address']}: {e}")
-            traceback.print_exc()
+            log.exception("Erro ao processar dados do cliente", address=data["address"], error=e)
+            self._close_connection(client_socket)
+
+    def _process_pending(self, data):
+        """Processa os frames recebidos enquanto a saída estiver abaixo do limite."""
+        while True:
+            codec = data["codec"]
+            frames = codec.frames(data["inb"]) if codec else data["inb"].frames()
+            for raw_message in frames:
+                self._process_message(data, raw_message)
+                if len(data["outb"]) >= self.outbound_high_water or data["codec"] is not codec:
+                    break  # Pipeline pausado, ou protocolo trocado: o restante usa o novo framing
+            else:
+                break
+            if data["codec"] is codec:
+                break
+
+        if len(data["inb"]) >= self.inbound_high_water and len(data["outb"]) < self.outbound_high_water:
+            # Nenhum frame completo no limite de entrada: a mensagem é grande demais
+            response = error_response(413, "Mensagem excede o tamanho máximo")
+            data["outb"].append(self._encode(data, response))
+            data["inb"].clear()
+            data["connected"] = False
+
+    def _update_interest(self, client_socket, data):
+        """Ajusta o interesse no seletor conforme os buffers da conexão."""
+        events = 0
+        if data["connected"] and len(data["outb"]) < self.outbound_high_water \
+                and len(data["inb"]) < self.inbound_high_water:
+            events |= selectors.EVENT_READ
+        if data["outb"]:
+            events |= selectors.EVENT_WRITE
+
+        if events != data["events"]:
+            if events & selectors.EVENT_WRITE and not data["events"] & selectors.EVENT_WRITE:
+                # Saída ficou pendente: o cliente tem write_timeout para voltar a ler
+                self.timers.schedule(client_socket, time.monotonic() + self.write_timeout)
+            self.selector.modify(client_socket, events, data=data)
+            data["events"] = events
+
+    def _expire_connections(self, now):
+        """Encerra as conexões ociosas ou com a saída parada cujo prazo na roda venceu."""
+        for client_socket in self.timers.advance(now):
+            data = self.selector.get_key(client_socket).data
+            # Com saída pendente vale o prazo de escrita; sem ela, o de inatividade
+            timeout = self.write_timeout if data["outb"] else self.idle_timeout
+            deadline = data["last_active"] + timeout
+            if deadline > now:
+                self.timers.schedule(client_socket, deadline)  # Houve atividade: novo prazo
+                continue
+            if not data["outb"] and change_feed.is_subscribed(client_socket):
+                # Inscrito aguardando mudanças não está ocioso
+                self.timers.schedule(client_socket, now + self.idle_timeout)
+                continue
+            if data["outb"]:
+                log.warning("Cliente lento desconectado", address=data["address"], pending=len(data["outb"]))
+                metrics.inc("connections_evicted_total")
+            else:
+                log.debug("Conexão ociosa encerrada", address=data["address"])
+                metrics.inc("connections_idle_closed_total")
             self._close_connection(client_socket)
 
+    def _reject_connection(self, client_socket, client_address):
+        """Recusa uma conexão acima do limite com uma resposta 503, sem registrá-la no seletor."""
+        log.debug("Conexão recusada: limite atingido", address=client_address, limit=self.max_connections)
+        metrics.inc("connections_rejected_total")
+        try:
+            client_socket.setblocking(False)
+            client_socket.send(encode_response(error_response(503, "Servidor lotado. Tente novamente mais tarde")))
+        except OSError:
+            pass  # Buffer cheio ou cliente já desconectado: apenas fecha
+        finally:
+            client_socket.close()
+
     def _check_complete_json(self, data):
         """Verifica se temos um JSON completo no buffer."""
         try:
@@ -140,54 +275,217 @@ class Server:
             return False
 
     def _process_message(self, data, raw_message):
-        """Processa uma mensagem JSON recebida."""
+        """Processa uma mensagem recebida (JSON por linha ou frame binário)."""
+        if data["codec"]:
+            self._process_binary_message(data, raw_message)
+            return
         try:
-            json_str = raw_message.decode('utf-8')
-            request = json.loads(json_str)
-            print(f"[RECEBIDO] {data['address']}: {json_str}")
-
-            response = route_request(request)
-            response_bytes = json.dumps(response).encode('utf-8') + b'\n'
-            data["outb"] += response_bytes
-
-        except json.JSONDecodeError:
-            error_response = {
-                "type": "error",
-                "data": {},
-                "status": {"code": 400, "message": "JSON inválido"},
-                "timestamp": get_current_timestamp()
-            }
-            data["outb"] += json.dumps(error_response).encode('utf-8') + b'\n'
+            request = loads(raw_message)
+            log.sample("Requisição recebida", payload=raw_message, address=data["address"])
+
+            if isinstance(request, dict) and request.get("type") == "HELLO":
+                # Handshake: a resposta segue em JSON e os frames seguintes usam o protocolo negociado
+                response, data["codec"] = negotiate(request)
+                data["outb"].append(encode_response(response))
+                return
+
+            response = self._route(data, request)
+            response_bytes = encode_response(response)
+            data["outb"].append(response_bytes)
+
+        except JSONDecodeError:
+            response = error_response(400, "JSON inválido")
+            data["outb"].append(encode_response(response))
 
         except Exception as e:
-            error_response = {
-                "type": "error",
-                "data": {},
-                "status": {"code": 500, "message": f"Erro interno: {str(e)}"},
-                "timestamp": get_current_timestamp()
-            }
-            data["outb"] += json.dumps(error_response).encode('utf-8') + b'\n'
-            data["inb"] = b""
+            response = error_response(500, f"Erro interno: {str(e)}", cached=False)
+            data["outb"].append(encode_response(response))
+            data["inb"].clear()
 
-    def _close_connection(self, client_socket):
-        """Fecha a conexão com um cliente de forma segura."""
+    def _process_binary_message(self, data, frame):
+        """Processa um frame binário com o codec negociado na conexão."""
+        codec = data["codec"]
         try:
-            print(f"Fechando conexão com {client_socket.getpeername()}")
-        except:
-            pass
+            request = codec.decode_request(frame)
+        except Exception:
+            data["outb"].append(codec.encode_response(error_response(400, "Frame inválido")))
+            return
+        try:
+            response = self._route(data, request)
+        except Exception as e:
+            response = error_response(500, f"Erro interno: {str(e)}", cached=False)
+        data["outb"].append(codec.encode_response(response))
+
+    def _route(self, data, request):
+        """Encaminha a requisição ao controller; SUBSCRIBE_STATIONS depende da conexão e é tratado aqui."""
+        if isinstance(request, dict) and request.get("type") == "SUBSCRIBE_STATIONS":
+            return subscribe_stations(data["socket"], request)
+        return route_request(request)
+
+    def _push_station_deltas(self):
+        """Envia aos inscritos as mudanças de vagas do tick, serializadas uma vez por protocolo."""
+        for subscribers, response in station_deltas():
+            encoded = {}  # Codificação da conexão (None = JSON por linha) -> bytes
+            for client_socket in subscribers:
+                key = self.selector.get_key(client_socket)
+                codec = key.data["codec"]
+                encoding = codec.encoding if codec else None
+                if encoding not in encoded:
+                    encoded[encoding] = self._encode(key.data, response)
+                key.data["outb"].append(encoded[encoding])
+                metrics.inc("feed_pushes_total")
+                # Envia já, com as mesmas verificações de cliente lento das respostas
+                self._handle_client_data(key, 0)
+
+    def _encode(self, data, response):
+        """Serializa a resposta no protocolo da conexão."""
+        return data["codec"].encode_response(response) if data["codec"] else encode_response(response)
 
+    def _close_connection(self, client_socket):
+        """Fecha a conexão com um cliente de forma segura."""
+        log.debug("Fechando conexão", fd=client_socket.fileno())
         self.selector.unregister(client_socket)
+        self.timers.cancel(client_socket)
+        change_feed.unsubscribe(client_socket)
         client_socket.close()
+        self.connections -= 1
+        metrics.inc("connections_closed_total")
+
+
+def create_server(args, port, reuse_port=False):
+    """Cria o servidor com o motor escolhido na linha de comando."""
+    limits = {
+        "max_connections": args.max_connections,
+        "listen_backlog": args.listen_backlog,
+        "idle_timeout": args.idle_timeout,
+        "write_timeout": args.write_timeout,
+        "max_output_buffer": args.max_output_buffer,
+        "feed_interval": args.feed_interval
+    }
+    if args.engine == "asyncio":
+        return AsyncServer(port=port, loop_policy=args.loop, executor_workers=args.executor_workers,
+                           reuse_port=reuse_port, **limits)
+    return Server(port=port, reuse_port=reuse_port, inbound_high_water=args.inbound_high_water,
+                  outbound_high_water=args.outbound_high_water, **limits)
+
+
+def _interrupt_worker(signum, frame):
+    """Interrompe o servidor uma única vez, ignorando sinais repetidos durante o encerramento."""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def run_workers(args, port):
+    """Cria N processos que escutam a mesma porta com SO_REUSEPORT."""
+    # O estado dos postos vai para memória compartilhada antes do fork
+    controller.share_station_state()
+
+    workers = []
+    for worker_id in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            # Processo filho: SIGTERM encerra de forma segura, como o Ctrl+C
+            signal.signal(signal.SIGTERM, _interrupt_worker)
+            signal.signal(signal.SIGINT, _interrupt_worker)
+            controller.start_services(worker_id=worker_id)
+            if args.metrics_port:
+                # Cada processo tem as próprias métricas: uma porta por processo
+                start_metrics_server("0.0.0.0", args.metrics_port + worker_id)
+                log.info("Métricas Prometheus disponíveis", port=args.metrics_port + worker_id)
+            create_server(args, port, reuse_port=True).start()
+            flush_logging()  # os._exit não executa o atexit
+            os._exit(0)
+        workers.append(pid)
+    log.info("Processos iniciados", workers=args.workers, pids=workers)
+
+    def forward_signal(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    # Ctrl+C no terminal já alcança todo o grupo; SIGTERM é repassado aos filhos
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, forward_signal)
+    for pid in workers:
+        os.waitpid(pid, 0)
+    log.info("Todos os processos foram encerrados")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de gerenciamento de carregamento de carros elétricos")
+    parser.add_argument("port", nargs="?", default="8888", help="Porta TCP (padrão: 8888)")
+    parser.add_argument("--engine", choices=["selectors", "asyncio"], default="selectors",
+                        help="Motor de E/S: loop com selectors (padrão) ou asyncio")
+    parser.add_argument("--loop", choices=sorted(LOOP_POLICIES), default="asyncio",
+                        help="Política de event loop do motor asyncio (uvloop se instalado)")
+    parser.add_argument("--executor-workers", type=int, default=8,
+                        help="Threads do executor que roda os handlers no motor asyncio")
+    parser.add_argument("--inbound-high-water", type=int, default=4 * 1024 * 1024,
+                        help="Bytes de entrada pendentes por conexão antes de parar a leitura")
+    parser.add_argument("--outbound-high-water", type=int, default=1024 * 1024,
+                        help="Bytes de saída pendentes por conexão antes de pausar o processamento")
+    parser.add_argument("--max-connections", type=int, default=10000,
+                        help="Conexões simultâneas por processo; as excedentes recebem 503 e são fechadas")
+    parser.add_argument("--listen-backlog", type=int, default=1024,
+                        help="Fila de conexões aguardando accept no kernel")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="Segundos sem tráfego antes de encerrar a conexão")
+    parser.add_argument("--write-timeout", type=float, default=30,
+                        help="Segundos com respostas pendentes sem o cliente ler antes de encerrar a conexão")
+    parser.add_argument("--max-output-buffer", type=int, default=16 * 1024 * 1024,
+                        help="Bytes de saída não lidos pelo cliente antes de encerrar a conexão")
+    parser.add_argument("--feed-interval", type=float, default=0.1,
+                        help="Segundos entre envios das mudanças de vagas às conexões com SUBSCRIBE_STATIONS")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos servidores compartilhando a porta (SO_REUSEPORT)")
+    parser.add_argument("--shards",
+                        help="Nós host:porta,... que dividem os postos por hash consistente (sem --shard-index, este processo é o roteador)")
+    parser.add_argument("--shard-index", type=int,
+                        help="Posição deste processo na lista --shards; escuta na porta do nó correspondente")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Porta HTTP com as métricas no formato Prometheus (com --workers, uma porta por processo a partir desta)")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                        help="Nível mínimo dos logs (DEBUG registra o payload de todas as requisições)")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="kv",
+                        help="Formato das linhas de log: key=value ou JSON")
+    parser.add_argument("--log-sample-rate", type=float, default=0.01,
+                        help="Fração das requisições registradas no nível INFO (0 desativa)")
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.log_format, args.log_sample_rate)
+
     # Permite definir a porta via linha de comando
     port = 8888
-    if len(sys.argv) > 1:
-        try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print(f"Porta inválida: {sys.argv[1]}. Usando porta padrão 8888.")
+    try:
+        port = int(args.port)
+    except ValueError:
+        log.warning("Porta inválida. Usando porta padrão 8888.", port=args.port)
 
-    server = Server(port=port)
-    server.start()
+    if args.shards:
+        try:
+            nodes = parse_nodes(args.shards)
+            if args.shard_index is not None and not 0 <= args.shard_index < len(nodes):
+                raise ValueError(f"--shard-index deve estar entre 0 e {len(nodes) - 1}")
+        except ValueError as e:
+            parser.error(str(e))
+        controller.configure_shards(nodes, args.shard_index)
+        if args.shard_index is not None:
+            port = node_address(nodes[args.shard_index])[1]
+        log.info("Postos divididos entre shards", shards=len(nodes),
+                 role="roteador" if args.shard_index is None else f"shard {args.shard_index}")
+    elif args.shard_index is not None:
+        parser.error("--shard-index exige --shards")
+    controller.load_station_state()
+
+    if args.workers > 1:
+        run_workers(args, port)
+    else:
+        # SIGTERM (ex.: docker stop, scripts de bench) encerra de forma segura, como o Ctrl+C
+        signal.signal(signal.SIGTERM, _interrupt_worker)
+        controller.start_services()
+        if args.metrics_port:
+            start_metrics_server("0.0.0.0", args.metrics_port)
+            log.info("Métricas Prometheus disponíveis", port=args.metrics_port)
+        create_server(args, port).start()
@@ -1,87 +1,177 @@
 import os
-import json
+import heapq
 import threading
 import time
 from datetime import datetime, timezone
+from store.station_store import StationStore
+from store.journal import StationJournal
+from store.session_store import SessionStore, create_session_backend
+from utils.log import get_logger
+from utils.metrics import metrics
+
+log = get_logger("station_monitor")
 
 class StationMonitor:
-    def __init__(self, stations_dir="server/data/stations", users_dir="server/data/users", interval=10):
-        """Inicializa o monitor de postos."""
-        self.stations_dir = stations_dir
-        self.users_dir = users_dir
-        self.interval = interval  # Intervalo de verificação em segundos
-        self.locks = {}  # Locks por station_id
+    def __init__(self, station_store, session_store, resync_interval=60, sync_interval=1):
+        """Inicializa o agendador de liberação de vagas sobre os armazenamentos em memória."""
+        self.station_store = station_store
+        self.session_store = session_store
+        # Varredura de segurança para reservas não agendadas aqui
+        self.resync_interval = resync_interval
+        # Com vários processos: intervalo para agendar as reservas dos outros, lidas da tabela compartilhada
+        self.sync_interval = sync_interval
+        self.heap = []  # (estimated_timestamp, station_id, user_id), menor término no topo
+        self.scheduled = {}  # station_id -> (versão, {user_id: término}) já agendados (modo compartilhado)
+        self.next_resync = 0
+        self.next_sync = 0
+        self.condition = threading.Condition()
         self.running = False
+        self.thread = None
 
     def start(self):
-        """Inicia o monitoramento em uma thread separada."""
+        """Agenda as reservas já existentes e inicia o agendador em uma thread separada."""
+        for station_id in self.station_store.station_ids():
+            self._schedule_station(station_id, self.station_store.get_station(station_id))
         self.running = True
+        self.next_resync = datetime.now(timezone.utc).timestamp() + self.resync_interval
         self.thread = threading.Thread(target=self._monitor_stations, daemon=True)
         self.thread.start()
-        print(f"Monitoramento de postos iniciado com intervalo de {self.interval} segundos.")
+        log.info("Monitoramento de postos iniciado", scheduled=len(self.heap))
 
     def stop(self):
         """Para o monitoramento."""
-        self.running = False
-        if self.thread.is_alive():
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread and self.thread.is_alive():
             self.thread.join()
-        print("Monitoramento de postos encerrado.")
+        log.info("Monitoramento de postos encerrado")
+
+    def schedule(self, station_id, user_id, estimated_timestamp):
+        """Agenda a liberação da vaga do usuário no término estimado do carregamento (ou da pré-reserva)."""
+        entry = (estimated_timestamp, str(station_id), user_id)
+        with self.condition:
+            heapq.heappush(self.heap, entry)
+            # Só acorda a thread se a nova liberação passou a ser a próxima
+            if self.heap[0] is entry:
+                self.condition.notify()
+
+    def _schedule_station(self, station_id, station_data):
+        """Agenda as reservas do posto que ainda não estão no heap (mesmo usuário e término)."""
+        scheduled = self.scheduled.get(station_id, (None, {}))[1]
+        vehicles = {}
+        for user_id, vehicle in station_data["vehicles"].items():
+            vehicles[user_id] = vehicle["estimated_timestamp"]
+            if scheduled.get(user_id) != vehicles[user_id]:
+                self.schedule(station_id, user_id, vehicles[user_id])
+        if self.station_store.shared is not None:
+            self.scheduled[station_id] = (station_data["version"], vehicles)
+
+    def _sync_shared(self):
+        """Agenda as reservas feitas por outros processos, conferindo as versões da tabela compartilhada.
+
+        Cada processo tem o seu próprio heap; sem isso, uma vaga paga em outro worker só seria
+        liberada aqui na varredura de segurança. A leitura das versões não usa lock.
+        """
+        shared = self.station_store.shared
+        for station_id in self.station_store.station_ids():
+            if self.scheduled.get(station_id, (None,))[0] == shared.version(station_id):
+                continue
+            self._schedule_station(station_id, self.station_store.get_station(station_id))
+
+    def _take_due(self):
+        """Aguarda a próxima liberação vencer e retorna {station_id: [user_id, ...]}.
+
+        Na varredura de segurança retorna None: o chamador confere o armazenamento inteiro.
+        """
+        with self.condition:
+            while self.running:
+                current_time = datetime.now(timezone.utc).timestamp()
+                if self.heap and self.heap[0][0] <= current_time:
+                    due = {}
+                    while self.heap and self.heap[0][0] <= current_time:
+                        _, station_id, user_id = heapq.heappop(self.heap)
+                        due.setdefault(station_id, []).append(user_id)
+                    return due
+                if current_time >= self.next_resync:
+                    self.next_resync = current_time + self.resync_interval
+                    return None
+                if self.station_store.shared is not None and current_time >= self.next_sync:
+                    return {}  # O chamador lê a tabela compartilhada fora do lock
+
+                # Dorme até o próximo término (ou a próxima varredura); schedule() acorda antes
+                timeout = self.next_resync - current_time
+                if self.station_store.shared is not None:
+                    timeout = min(timeout, self.next_sync - current_time)
+                if self.heap:
+                    timeout = min(timeout, self.heap[0][0] - current_time)
+                self.condition.wait(timeout)
+            return {}
 
     def _monitor_stations(self):
-        """Monitora os postos e remove veículos concluídos."""
+        """Libera as vagas exatamente quando cada carregamento termina."""
         while self.running:
-            station_files = [f for f in os.listdir(self.stations_dir) if f.startswith("station_") and f.endswith(".json")]
+            due = self._take_due()
             current_time = datetime.now(timezone.utc).timestamp()
+            if due is None:
+                due = self.station_store.expired_vehicles(current_time)
+            if self.station_store.shared is not None and current_time >= self.next_sync:
+                self.next_sync = current_time + self.sync_interval
+                self._sync_shared()
 
-            for station_file in station_files:
-                station_id = station_file.split("_")[1].split(".")[0]
-                filepath = os.path.join(self.stations_dir, station_file)
+            for station_id, user_ids in due.items():
+                # Libera apenas o posto afetado, ignorando entradas antigas (usuário já liberado ou reagendado)
+                station_data = self.station_store.get_station(station_id)
+                if station_data is None:
+                    continue
+                vehicles = station_data["vehicles"]
+                user_ids = [
+                    user_id for user_id in user_ids
+                    if user_id in vehicles and vehicles[user_id]["estimated_timestamp"] <= current_time
+                ]
+                if not user_ids:
+                    continue
+                holds = {user_id for user_id in user_ids if vehicles[user_id].get("hold")}
+                # O término é conferido de novo na liberação: a pré-reserva pode ter sido confirmada agora
+                station_data = self.station_store.release(station_id, user_ids, due_before=current_time)
+                if station_data is None:
+                    continue
+                released = [user_id for user_id in user_ids if user_id not in station_data["vehicles"]]
+                if not released:
+                    continue
 
-                # Cria ou obtém o lock para este station_id
-                if station_id not in self.locks:
-                    self.locks[station_id] = threading.Lock()
-                lock = self.locks[station_id]
-
-                with lock:
-                    # Lê o arquivo do posto
-                    if not os.path.exists(filepath):
+                # Remove as sessões dos usuários que terminaram de carregar; pré-reservas
+                # expiradas só devolvem a vaga (o usuário ainda pode escolher outro posto)
+                expired_holds = 0
+                for user_id in released:
+                    if user_id in holds:
+                        expired_holds += 1
                         continue
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        station_data = json.load(f)
-
-                    # Verifica veículos
-                    updated = False
-                    vehicles_to_remove = []
-                    for user_id, vehicle in list(station_data["vehicles"].items()):
-                        if current_time >= vehicle["estimated_timestamp"]:
-                            vehicles_to_remove.append(user_id)
-                            station_data["available_slots"] += 1
-                            updated = True
-                            # Deleta o arquivo do usuário
-                            user_filepath = os.path.join(self.users_dir, f"{user_id}.json")
-                            if os.path.exists(user_filepath):
-                                os.remove(user_filepath)
-                                print(f"Cliente {user_id} removido após conclusão de carregamento.")
-
-                    # Remove veículos concluídos do posto
-                    for user_id in vehicles_to_remove:
-                        del station_data["vehicles"][user_id]
-
-                    # Salva alterações no arquivo do posto
-                    if updated:
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            json.dump(station_data, f, indent=4)
-                        print(f"Posto {station_id}: Atualizou vagas disponíveis ({station_data['available_slots']}/{station_data['max_slots']})")
-
-            # Aguarda o intervalo antes da próxima verificação
-            time.sleep(self.interval)
+                    self.session_store.delete(user_id)
+                    log.debug("Cliente removido após conclusão de carregamento", user_id=user_id)
+                if expired_holds:
+                    metrics.inc("station_holds_expired_total", expired_holds)
+
+                log.info("Vagas liberadas", station=station_id, released=len(released), expired_holds=expired_holds,
+                         available=station_data["available_slots"], max_slots=station_data["max_slots"])
 
 if __name__ == "__main__":
     # Teste standalone
-    monitor = StationMonitor()
+    station_journal = StationJournal()
+    station_store = StationStore(journal=station_journal)
+    station_store.load()
+    station_store.recover(station_journal)
+    station_journal.open()
+    station_store.start()
+    session_store = SessionStore(create_session_backend(os.environ.get("SESSION_BACKEND", "file")))
+    session_store.start()
+    monitor = StationMonitor(station_store, session_store)
     monitor.start()
     try:
         time.sleep(60)  # Roda por 1 minuto
     except KeyboardInterrupt:
-        monitor.stop()
-        
\ No newline at end of file
+        pass
+    monitor.stop()
+    station_store.stop()
+    station_journal.close()
+    session_store.stop()
@@ -0,0 +1,95 @@
+import threading
+from utils.metrics import metrics
+
+
+class StationChangeFeed:
+    def __init__(self, station_store):
+        """Feed de mudanças de vagas livres dos postos para as conexões inscritas.
+
+        O StationStore avisa cada posto alterado (notify); a cada tick, o servidor coleta os
+        postos cujo `available_slots` mudou desde o último envio, uma única vez para todos os
+        inscritos. Várias mudanças no mesmo posto dentro de um tick viram um único valor.
+        """
+        self.station_store = station_store
+        self.changed = set()   # Postos alterados desde o último tick
+        self.lock = threading.Lock()  # notify() vem de qualquer thread (handlers, monitor)
+        self.last_sent = {}    # station_id -> vagas livres já enviadas aos inscritos
+        self.groups = {}       # frozenset de IDs (None = todos) -> conjunto de inscritos
+        self.subscriptions = {}  # inscrito -> chave do seu grupo
+        metrics.gauge("feed_subscribers", lambda: len(self.subscriptions))
+
+    def notify(self, station_id):
+        """Registra que o posto mudou (chamado pelo StationStore ao publicar uma nova versão)."""
+        with self.lock:
+            self.changed.add(station_id)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    def is_subscribed(self, subscriber):
+        return subscriber in self.subscriptions
+
+    def subscribe(self, subscriber, station_ids=None):
+        """Inscreve (ou reinscreve) o assinante nos postos informados, ou em todos.
+
+        Retorna ({station_id: vagas livres}, IDs inexistentes). O estado inicial é o mesmo já
+        enviado aos demais inscritos, então os deltas seguintes valem para todos igualmente.
+        """
+        self.unsubscribe(subscriber)
+        if station_ids is None:
+            key, wanted, not_found = None, self.station_store.station_ids(), []
+        else:
+            wanted = list(dict.fromkeys(str(station_id) for station_id in station_ids))
+            not_found = [station_id for station_id in wanted if self.station_store.get_station(station_id) is None]
+            wanted = [station_id for station_id in wanted if station_id not in not_found]
+            key = frozenset(wanted)
+
+        snapshot = {}
+        for station_id in wanted:
+            if station_id not in self.last_sent:
+                self.last_sent[station_id] = self.station_store.get_station(station_id)["available_slots"]
+            snapshot[station_id] = self.last_sent[station_id]
+
+        self.groups.setdefault(key, set()).add(subscriber)
+        self.subscriptions[subscriber] = key
+        return snapshot, not_found
+
+    def unsubscribe(self, subscriber):
+        """Cancela a inscrição (ao fechar a conexão ou a pedido do cliente)."""
+        if subscriber not in self.subscriptions:
+            return
+        key = self.subscriptions.pop(subscriber)
+        members = self.groups[key]
+        members.discard(subscriber)
+        if not members:
+            del self.groups[key]
+
+    def tick(self):
+        """Coleta as mudanças do tick. Retorna [(inscritos, {station_id: vagas livres}), ...].
+
+        O delta de cada grupo de inscritos com a mesma lista de postos é montado uma única vez.
+        """
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        if self.station_store.shared:
+            # Com vários processos, as escritas dos outros não passam por notify: confere as versões
+            changed = self.last_sent
+
+        delta = {}
+        for station_id in changed:
+            if station_id not in self.last_sent:
+                continue  # Ninguém nunca assinou este posto
+            available_slots = self.station_store.get_station(station_id)["available_slots"]
+            if available_slots != self.last_sent[station_id]:
+                delta[station_id] = available_slots
+        if not delta:
+            return []
+        self.last_sent.update(delta)
+
+        pushes = []
+        for key, members in self.groups.items():
+            group_delta = delta if key is None else {s: v for s, v in delta.items() if s in key}
+            if group_delta:
+                pushes.append((list(members), group_delta))  # Cópia: o envio pode encerrar conexões
+        metrics.inc("feed_deltas_total")
+        return pushes
@@ -0,0 +1,108 @@
+import time
+import threading
+from collections import OrderedDict
+from utils.metrics import metrics
+
+EXECUTED = "executed"        # Primeira execução: a resposta veio do handler
+REPLAYED = "replayed"        # Repetição: resposta devolvida do cache, sem executar o handler
+CONFLICT = "conflict"        # Mesma chave com outros dados
+IN_PROGRESS = "in_progress"  # A execução original não terminou dentro do prazo de espera
+FULL = "full"                # Cache lotado só com execuções em andamento: a nova chave é recusada
+
+
+class _Entry:
+    def __init__(self, data, expires_at):
+        """Resultado (ou execução em andamento) associado a uma chave de idempotência."""
+        self.data = data
+        self.expires_at = expires_at
+        self.response = None
+        self.done = threading.Event()
+
+
+class IdempotencyCache:
+    def __init__(self, capacity=10000, ttl=300, wait_timeout=5.0):
+        """Cache limitado de respostas por chave de idempotência, com expiração por tempo.
+
+        As entradas ficam em ordem de criação: como o prazo é o mesmo para todas, as mais
+        antigas são as primeiras a expirar e as primeiras descartadas quando o cache enche.
+        Execuções em andamento nunca são descartadas: sem elas, uma duplicata executaria de novo.
+        """
+        self.capacity = capacity          # Máximo de chaves mantidas
+        self.ttl = ttl                    # Segundos em que uma resposta pode ser repetida
+        self.wait_timeout = wait_timeout  # Espera máxima por uma execução em andamento da mesma chave
+        self.entries = OrderedDict()      # chave -> _Entry
+        self.lock = threading.Lock()
+        metrics.gauge("idempotency_keys", lambda: len(self.entries))
+
+    def execute(self, key, data, compute):
+        """Executa `compute()` uma única vez por chave e repete a resposta nas duplicatas.
+
+        Retorna (situação, resposta); a resposta é None em CONFLICT, IN_PROGRESS e FULL. Apenas
+        respostas de sucesso (código < 400) são guardadas: após um erro a chave fica livre
+        para uma nova tentativa.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._purge(now)
+                entry = self.entries.get(key)
+                if entry is not None and entry.done.is_set() and entry.expires_at <= now:
+                    del self.entries[key]  # Expirada, mas atrás de uma execução ainda em andamento
+                    entry = None
+                if entry is None:
+                    if len(self.entries) >= self.capacity and not self._evict():
+                        metrics.inc("idempotency_rejected_total")
+                        return FULL, None
+                    entry = self.entries[key] = _Entry(data, now + self.ttl)
+                    break
+
+            if entry.data != data:
+                metrics.inc("idempotency_conflicts_total")
+                return CONFLICT, None
+            if not entry.done.wait(self.wait_timeout):
+                return IN_PROGRESS, None
+            if entry.response is not None:
+                metrics.inc("idempotency_replays_total")
+                return REPLAYED, entry.response
+            # A execução original falhou e liberou a chave: tenta novamente
+
+        try:
+            response = compute()
+        except Exception:
+            self._forget(key, entry)
+            raise
+        if response["status"]["code"] < 400:
+            entry.response = response
+        else:
+            self._forget(key, entry)
+        entry.done.set()
+        return EXECUTED, response
+
+    def _forget(self, key, entry):
+        """Remove a chave (se ainda for a mesma execução) e acorda quem a esperava."""
+        with self.lock:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+        entry.done.set()
+
+    def _evict(self):
+        """Descarta a entrada concluída mais antiga (chamar com o lock adquirido).
+
+        Retorna False se todas as entradas são execuções em andamento. Elas são limitadas
+        pelas requisições simultâneas, então a busca passa por poucas entradas.
+        """
+        for key, entry in self.entries.items():
+            if entry.done.is_set():
+                break
+        else:
+            return False
+        del self.entries[key]
+        return True
+
+    def _purge(self, now):
+        """Descarta as entradas concluídas e expiradas (chamar com o lock adquirido)."""
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if entry.expires_at > now or not entry.done.is_set():
+                break
+            self.entries.popitem(last=False)
@@ -0,0 +1,159 @@
+import os
+import json
+import glob
+import threading
+import time
+from utils.metrics import metrics
+from utils.log import get_logger
+
+log = get_logger("journal")
+
+
+class StationJournal:
+    def __init__(self, journal_dir="server/data/journal", name="stations", retry_interval=0.5):
+        """Inicializa o journal (write-ahead log) de reservas e liberações de vagas."""
+        self.journal_dir = journal_dir
+        self.name = name  # Cada processo servidor grava o seu próprio segmento
+        self.journal_file = os.path.join(journal_dir, f"{name}.log")
+        self.cond = threading.Condition()   # Protege a fila e os contadores de sequência
+        self.file_lock = threading.Lock()   # Protege o arquivo durante escrita/rotação
+        self.pending = []          # Linhas aguardando escrita
+        self.appended_seq = 0      # Último registro enfileirado
+        self.committed_seq = 0     # Último registro gravado com fsync
+        self.error = None          # Última falha de gravação (None após um lote gravado)
+        self.failed_seq = 0        # Registros até esta sequência estavam no lote que falhou
+        self.retry_interval = retry_interval  # Espera antes de regravar um lote que falhou
+        self.file = None
+        self.running = False
+        self.thread = None
+
+    def open(self):
+        """Abre o segmento atual do journal e inicia a thread de group commit."""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.file = open(self.journal_file, "ab")
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Grava os registros pendentes e fecha o journal."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread and self.thread.is_alive():
+            self.thread.join()
+        with self.file_lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def append(self, record):
+        """Enfileira um registro e retorna seu número de sequência (não espera o fsync)."""
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.cond:
+            self.pending.append(line)
+            self.appended_seq += 1
+            self.cond.notify_all()
+            return self.appended_seq
+
+    def wait_committed(self, seq):
+        """Bloqueia até que o registro de sequência `seq` esteja durável em disco.
+
+        Se o lote com o registro falhou, levanta OSError (a requisição responde com erro);
+        o lote continua na fila e é regravado em seguida.
+        """
+        with self.cond:
+            while self.committed_seq < seq and self.running:
+                if self.error is not None and seq <= self.failed_seq:
+                    raise OSError(f"Registro do journal não gravado: {self.error}")
+                self.cond.wait()
+
+    def rotate(self):
+        """Fecha o segmento atual e abre um novo; retorna o caminho do segmento antigo."""
+        with self.file_lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            old_path = os.path.join(self.journal_dir, f"{self.name}.{time.time_ns()}.old")
+            os.replace(self.journal_file, old_path)
+            self.file = open(self.journal_file, "ab")
+            return old_path
+
+    def segments(self):
+        """Lista todos os segmentos em disco, de todos os processos (antigos primeiro)."""
+        old_segments = sorted(
+            glob.glob(os.path.join(self.journal_dir, "*.old")),
+            key=lambda path: int(path.rsplit(".", 2)[1])
+        )
+        return old_segments + sorted(glob.glob(os.path.join(self.journal_dir, "*.log")))
+
+    def read_records(self):
+        """Lê todos os registros dos segmentos, ignorando uma última linha truncada."""
+        records = []
+        for path in self.segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Escrita interrompida por falha: registro incompleto
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+        return records
+
+    def remove_segments(self, paths):
+        """Remove segmentos já incorporados a um snapshot."""
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _writer_loop(self):
+        """Grava lotes de registros com um único fsync por lote (group commit)."""
+        while True:
+            with self.cond:
+                while not self.pending and self.running:
+                    self.cond.wait()
+                if not self.pending and not self.running:
+                    return
+                batch = self.pending
+                self.pending = []
+                seq = self.appended_seq
+
+            # Enquanto este lote é gravado, novos registros se acumulam para o próximo
+            try:
+                with self.file_lock, metrics.timed("disk_io_seconds", ("op", "journal_commit")):
+                    position = self.file.tell()
+                    try:
+                        self.file.write(b"".join(batch))
+                        self.file.flush()
+                        os.fsync(self.file.fileno())
+                    except OSError:
+                        self._discard_partial(position)
+                        raise
+            except OSError as e:
+                log.error("Erro ao gravar journal de postos", error=e, records=len(batch))
+                metrics.inc("journal_write_errors_total")
+                with self.cond:
+                    # O lote volta para o início da fila; quem o aguarda recebe o erro
+                    self.error = e
+                    self.failed_seq = seq
+                    self.pending = batch + self.pending
+                    self.cond.notify_all()
+                    if not self.running:
+                        return  # Encerrando: o snapshot final cobre o estado em memória
+                    self.cond.wait(self.retry_interval)
+                continue
+
+            with self.cond:
+                self.committed_seq = seq
+                self.error = None
+                self.cond.notify_all()
+
+    def _discard_partial(self, position):
+        """Remove do segmento o que um lote que falhou chegou a gravar (uma linha truncada no meio do
+        segmento faria a leitura parar ali e descartar os registros seguintes)."""
+        try:
+            self.file.seek(position)
+            self.file.truncate()
+        except OSError:
+            pass
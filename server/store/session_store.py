@@ -0,0 +1,231 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from models.electric_car import ElectricCar
+from utils.metrics import metrics
+from utils.log import get_logger
+
+log = get_logger("session_store")
+
+SQLITE_DB_FILE = "server/data/users.db"  # Banco do backend "sqlite" (com os arquivos -wal e -shm ao lado)
+
+
+class FileSessionBackend:
+    def __init__(self, users_dir="server/data/users"):
+        """Backend de sessões com um arquivo JSON por usuário (formato original)."""
+        self.users_dir = users_dir
+        os.makedirs(self.users_dir, exist_ok=True)
+
+    def load(self, user_id):
+        """Lê os dados do usuário ou retorna None se não existir."""
+        filepath = os.path.join(self.users_dir, f"{user_id}.json")
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_many(self, changes):
+        """Aplica um lote de alterações {user_id: user_data ou None para remoção}."""
+        for user_id, user_data in changes.items():
+            filepath = os.path.join(self.users_dir, f"{user_id}.json")
+            if user_data is None:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                continue
+            # Arquivo temporário + troca atômica: uma interrupção no meio da escrita não deixa
+            # o JSON do usuário truncado (o sufixo com o PID evita colisão entre processos)
+            tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+            with open(tmp_filepath, "w", encoding="utf-8") as f:
+                json.dump(user_data, f, indent=4)
+            os.replace(tmp_filepath, filepath)
+
+    def close(self):
+        """Nada a liberar no backend de arquivos."""
+        pass
+
+
+class SQLiteSessionBackend:
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        """Backend de sessões em um único arquivo SQLite."""
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self.lock = threading.Lock()  # A conexão é compartilhada entre threads
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.commit()
+
+    def load(self, user_id):
+        """Lê os dados do usuário ou retorna None se não existir."""
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, changes):
+        """Aplica um lote de alterações em uma única transação."""
+        upserts = [(user_id, json.dumps(user_data)) for user_id, user_data in changes.items() if user_data is not None]
+        deletes = [(user_id,) for user_id, user_data in changes.items() if user_data is None]
+        with self.lock:
+            with self.conn:
+                if upserts:
+                    self.conn.executemany("INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)", upserts)
+                if deletes:
+                    self.conn.executemany("DELETE FROM users WHERE user_id = ?", deletes)
+
+    def close(self):
+        """Fecha a conexão com o banco."""
+        with self.lock:
+            self.conn.close()
+
+
+SESSION_BACKENDS = {
+    "file": FileSessionBackend,
+    "sqlite": SQLiteSessionBackend
+}
+
+
+def create_session_backend(name):
+    """Cria o backend de sessões pelo nome ("file" ou "sqlite")."""
+    if name not in SESSION_BACKENDS:
+        raise ValueError(f"Backend de sessões desconhecido: {name}")
+    return SESSION_BACKENDS[name]()
+
+
+class SessionStore:
+    def __init__(self, backend, capacity=10000, flush_interval=0.5, write_behind=True, read_cache=True):
+        """Inicializa o cache LRU de sessões na frente de um backend persistente.
+
+        Com o backend compartilhado entre processos, `read_cache=False` lê sempre do backend:
+        um usuário removido ou regravado por outro processo não continua sendo servido do LRU.
+        """
+        self.backend = backend
+        self.capacity = capacity              # Máximo de carros mantidos em memória
+        self.flush_interval = flush_interval  # Intervalo da escrita em segundo plano
+        self.write_behind = write_behind      # False grava no backend de forma síncrona
+        self.read_cache = read_cache          # False ignora o LRU nas leituras
+        self.cache = OrderedDict()  # user_id -> ElectricCar (ordem de uso recente)
+        self.pending = {}           # user_id -> user_data ou None (remoção) aguardando escrita
+        self.flushing = {}          # Lote sendo gravado no momento
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Apenas um lote é gravado por vez
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Inicia a thread de escrita em segundo plano."""
+        if not self.write_behind:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Grava as alterações pendentes e fecha o backend."""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join()
+        self.flush()
+        self.backend.close()
+
+    def create(self, user_id, user_name, car):
+        """Registra a sessão de um novo usuário."""
+        user_data = {
+            "user_id": user_id,
+            "user_name": user_name,
+            "user_car": {
+                "brand": car.brand,
+                "model": car.model,
+                "battery_capacity": car.battery_capacity,
+                "current_battery": car.current_battery,
+                "energy_consumption": car.energy_consumption,
+                "max_speed": car.max_speed
+            }
+        }
+        with self.lock:
+            if self.read_cache:
+                self._cache_put(user_id, car)
+            self.pending[user_id] = user_data
+        if not self.write_behind:
+            self.flush()
+
+    def get_car(self, user_id):
+        """Retorna o carro do usuário (memória, escrita pendente ou backend) ou None."""
+        with self.lock:
+            car = self.cache.get(user_id) if self.read_cache else None
+            if car is not None:
+                self.cache.move_to_end(user_id)
+                return car
+            for changes in (self.pending, self.flushing):
+                if user_id in changes:
+                    user_data = changes[user_id]
+                    return self._car_from_user_data(user_data) if user_data else None
+
+        with metrics.timed("disk_io_seconds", ("op", "session_load")):
+            user_data = self.backend.load(user_id)
+        if user_data is None:
+            return None
+        car = self._car_from_user_data(user_data)
+        with self.lock:
+            # Só armazena se o usuário não foi removido durante a leitura
+            if self.read_cache and self.pending.get(user_id, True) is not None:
+                self._cache_put(user_id, car)
+        return car
+
+    def delete(self, user_id):
+        """Remove a sessão do usuário."""
+        with self.lock:
+            self.cache.pop(user_id, None)
+            self.pending[user_id] = None
+        if not self.write_behind:
+            self.flush()
+
+    def flush(self):
+        """Grava no backend o lote de alterações pendentes."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                self.flushing = self.pending
+                self.pending = {}
+            try:
+                with metrics.timed("disk_io_seconds", ("op", "session_save")):
+                    self.backend.save_many(self.flushing)
+            except Exception:
+                # Devolve o lote à fila sem sobrescrever alterações mais recentes
+                with self.lock:
+                    self.pending = {**self.flushing, **self.pending}
+                raise
+            finally:
+                with self.lock:
+                    self.flushing = {}
+
+    def _cache_put(self, user_id, car):
+        """Insere no LRU, descartando o item menos usado (chamar com o lock adquirido)."""
+        self.cache[user_id] = car
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+
+    def _car_from_user_data(self, user_data):
+        """Constrói o ElectricCar a partir dos dados persistidos do usuário."""
+        car_data = user_data["user_car"]
+        return ElectricCar(
+            brand=car_data["brand"],
+            model=car_data["model"],
+            battery_capacity=car_data["battery_capacity"],
+            energy_consumption=car_data["energy_consumption"],
+            max_speed=car_data["max_speed"],
+            current_battery=car_data["current_battery"]
+        )
+
+    def _flush_loop(self):
+        """Grava periodicamente as alterações pendentes (write-behind)."""
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("Erro ao gravar sessões", error=e)
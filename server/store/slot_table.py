@@ -0,0 +1,82 @@
+import os
+import mmap
+import fcntl
+import struct
+from contextlib import contextmanager
+
+# Cabeçalho por posto: seqlock, versão, vagas disponíveis, veículos ocupando vagas
+HEADER = struct.Struct("=QQii")
+# Vaga: user_id (UTF-8, completado com zeros), timestamp estimado de término e se é pré-reserva
+ENTRY = struct.Struct("=64sd?")
+
+
+class SharedSlotTable:
+    def __init__(self, stations, lock_file="server/data/journal/stations.lock"):
+        """Cria a tabela de vagas em memória compartilhada (deve ser criada antes do fork)."""
+        self.layout = {}  # station_id -> (offset, max_slots, índice do lock)
+        size = 0
+        for index, (station_id, station_data) in enumerate(sorted(stations.items())):
+            self.layout[station_id] = (size, station_data["max_slots"], index)
+            size += HEADER.size + ENTRY.size * station_data["max_slots"]
+
+        # Mapeamento anônimo MAP_SHARED: os processos filhos enxergam as mesmas páginas
+        self.mm = mmap.mmap(-1, max(size, 1))
+        for station_id, station_data in stations.items():
+            self.write(station_id, station_data)
+
+        os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+        self.lock_fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def locked(self, station_id):
+        """Exclusão entre processos por posto, com lock de faixa de bytes (fcntl)."""
+        index = self.layout[station_id][2]
+        fcntl.lockf(self.lock_fd, fcntl.LOCK_EX, 1, index)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.lock_fd, fcntl.LOCK_UN, 1, index)
+
+    def version(self, station_id):
+        """Lê a versão atual do posto sem lock."""
+        offset = self.layout[station_id][0]
+        return struct.unpack_from("=Q", self.mm, offset + 8)[0]
+
+    def read(self, station_id):
+        """Lê (versão, vagas disponíveis, veículos) do posto de forma consistente, sem lock."""
+        offset, max_slots, _ = self.layout[station_id]
+        while True:
+            # Seqlock: sequência ímpar indica escrita em andamento em outro processo
+            seq, version, available_slots, count = HEADER.unpack_from(self.mm, offset)
+            if seq % 2:
+                continue
+            vehicles = {}
+            entry_offset = offset + HEADER.size
+            for _ in range(min(count, max_slots)):
+                user_id, estimated_timestamp, hold = ENTRY.unpack_from(self.mm, entry_offset)
+                vehicle = {"estimated_timestamp": estimated_timestamp, "hold": True} if hold \
+                    else {"estimated_timestamp": estimated_timestamp}
+                vehicles[user_id.rstrip(b"\0").decode("utf-8")] = vehicle
+                entry_offset += ENTRY.size
+            if HEADER.unpack_from(self.mm, offset)[0] == seq:
+                return version, available_slots, vehicles
+
+    def write(self, station_id, station_data):
+        """Publica o estado do posto (chamar com o lock do posto adquirido)."""
+        offset, max_slots, _ = self.layout[station_id]
+        vehicles = station_data["vehicles"]
+        if len(vehicles) > max_slots:
+            raise ValueError(f"Posto {station_id}: mais veículos do que vagas")
+        entries = [(user_id.encode("utf-8"), vehicle["estimated_timestamp"], vehicle.get("hold", False))
+                   for user_id, vehicle in vehicles.items()]
+        if any(len(encoded_id) > 64 for encoded_id, _, _ in entries):
+            raise ValueError(f"Posto {station_id}: user_id excede 64 bytes")
+
+        seq = HEADER.unpack_from(self.mm, offset)[0]
+        struct.pack_into("=Q", self.mm, offset, seq + 1)
+        entry_offset = offset + HEADER.size
+        for encoded_id, estimated_timestamp, hold in entries:
+            ENTRY.pack_into(self.mm, entry_offset, encoded_id, estimated_timestamp, hold)
+            entry_offset += ENTRY.size
+        HEADER.pack_into(self.mm, offset, seq + 2, station_data.get("version", 0),
+                         station_data["available_slots"], len(vehicles))
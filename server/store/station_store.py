@@ -0,0 +1,460 @@
+import os
+import json
+import heapq
+import threading
+from contextlib import contextmanager, nullcontext
+from store.station_vectors import StationVectors
+from utils.metrics import metrics
+from utils.log import get_logger
+
+log = get_logger("station_store")
+
+
+class StationStore:
+    def __init__(self, stations_dir="server/data/stations", journal=None, snapshot_interval=30, on_change=None):
+        """Inicializa o armazenamento em memória dos postos."""
+        self.stations_dir = stations_dir
+        self.journal = journal  # StationJournal opcional para durabilidade das alterações
+        self.on_change = on_change  # Chamado com o ID de cada posto alterado (ex.: StationChangeFeed.notify)
+        self.snapshot_interval = snapshot_interval  # Intervalo entre snapshots em segundos
+        self.stations = {}     # station_id (str) -> dados do posto
+        self.shared = None     # SharedSlotTable no modo com múltiplos processos
+        self.dirty = set()     # Postos alterados ainda não gravados em snapshot
+        # station_id -> (versão, heap de (término da reserva, user_id)), com topo válido nessa versão
+        self.release_heaps = {}
+        self.vectors = StationVectors([])  # Vagas e liberações por posto, na ordem do índice espacial
+        self.lock = threading.Lock()  # Protege só o compare-and-swap das escritas; leituras não bloqueiam
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def load(self, owns=None):
+        """Carrega o último snapshot (arquivos dos postos) para a memória.
+
+        Com `owns`, apenas os postos cujo ID (str) ele aceita: um shard carrega só os seus.
+        """
+        os.makedirs(self.stations_dir, exist_ok=True)
+        stations = {}
+        for station_file in os.listdir(self.stations_dir):
+            if not (station_file.startswith("station_") and station_file.endswith(".json")):
+                continue
+            if owns is not None and not owns(station_file[len("station_"):-len(".json")]):
+                continue
+            filepath = os.path.join(self.stations_dir, station_file)
+            with metrics.timed("disk_io_seconds", ("op", "station_load")), open(filepath, "r", encoding="utf-8") as f:
+                station_data = json.load(f)
+            station_data.setdefault("version", 0)
+            stations[str(station_data["id"])] = station_data
+        with self.lock:
+            self.stations = stations
+            self.dirty.clear()
+            self.release_heaps.clear()
+            self.vectors = self._build_vectors(self.vectors.source)
+        log.info("Postos carregados em memória", stations=len(stations))
+
+    def recover(self, journal):
+        """Reaplica os segmentos do journal sobre o snapshot carregado e compacta o resultado."""
+        segments = journal.segments()
+        records = journal.read_records()
+
+        applied = 0
+        with self.lock:
+            # A versão por posto torna a reaplicação idempotente
+            for record in sorted(records, key=lambda r: r["v"]):
+                station_data = self.stations.get(record["station"])
+                if station_data is None or record["v"] <= station_data["version"]:
+                    continue
+                if record["op"] == "reserve":
+                    station_data = self._apply_reserve(station_data, record["user"], record["ts"], record.get("hold", False))
+                else:
+                    station_data = self._apply_release(station_data, record["users"])
+                station_data["version"] = record["v"]
+                self.stations[record["station"]] = station_data
+                self.dirty.add(record["station"])
+                applied += 1
+            self.vectors = self._build_vectors(self.vectors.source)
+
+        # Grava o estado reconstruído antes de descartar os segmentos reaplicados
+        self._write_snapshot(self._take_dirty())
+        journal.remove_segments(segments)
+        log.info("Journal de postos reaplicado", records=applied)
+        return applied
+
+    def share(self, slot_table):
+        """Passa a coordenar o estado com outros processos pela tabela de vagas compartilhada."""
+        self.shared = slot_table
+
+    def index_by(self, station_ids):
+        """Reordena os vetores dos postos na ordem de `station_ids` (a do índice espacial)."""
+        with self.lock:
+            self.vectors = self._build_vectors(station_ids)
+
+    def start(self):
+        """Inicia a thread de snapshots periódicos."""
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Para a thread de snapshots e grava um snapshot final."""
+        self.running = False
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join()
+        self.snapshot()
+
+    def get_station(self, station_id):
+        """Retorna os dados do posto em memória (não deve ser modificado pelo chamador)."""
+        station_id = str(station_id)
+        station_data = self.stations.get(station_id)
+        if self.shared and station_data is not None and self.shared.version(station_id) != station_data["version"]:
+            station_data = self._refresh(station_id)
+        return station_data
+
+    def next_release(self, station_id, current_time):
+        """Timestamp da próxima vaga a liberar após `current_time` (inf se nenhuma), ou None se o posto não existe."""
+        station_id = str(station_id)
+        station_data = self.get_station(station_id)
+        if station_data is None:
+            return None
+        return self._release_top(station_id, station_data, current_time)
+
+    def gather(self, vectors, positions, distances, current_time):
+        """Vagas livres e próxima liberação dos candidatos nas `positions` de `vectors`, coletadas por índice.
+
+        Retorna (posições dos postos existentes, distâncias, vagas livres, próxima liberação); a
+        liberação vale inf nos postos com vaga livre, como em next_release.
+        """
+        if self.shared:
+            # Outros processos publicam direto na tabela compartilhada: sincroniza as posições desatualizadas
+            for position in positions:
+                if vectors.versions[position] >= 0 and \
+                        self.shared.version(vectors.ids[position]) != vectors.versions[position]:
+                    station_id = vectors.ids[position]
+                    station_data = self.get_station(station_id)
+                    self._update_vectors(vectors, station_id, station_data, self._release_top(station_id, station_data))
+        positions, distances, available_slots, next_release, stale = vectors.gather(positions, distances, current_time)
+        for index in stale:
+            # Reserva mais próxima já vencida e ainda não liberada pelo monitor: consulta o heap
+            next_release[index] = self.next_release(vectors.ids[positions[index]], current_time)
+        return positions, distances, available_slots, next_release
+
+    def occupancy(self, station_id, current_time):
+        """Retorna (vagas ocupadas, vagas totais, próxima liberação) do posto, ou None se não existe."""
+        station_data = self.get_station(station_id)
+        if station_data is None:
+            return None
+        occupied = station_data["max_slots"] - station_data["available_slots"]
+        return occupied, station_data["max_slots"], self.next_release(station_id, current_time)
+
+    def station_ids(self):
+        """Retorna a lista de IDs dos postos carregados."""
+        return list(self.stations.keys())
+
+    def reserve(self, station_id, user_id, estimated_timestamp, hold=False):
+        """Reserva uma vaga no posto. Retorna None se o posto não existe e False se está lotado.
+
+        Com `hold=True`, a vaga fica apenas pré-reservada até `estimated_timestamp`. Uma reserva
+        sobre a pré-reserva do próprio usuário a confirma em O(1), sem disputar vagas livres.
+
+        Concorrência otimista: a nova versão do posto é calculada sem lock e instalada com
+        compare-and-swap; se outra escrita publicou antes, o cálculo é refeito sobre ela.
+        """
+        station_id = str(station_id)
+        if station_id not in self.stations:
+            return None
+        while True:
+            station_data = self.get_station(station_id)
+            vehicle = station_data["vehicles"].get(user_id)
+            if vehicle is not None and not vehicle.get("hold"):
+                return True  # Reserva já confirmada (ex.: PAYMENT repetido): não ocupa outra vaga
+            if vehicle is None and station_data["available_slots"] <= 0:
+                return False
+
+            updated = self._apply_reserve(station_data, user_id, estimated_timestamp, hold)
+            record = {"op": "reserve", "station": station_id, "user": user_id, "ts": estimated_timestamp}
+            if hold:
+                record["hold"] = True
+            swapped, seq = self._compare_and_swap(station_id, station_data["version"], updated, record)
+            if swapped:
+                break
+            metrics.inc("station_cas_retries_total")
+
+        if hold:
+            metrics.inc("station_holds_placed_total")
+        elif vehicle is not None:
+            metrics.inc("station_holds_confirmed_total")
+
+        # Aguarda fora do lock: reservas concorrentes compartilham o mesmo fsync
+        self._wait_durable(seq)
+        return True
+
+    def release(self, station_id, user_ids, due_before=None, holds_only=False):
+        """Libera as vagas dos usuários informados e retorna os dados atualizados do posto.
+
+        Com `due_before`, só libera veículos com término até esse instante; com `holds_only`,
+        só pré-reservas. As condições são conferidas a cada tentativa, para que uma pré-reserva
+        confirmada por PAYMENT nesse meio tempo não seja liberada.
+        """
+        station_id = str(station_id)
+        if station_id not in self.stations:
+            return None
+        while True:
+            station_data = self.get_station(station_id)
+            vehicles = station_data["vehicles"]
+            released = [
+                user_id for user_id in user_ids
+                if user_id in vehicles
+                and (due_before is None or vehicles[user_id]["estimated_timestamp"] <= due_before)
+                and (not holds_only or vehicles[user_id].get("hold"))
+            ]
+            if not released:
+                return station_data
+
+            updated = self._apply_release(station_data, released)
+            swapped, seq = self._compare_and_swap(station_id, station_data["version"], updated, {
+                "op": "release",
+                "station": station_id,
+                "users": released
+            })
+            if swapped:
+                break
+            metrics.inc("station_cas_retries_total")
+
+        self._wait_durable(seq)
+        return updated
+
+    def expired_vehicles(self, current_time):
+        """Retorna {station_id: [user_id, ...]} dos veículos com carregamento concluído."""
+        expired = {}
+        for station_id in self.station_ids():
+            station_data = self.get_station(station_id)
+            for user_id, vehicle in station_data["vehicles"].items():
+                if current_time >= vehicle["estimated_timestamp"]:
+                    expired.setdefault(station_id, []).append(user_id)
+        return expired
+
+    def snapshot(self):
+        """Grava os postos alterados e descarta o segmento do journal já coberto por eles."""
+        with self.lock:
+            if not self.dirty:
+                return  # Nenhuma alteração desde o último snapshot: o journal está vazio
+            # Rotaciona sob o lock: o segmento antigo contém apenas alterações já refletidas em memória
+            old_segment = self.journal.rotate() if self.journal else None
+            dirty = self._take_dirty()
+
+        self._write_snapshot(dirty)
+        if old_segment:
+            self.journal.remove_segments([old_segment])
+
+    def _take_dirty(self):
+        """Retorna e limpa a lista de postos alterados (chamar com o lock adquirido)."""
+        dirty = list(self.dirty)
+        self.dirty.clear()
+        return dirty
+
+    def _write_snapshot(self, dirty):
+        """Grava os arquivos dos postos de forma atômica e durável."""
+        for station_id in dirty:
+            filepath = os.path.join(self.stations_dir, f"station_{station_id}.json")
+            # O sufixo com o PID evita que dois processos escrevam no mesmo arquivo temporário
+            tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+            station_data = self._current(station_id)  # Cópia na escrita: não muda durante o dump
+            while True:
+                with metrics.timed("disk_io_seconds", ("op", "station_snapshot")):
+                    with open(tmp_filepath, "w", encoding="utf-8") as f:
+                        json.dump(station_data, f, indent=4)
+                        f.flush()
+                        os.fsync(f.fileno())
+                if not self.shared:
+                    os.replace(tmp_filepath, filepath)  # Troca atômica evita arquivos truncados
+                    break
+                # Com vários processos, só a troca ocorre sob o lock do posto (nunca o fsync), e apenas
+                # se a versão gravada ainda é a mais recente: um snapshot antigo nunca sobrescreve um novo
+                with self._exclusive(station_id):
+                    current = self._current(station_id)
+                    if current["version"] == station_data["version"]:
+                        os.replace(tmp_filepath, filepath)
+                        break
+                station_data = current  # Outra escrita publicou durante a gravação: grava de novo
+
+        if dirty:
+            # Garante que as renomeações estejam em disco antes de remover o journal
+            dir_fd = os.open(self.stations_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @contextmanager
+    def _exclusive(self, station_id):
+        """Exclusão entre threads e, com a tabela compartilhada, entre processos."""
+        # O lock de thread vem antes: locks fcntl pertencem ao processo, não à thread
+        with self.lock:
+            with self.shared.locked(station_id) if self.shared else nullcontext():
+                yield
+
+    def _compare_and_swap(self, station_id, expected_version, station_data, record):
+        """Instala `station_data` como a próxima versão do posto se ele ainda está em `expected_version`.
+
+        Retorna (True, sequência no journal) ou (False, None) se outra escrita publicou antes.
+        Só a comparação e a publicação ocorrem sob o lock; leitores nunca esperam por ele.
+        """
+        with self._exclusive(station_id):
+            current = self._current(station_id)
+            if current["version"] != expected_version:
+                return False, None
+            station_data["version"] = expected_version + 1
+            self._publish(station_id, station_data)
+
+            heap = self._advance_release_heap(station_id, expected_version, station_data, record)
+            self._update_vectors(self.vectors, station_id, station_data, heap[0][0] if heap else float("inf"))
+            return True, self._log({**record, "v": station_data["version"]})
+
+    def _current(self, station_id):
+        """Retorna o estado mais recente do posto, sincronizando com os outros processos."""
+        return self.get_station(station_id)
+
+    def _refresh(self, station_id):
+        """Reconstrói a cópia local do posto a partir da tabela compartilhada."""
+        version, available_slots, vehicles = self.shared.read(station_id)
+        station_data = {
+            **self.stations[station_id],
+            "available_slots": available_slots,
+            "vehicles": vehicles,
+            "version": version
+        }
+        self.stations[station_id] = station_data
+        return station_data
+
+    def _build_vectors(self, station_ids):
+        """Vetores dos postos carregados na ordem de `station_ids`, seguidos dos postos fora dela."""
+        known = set(station_ids)
+        vectors = StationVectors(station_ids, [station_id for station_id in self.stations if station_id not in known])
+        for station_id, station_data in self.stations.items():
+            heap = self._release_heap(station_id, station_data)
+            self._update_vectors(vectors, station_id, station_data, heap[0][0] if heap else float("inf"))
+        return vectors
+
+    def _update_vectors(self, vectors, station_id, station_data, release):
+        """Reflete a versão do posto e o término da reserva mais próxima na sua posição dos vetores."""
+        position = vectors.positions.get(station_id)
+        if position is not None:
+            vectors.update(position, station_data["version"], station_data["available_slots"], release)
+
+    def _publish(self, station_id, station_data):
+        """Instala a nova versão do posto (chamar com os locks adquiridos)."""
+        self.stations[station_id] = station_data
+        self.dirty.add(station_id)
+        if self.shared:
+            self.shared.write(station_id, station_data)
+        if self.on_change:
+            self.on_change(station_id)
+
+    def _release_heap(self, station_id, station_data):
+        """Heap de términos das reservas do posto, reconstruído só se a versão em cache é outra.
+
+        Só reservas confirmadas: o vencimento de uma pré-reserva não garante vaga, pois o PAYMENT
+        pode confirmá-la antes. Chamar com o lock adquirido; no modo com um processo toda escrita
+        passa por _advance_release_heap, e a reconstrução só ocorre após escritas de outros processos.
+        """
+        cached = self.release_heaps.get(station_id)
+        if cached is None or cached[0] != station_data["version"]:
+            heap = [(vehicle["estimated_timestamp"], user_id) for user_id, vehicle in station_data["vehicles"].items()
+                    if not vehicle.get("hold")]
+            heapq.heapify(heap)
+            cached = (station_data["version"], heap)
+            self.release_heaps[station_id] = cached
+        return cached[1]
+
+    def _advance_release_heap(self, station_id, expected_version, station_data, record):
+        """Leva o heap do posto de `expected_version` à versão publicada (chamar com o lock adquirido).
+
+        Uma reserva confirmada insere o término em O(log n); liberações e pré-reservas não mexem no
+        heap. Entradas que deixaram de valer (vaga liberada, renovada ou rebaixada) são descartadas
+        quando chegam ao topo, e o heap é compactado se elas passam a ser maioria.
+        """
+        cached = self.release_heaps.get(station_id)
+        if cached is None or cached[0] != expected_version:
+            return self._release_heap(station_id, station_data)  # Escrita de outro processo no meio
+        heap = cached[1]
+        if record["op"] == "reserve" and not record.get("hold"):
+            heapq.heappush(heap, (record["ts"], record["user"]))
+        vehicles = station_data["vehicles"]
+        if len(heap) > 2 * len(vehicles) + 8:
+            del self.release_heaps[station_id]
+            return self._release_heap(station_id, station_data)
+        while heap and not self._confirmed(vehicles, heap[0]):
+            heapq.heappop(heap)
+        self.release_heaps[station_id] = (station_data["version"], heap)
+        return heap
+
+    def _confirmed(self, vehicles, entry):
+        """A entrada (término, user_id) do heap ainda corresponde a uma reserva confirmada do posto."""
+        vehicle = vehicles.get(entry[1])
+        return vehicle is not None and not vehicle.get("hold") and vehicle["estimated_timestamp"] == entry[0]
+
+    def _release_top(self, station_id, station_data, current_time=None):
+        """Término da reserva confirmada mais próxima (após `current_time`, se informado), ou inf.
+
+        Caso comum sem lock: o topo do heap na versão lida, em O(1). O lock só é tomado se o heap
+        está em outra versão ou se o topo já venceu sem ter sido liberado pelo monitor; nesse caso
+        os términos vencidos saem do heap, pois nenhuma consulta posterior volta a precisar deles.
+        """
+        cached = self.release_heaps.get(station_id)
+        if cached is not None and cached[0] == station_data["version"]:
+            heap = cached[1]
+            if not heap:
+                return float("inf")
+            if current_time is None or heap[0][0] > current_time:
+                return heap[0][0]
+        with self.lock:
+            station_data = self._current(station_id)
+            heap = self._release_heap(station_id, station_data)
+            vehicles = station_data["vehicles"]
+            while heap and (current_time is not None and heap[0][0] <= current_time
+                            or not self._confirmed(vehicles, heap[0])):
+                heapq.heappop(heap)
+            return heap[0][0] if heap else float("inf")
+
+    def _log(self, record):
+        """Enfileira o registro no journal (chamar com o lock adquirido)."""
+        return self.journal.append(record) if self.journal else None
+
+    def _wait_durable(self, seq):
+        """Aguarda o fsync do registro no journal."""
+        if seq is not None:
+            self.journal.wait_committed(seq)
+
+    def _apply_reserve(self, station_data, user_id, estimated_timestamp, hold=False):
+        """Retorna uma cópia do posto com a vaga reservada (cópia na escrita)."""
+        vehicles = dict(station_data["vehicles"])
+        # Confirmação ou renovação de pré-reserva: o usuário já ocupa a vaga
+        occupied = user_id in vehicles
+        vehicles[user_id] = {"estimated_timestamp": estimated_timestamp, "hold": True} if hold \
+            else {"estimated_timestamp": estimated_timestamp}
+        return {
+            **station_data,
+            "available_slots": station_data["available_slots"] - (0 if occupied else 1),
+            "vehicles": vehicles
+        }
+
+    def _apply_release(self, station_data, user_ids):
+        """Retorna uma cópia do posto com as vagas dos usuários liberadas."""
+        vehicles = dict(station_data["vehicles"])
+        released = [user_id for user_id in user_ids if vehicles.pop(user_id, None) is not None]
+        return {
+            **station_data,
+            "available_slots": station_data["available_slots"] + len(released),
+            "vehicles": vehicles
+        }
+
+    def _snapshot_loop(self):
+        """Grava snapshots periodicamente, compactando o journal."""
+        # Aguarda o intervalo (ou o sinal de parada) entre os snapshots
+        while not self.stop_event.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                log.error("Erro ao gravar snapshot dos postos", error=e)
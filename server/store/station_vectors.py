@@ -0,0 +1,63 @@
+try:
+    import numpy as np
+except ImportError:  # Sem NumPy: listas com a mesma indexação
+    np = None
+
+INF = float("inf")
+
+
+class StationVectors:
+    def __init__(self, station_ids, extra_ids=()):
+        """Vetores por posto, na ordem de `station_ids` (a mesma do índice espacial).
+
+        `versions` guarda a versão do posto refletida em cada posição (-1 = posto fora deste
+        armazenamento, ex.: de outro shard); `slots` as vagas livres e `releases` o término da
+        reserva confirmada mais próxima (inf se nenhuma). O StationStore atualiza as posições
+        a cada escrita publicada, então a seleção coleta os candidatos por índice. Postos
+        em `extra_ids` (fora do índice) ficam nas posições seguintes.
+        """
+        self.source = station_ids  # Lista recebida: identifica o índice espacial alinhado a estes vetores
+        self.ids = list(station_ids) + list(extra_ids)
+        self.positions = {station_id: index for index, station_id in enumerate(self.ids)}
+        size = len(self.ids)
+        if np is not None:
+            self.versions = np.full(size, -1, dtype=np.int64)
+            self.slots = np.zeros(size, dtype=np.int64)
+            self.releases = np.full(size, INF)
+        else:
+            self.versions = [-1] * size
+            self.slots = [0] * size
+            self.releases = [INF] * size
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, position, version, available_slots, release):
+        """Reflete uma versão publicada do posto na sua posição."""
+        self.versions[position] = version
+        self.slots[position] = available_slots
+        self.releases[position] = release
+
+    def gather(self, positions, distances, current_time):
+        """Coleta por índice os postos existentes entre os candidatos.
+
+        Retorna (posições, distâncias, vagas livres, próxima liberação, vencidos): a liberação só
+        conta em postos lotados (inf nos demais) e `vencidos` traz os índices cuja reserva mais
+        próxima já terminou sem ter sido liberada, que o chamador resolve pelo heap do posto.
+        """
+        if np is not None:
+            positions = np.asarray(positions, dtype=np.intp)
+            distances = np.asarray(distances, dtype=float)
+            present = self.versions[positions] >= 0
+            positions, distances = positions[present], distances[present]
+            slots = self.slots[positions]
+            next_release = np.where(slots <= 0, self.releases[positions], INF)
+            return positions, distances, slots, next_release, np.flatnonzero(next_release <= current_time).tolist()
+
+        kept = [(position, distance) for position, distance in zip(positions, distances) if self.versions[position] >= 0]
+        positions = [position for position, _ in kept]
+        slots = [self.slots[position] for position in positions]
+        next_release = [self.releases[position] if available <= 0 else INF
+                        for position, available in zip(positions, slots)]
+        stale = [index for index, release in enumerate(next_release) if release <= current_time]
+        return positions, [distance for _, distance in kept], slots, next_release, stale
@@ -0,0 +1,116 @@
+import json
+from utils.time_utils import get_current_timestamp
+
+try:
+    import orjson
+except ImportError:  # Sem orjson: tenta ujson e, por fim, a biblioteca padrão
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Biblioteca JSON mais rápida instalada; dumps retorna bytes UTF-8 compactos
+if orjson is not None:
+    JSON_LIBRARY = "orjson"
+    JSONDecodeError = orjson.JSONDecodeError  # Subclasse de json.JSONDecodeError
+
+    def dumps(value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+elif ujson is not None:
+    JSON_LIBRARY = "ujson"
+    JSONDecodeError = ujson.JSONDecodeError
+
+    def dumps(value):
+        return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    loads = ujson.loads
+else:
+    JSON_LIBRARY = "json"
+    JSONDecodeError = json.JSONDecodeError
+
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":")).encode('utf-8')
+
+    loads = json.loads
+
+# Limite de segurança dos formatos pré-compilados. Respostas cujo tipo ou mensagem vêm do cliente
+# são montadas com cached=False e nunca entram no cache, que fica restrito aos formatos do código
+MAX_SHAPES = 1024
+
+
+class ResponseTemplate:
+    def __init__(self, fields):
+        """Serializa uma única vez uma resposta completa, exceto o timestamp."""
+        self.fields = fields
+        body = dumps(fields)
+        self.prefix = body[:-1] + b',"timestamp":"'
+        self.suffix = b'"}\n'
+        self.encoded = {}  # Corpo já serializado em outros formatos de transmissão (ver utils/wire.py)
+
+    def render(self, timestamp):
+        """Cria a resposta com o timestamp informado, sem serializar o corpo novamente."""
+        return PreEncodedResponse(self, timestamp)
+
+
+class PreEncodedResponse(dict):
+    def __init__(self, template, timestamp):
+        """Resposta já serializada; como dict, expõe os mesmos campos (não deve ser modificada)."""
+        super().__init__(template.fields, timestamp=timestamp)
+        self.template = template
+
+    def encode(self):
+        """Retorna os bytes da resposta, inserindo apenas o timestamp."""
+        return self.template.prefix + self["timestamp"].encode('utf-8') + self.template.suffix
+
+
+class ResponseShape:
+    def __init__(self, response_type, code, message):
+        """Partes constantes de uma resposta (tipo e status), serializadas uma única vez."""
+        self.type = response_type
+        self.code = code
+        self.message = message
+        self.prefix = b'{"type":' + dumps(response_type) + b',"data":'
+        self.middle = b',"status":' + dumps({"code": code, "message": message}) + b',"timestamp":"'
+
+
+class ShapedResponse(dict):
+    def __init__(self, shape, data, timestamp):
+        """Resposta montada sobre um ResponseShape: no envio, só `data` é serializado."""
+        super().__init__(type=shape.type, data=data,
+                         status={"code": shape.code, "message": shape.message}, timestamp=timestamp)
+        self.shape = shape
+
+    def encode(self):
+        """Retorna os bytes da resposta, concatenando as partes pré-compiladas."""
+        return (self.shape.prefix + dumps(self["data"]) + self.shape.middle
+                + self["timestamp"].encode('utf-8') + b'"}\n')
+
+
+_shapes = {}  # (tipo, código, mensagem) -> ResponseShape
+
+
+def build_response(response_type, data, code=200, message="Sucesso", cached=True):
+    """Monta a resposta de `response_type` com o status informado e o timestamp atual.
+
+    Use `cached=False` quando o tipo ou a mensagem trazem dados da requisição ou de uma exceção:
+    o formato é montado só para esta resposta, sem ocupar o cache com valores que não se repetem.
+    """
+    if not cached:
+        return ShapedResponse(ResponseShape(response_type, code, message), data, get_current_timestamp())
+    key = (response_type, code, message)
+    shape = _shapes.get(key)
+    if shape is None:
+        shape = ResponseShape(response_type, code, message)
+        if len(_shapes) < MAX_SHAPES:
+            _shapes[key] = shape
+    return ShapedResponse(shape, data, get_current_timestamp())
+
+
+def encode_response(response):
+    """Serializa uma resposta para envio (JSON + '\\n'), reaproveitando as partes pré-serializadas."""
+    if isinstance(response, (PreEncodedResponse, ShapedResponse)):
+        return response.encode()
+    return dumps(response) + b'\n'
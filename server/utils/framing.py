@@ -0,0 +1,119 @@
+import socket
+from collections import deque
+
+# Limite de buffers por chamada a sendmsg (IOV_MAX típico no Linux)
+MAX_IOVECS = 1024
+
+
+class FrameBuffer:
+    def __init__(self, initial_size=65536, min_free=4096):
+        """Buffer de entrada para mensagens delimitadas por '\\n', sem cópias a cada recv."""
+        self.buffer = bytearray(initial_size)
+        self.min_free = min_free  # Espaço livre mínimo antes de cada recv_into
+        self.start = 0  # Início do próximo frame ainda não consumido
+        self.end = 0    # Fim dos dados válidos
+        self.scan = 0   # Posição a partir da qual o '\n' ainda não foi procurado
+
+    def __len__(self):
+        """Quantidade de bytes recebidos e ainda não consumidos."""
+        return self.end - self.start
+
+    def recv_into(self, sock):
+        """Lê do socket diretamente para o buffer; retorna o número de bytes lidos."""
+        self._reserve(self.min_free)
+        with memoryview(self.buffer) as view:
+            received = sock.recv_into(view[self.end:])
+        self.end += received
+        return received
+
+    def frames(self):
+        """Gera os frames completos, retomando a busca de '\\n' de onde parou."""
+        while True:
+            index = self.buffer.find(b'\n', self.scan, self.end)
+            if index < 0:
+                self.scan = self.end
+                break
+            frame = bytes(self.buffer[self.start:index])
+            self.start = self.scan = index + 1
+            yield frame
+
+        if self.start == self.end:
+            # Buffer vazio: volta ao início sem mover dados
+            self.start = self.end = self.scan = 0
+
+    def prefixed_frames(self, header):
+        """Gera os frames com prefixo de tamanho: campos do cabeçalho (struct) seguidos do corpo.
+
+        O primeiro campo do cabeçalho é o tamanho do corpo em bytes.
+        """
+        while self.end - self.start >= header.size:
+            fields = header.unpack_from(self.buffer, self.start)
+            frame_end = self.start + header.size + fields[0]
+            if frame_end > self.end:
+                break  # Corpo ainda incompleto
+            body = bytes(self.buffer[self.start + header.size:frame_end])
+            self.start = self.scan = frame_end
+            yield fields + (body,)
+
+        if self.start == self.end:
+            self.start = self.end = self.scan = 0
+
+    def clear(self):
+        """Descarta todos os dados pendentes."""
+        self.start = self.end = self.scan = 0
+
+    def _reserve(self, size):
+        """Garante `size` bytes livres no final, compactando ou dobrando o buffer."""
+        if len(self.buffer) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if self.start > 0:
+            # Move apenas os bytes pendentes; ocorre só quando falta espaço
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.scan -= self.start
+            self.start, self.end = 0, pending
+        if len(self.buffer) - self.end < size:
+            self.buffer.extend(bytes(max(len(self.buffer), size)))
+
+
+class OutputQueue:
+    def __init__(self):
+        """Fila de blocos de saída enviados com sendmsg (writev), sem refatiar o acúmulo."""
+        self.chunks = deque()
+        self.offset = 0  # Bytes já enviados do primeiro bloco
+        self.size = 0    # Total de bytes pendentes
+
+    def __len__(self):
+        """Quantidade de bytes aguardando envio."""
+        return self.size
+
+    def append(self, data):
+        """Enfileira um bloco de bytes para envio."""
+        if data:
+            self.chunks.append(data)
+            self.size += len(data)
+
+    def send(self, sock):
+        """Envia o máximo possível em uma chamada; retorna o número de bytes enviados."""
+        if not self.chunks:
+            return 0
+        buffers = []
+        for index, chunk in enumerate(self.chunks):
+            if index == MAX_IOVECS:
+                break
+            buffers.append(memoryview(chunk)[self.offset:] if index == 0 else chunk)
+        sent = sock.sendmsg(buffers) if hasattr(socket.socket, "sendmsg") else sock.send(buffers[0])
+        self._consume(sent)
+        return sent
+
+    def _consume(self, sent):
+        """Remove da fila os bytes enviados, avançando o deslocamento do primeiro bloco."""
+        self.size -= sent
+        while sent:
+            remaining = len(self.chunks[0]) - self.offset
+            if sent < remaining:
+                self.offset += sent
+                return
+            sent -= remaining
+            self.chunks.popleft()
+            self.offset = 0
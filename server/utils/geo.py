@@ -0,0 +1,114 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # Sem NumPy: cálculo em Python puro
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32  # Comprimento aproximado de 1 grau de latitude
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (graus) pela fórmula de haversine."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distâncias em km de um ponto para vários pontos (vetorizado com NumPy se disponível)."""
+    if np is None:
+        return [haversine(lat, lon, lat2, lon2) for lat2, lon2 in zip(lats, lons)]
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class StationSpatialIndex:
+    def __init__(self, station_models, cell_size=0.05):
+        """Constrói uma grade regular (em graus) sobre as coordenadas dos postos."""
+        self.cell_size = cell_size  # ~5,5 km de latitude por célula
+        self.ids = []
+        lats, lons = [], []
+        for station_id, station in station_models.items():
+            try:
+                lat, lon = float(station["latitude"]), float(station["longitude"])
+            except (KeyError, TypeError, ValueError):
+                continue  # Ignora postos sem coordenadas válidas
+            self.ids.append(station_id)
+            lats.append(lat)
+            lons.append(lon)
+
+        self.lats = np.array(lats) if np is not None else lats
+        self.lons = np.array(lons) if np is not None else lons
+        self.cells = {}  # (linha, coluna) -> índices dos postos
+        for index, (lat, lon) in enumerate(zip(lats, lons)):
+            self.cells.setdefault(self._cell(lat, lon), []).append(index)
+        rows = [row for row, _ in self.cells] or [0]
+        cols = [col for _, col in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell(self, lat, lon):
+        """Célula da grade que contém o ponto."""
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def _ring(self, center, radius):
+        """Células na borda do quadrado de raio `radius` em torno de `center`."""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+    def nearest(self, lat, lon, k=5, max_distance=None):
+        """Retorna até k pares (station_id, distância em km), do mais próximo ao mais distante."""
+        indexes, distances = self.nearest_indices(lat, lon, k, max_distance)
+        return [(self.ids[index], distance) for index, distance in zip(indexes, distances)]
+
+    def nearest_indices(self, lat, lon, k=5, max_distance=None):
+        """Como nearest, mas retorna (índices em `ids`, distâncias) para coleta direta em vetores alinhados."""
+        if not self.ids or k <= 0:
+            return [], []
+        center = self._cell(lat, lon)
+        found = []  # (distância, índice)
+        visited = 0
+        # Ponto fora da grade: começa no primeiro anel que alcança alguma célula ocupada
+        row_min, row_max, col_min, col_max = self.bounds
+        radius = max(0, row_min - center[0], center[0] - row_max, col_min - center[1], center[1] - col_max)
+        while visited < len(self.ids):
+            indexes = [i for cell in self._ring(center, radius) for i in self.cells.get(cell, ())]
+            if indexes:
+                visited += len(indexes)
+                if np is not None:
+                    distances = haversine_many(lat, lon, self.lats[indexes], self.lons[indexes]).tolist()
+                else:
+                    distances = haversine_many(lat, lon, [self.lats[i] for i in indexes], [self.lons[i] for i in indexes])
+                found.extend(zip(distances, indexes))
+                found.sort()
+                del found[k:]
+
+            # Postos fora dos anéis já visitados estão a pelo menos `radius` células de distância
+            lon_scale = math.cos(math.radians(min(89.0, abs(lat) + (radius + 1) * self.cell_size)))
+            lower_bound = radius * self.cell_size * KM_PER_DEGREE * lon_scale
+            if max_distance is not None and lower_bound > max_distance:
+                break
+            if len(found) == k and found[-1][0] <= lower_bound:
+                break
+            radius += 1
+
+        found = [(distance, index) for distance, index in found if max_distance is None or distance <= max_distance]
+        return [index for _, index in found], [distance for distance, _ in found]
@@ -0,0 +1,49 @@
+import bisect
+import hashlib
+
+
+def parse_nodes(text):
+    """Converte "host:porta,host:porta,..." na lista de nós (strings "host:porta")."""
+    nodes = [node.strip() for node in text.split(",") if node.strip()]
+    for node in nodes:
+        host, _, port = node.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Nó inválido (esperado host:porta): {node}")
+    if len(set(nodes)) != len(nodes):
+        raise ValueError("Nós repetidos na lista de shards")
+    return nodes
+
+
+def node_address(node):
+    """(host, porta) de um nó "host:porta"."""
+    host, _, port = node.rpartition(":")
+    return host, int(port)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=128):
+        """Anel de hash consistente: cada nó ocupa `replicas` pontos virtuais no anel.
+
+        Uma chave pertence ao primeiro ponto no sentido horário a partir do seu hash; ao
+        incluir ou remover um nó, só as chaves dos pontos vizinhos a ele mudam de dono.
+        """
+        self.nodes = list(nodes)
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in self.nodes for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def owner(self, key):
+        """Nó responsável pela chave (ex.: o ID de um posto)."""
+        index = bisect.bisect(self.hashes, _hash(str(key)))
+        return self.owners[index % len(self.owners)]
+
+    def partition(self, keys):
+        """Agrupa as chaves por nó responsável, preservando a ordem: {nó: [chave, ...]}."""
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.owner(key), []).append(key)
+        return groups
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from utils.metrics import metrics
+
+LOG_FORMATS = ["kv", "json"]
+QUEUE_SIZE = 10000  # Registros aguardando escrita; acima disso são descartados (e contados)
+
+
+def _kv_value(value):
+    """Valor no formato key=value, entre aspas quando necessário."""
+    text = value if isinstance(value, str) else str(value)
+    if not text or any(c in text for c in ' "=\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        """Uma linha `ts=... level=... logger=... event="..." campo=valor`."""
+        fields = _record_fields(record)
+        line = " ".join(f"{key}={_kv_value(value)}" for key, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        """Uma linha JSON por registro."""
+        fields = _record_fields(record)
+        if record.exc_text:
+            fields["exception"] = record.exc_text
+        return json.dumps(fields, ensure_ascii=False, default=str)
+
+
+FORMATTERS = {"kv": KeyValueFormatter, "json": JsonFormatter}
+
+
+def _record_fields(record):
+    return {
+        "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+        "level": record.levelname,
+        "logger": record.name,
+        "event": record.getMessage(),
+        **getattr(record, "fields", {})
+    }
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        """Não formata na thread que registra: a formatação fica com a thread de escrita."""
+        if record.exc_info:
+            # Tracebacks não podem atravessar a fila: são convertidos em texto aqui (caso raro)
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """Nunca bloqueia quem registra: com a fila cheia, o registro é descartado."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        """O aviso de parada espera espaço na fila, em vez de ser descartado."""
+        self.queue.put(self._sentinel)
+
+
+class _LogState:
+    def __init__(self):
+        """Fila, escritor em segundo plano e configuração atual do logging."""
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.stream_handler = logging.StreamHandler(sys.stdout)
+        self.stream_handler.setFormatter(KeyValueFormatter())
+        self.listener = None
+        self.sample_rate = 0.01
+        self.root = logging.getLogger("ev")
+        self.root.propagate = False
+        self.root.setLevel(logging.INFO)
+        self.root.addHandler(_NonBlockingQueueHandler(self.queue))
+
+    def start(self):
+        """Inicia a thread que escreve os registros da fila."""
+        if self.listener is None:
+            self.listener = _Listener(self.queue, self.stream_handler)
+            self.listener.start()
+
+    def stop(self):
+        """Escreve os registros pendentes e para a thread de escrita."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.stream_handler.flush()
+
+
+_state = _LogState()
+_state.start()
+atexit.register(_state.stop)
+if hasattr(os, "register_at_fork"):
+    # A thread de escrita não sobrevive ao fork: para antes e recomeça em cada processo
+    os.register_at_fork(before=_state.stop, after_in_parent=_state.start, after_in_child=_state.start)
+
+
+def configure_logging(level="INFO", log_format="kv", sample_rate=0.01):
+    """Define o nível, o formato das linhas e a fração amostrada dos logs por requisição."""
+    _state.root.setLevel(level.upper())
+    _state.stream_handler.setFormatter(FORMATTERS[log_format]())
+    _state.sample_rate = sample_rate
+
+
+def flush_logging():
+    """Escreve os registros pendentes (antes de encerrar o processo sem passar pelo atexit)."""
+    _state.stop()
+    _state.start()
+
+
+class StructuredLogger:
+    def __init__(self, name):
+        """Logger com campos estruturados: log.info("evento", campo=valor, ...)."""
+        self.logger = logging.getLogger(f"ev.{name}")
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """Registra um erro com o traceback da exceção em tratamento."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def sample(self, event, payload=None, **fields):
+        """Log por requisição: em DEBUG registra todas, com o payload; em INFO, só uma amostra e sem payload."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            if isinstance(payload, bytes):
+                payload = payload.decode("utf-8", "replace")  # Decodificado só quando será registrado
+            self._log(logging.DEBUG, event, {**fields, "payload": payload} if payload is not None else fields)
+        elif _state.sample_rate and random.random() < _state.sample_rate:
+            self._log(logging.INFO, event, {**fields, "sample_rate": _state.sample_rate})
+
+
+def get_logger(name):
+    """Retorna o logger estruturado do módulo `name`."""
+    return StructuredLogger(name)
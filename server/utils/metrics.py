@@ -0,0 +1,228 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sub-buckets por potência de 2: erro relativo máximo de ~1,6% nos percentis
+SUB_BUCKET_BITS = 7
+HALF_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+QUANTILES = {0.5: "p50", 0.9: "p90", 0.99: "p99", 0.999: "p999"}
+
+
+def bucket_index(value):
+    """Índice do bucket log-linear (estilo HDR) de um valor inteiro não negativo."""
+    magnitude = value.bit_length() - SUB_BUCKET_BITS
+    if magnitude <= 0:
+        return value
+    return magnitude * HALF_BUCKETS + (value >> magnitude)
+
+
+def bucket_upper(index):
+    """Maior valor representado pelo bucket."""
+    if index < 2 * HALF_BUCKETS:
+        return index
+    magnitude = index // HALF_BUCKETS - 1
+    sub_bucket = index - magnitude * HALF_BUCKETS
+    return ((sub_bucket + 1) << magnitude) - 1
+
+
+class Histogram:
+    def __init__(self):
+        """Histograma de latências em microssegundos, com um fragmento por thread.
+
+        Cada thread grava apenas no seu fragmento (sem lock); a leitura soma os fragmentos.
+        """
+        self.local = threading.local()
+        self.shards = []
+        self.shards_lock = threading.Lock()  # Usado só no primeiro registro de cada thread
+
+    def record(self, seconds):
+        """Registra uma duração em segundos."""
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = {"counts": {}, "count": 0, "sum": 0.0, "max": 0}
+            with self.shards_lock:
+                self.shards.append(shard)
+        micros = max(0, int(seconds * 1_000_000))
+        counts = shard["counts"]
+        index = bucket_index(micros)
+        counts[index] = counts.get(index, 0) + 1
+        shard["count"] += 1
+        shard["sum"] += seconds
+        if micros > shard["max"]:
+            shard["max"] = micros
+
+    @contextmanager
+    def time(self):
+        """Mede a duração do bloco."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def snapshot(self):
+        """Retorna contagem, soma (s), máximo (s) e percentis (s) agregando todas as threads."""
+        with self.shards_lock:
+            shards = list(self.shards)
+        counts, count, total, maximum = {}, 0, 0.0, 0
+        for shard in shards:
+            for index, bucket_count in dict(shard["counts"]).items():
+                counts[index] = counts.get(index, 0) + bucket_count
+            count += shard["count"]
+            total += shard["sum"]
+            maximum = max(maximum, shard["max"])
+
+        quantiles = {}
+        if counts:
+            ordered = sorted(counts.items())
+            observed = sum(bucket_count for _, bucket_count in ordered)
+            for quantile in QUANTILES:
+                target = quantile * observed
+                cumulative = 0
+                for index, bucket_count in ordered:
+                    cumulative += bucket_count
+                    if cumulative >= target:
+                        quantiles[quantile] = min(bucket_upper(index), maximum) / 1_000_000
+                        break
+        return {"count": count, "sum": total, "max": maximum / 1_000_000, "quantiles": quantiles}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Registro de métricas do processo: histogramas, contadores e medidores.
+
+        Como nos histogramas, cada thread incrementa os seus próprios contadores (sem lock,
+        sem perder incrementos concorrentes); a leitura soma os de todas as threads.
+        """
+        self.histograms = {}  # (nome, (rótulo, valor)) -> Histogram
+        self.local = threading.local()
+        self.counter_shards = []  # Um dicionário nome -> valor por thread
+        self.gauges = {}      # nome -> função que retorna o valor atual
+        self.lock = threading.Lock()
+
+    def histogram(self, name, label=None):
+        """Retorna (criando se necessário) o histograma `name`, opcionalmente com um rótulo (nome, valor)."""
+        key = (name, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name, amount=1):
+        """Incrementa um contador no fragmento da thread atual."""
+        counters = getattr(self.local, "counters", None)
+        if counters is None:
+            counters = self.local.counters = {}
+            with self.lock:
+                self.counter_shards.append(counters)
+        counters[name] = counters.get(name, 0) + amount
+
+    def counter(self, name):
+        """Valor atual de um contador, somando todas as threads."""
+        with self.lock:
+            shards = list(self.counter_shards)
+        return sum(shard.get(name, 0) for shard in shards)
+
+    def counters(self):
+        """Todos os contadores {nome: valor}, somando todas as threads."""
+        with self.lock:
+            shards = list(self.counter_shards)
+        totals = {}
+        for shard in shards:
+            for name, value in dict(shard).items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def gauge(self, name, function):
+        """Registra um medidor calculado no momento da leitura."""
+        self.gauges[name] = function
+
+    def timed(self, name, label=None):
+        """Context manager que registra a duração do bloco no histograma."""
+        return self.histogram(name, label).time()
+
+    def snapshot(self):
+        """Métricas atuais em formato serializável (usado pela requisição METRICS)."""
+        histograms = {}
+        for (name, label), histogram in list(self.histograms.items()):
+            data = histogram.snapshot()
+            histograms.setdefault(name, {})[label[1] if label else ""] = {
+                "count": data["count"],
+                "sum_s": round(data["sum"], 6),
+                "max_ms": round(data["max"] * 1000, 3),
+                **{f"{QUANTILES[q]}_ms": round(v * 1000, 3) for q, v in data["quantiles"].items()}
+            }
+        return {
+            "counters": self.counters(),
+            "gauges": {name: function() for name, function in list(self.gauges.items())},
+            "histograms": histograms
+        }
+
+    def prometheus(self):
+        """Métricas no formato de texto do Prometheus (histogramas como summary)."""
+        lines = []
+        for name, value in sorted(self.counters().items()):
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        for name, function in sorted(list(self.gauges.items())):
+            value = function()
+            if value is not None:
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+
+        declared = set()
+        for (name, label), histogram in sorted(list(self.histograms.items()), key=lambda item: (item[0][0], item[0][1] or ())):
+            if name not in declared:
+                lines.append(f"# TYPE {name} summary")
+                declared.add(name)
+            labels = f'{label[0]}="{label[1]}"' if label else ""
+            data = histogram.snapshot()
+            for quantile, value in data["quantiles"].items():
+                quantile_labels = f'{labels},quantile="{quantile}"' if labels else f'quantile="{quantile}"'
+                lines.append(f"{name}{{{quantile_labels}}} {value}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {data['sum']}")
+            lines.append(f"{name}_count{suffix} {data['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def open_fds():
+    """Quantidade de descritores de arquivo abertos pelo processo (None se indisponível)."""
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+
+# Registro compartilhado por todo o processo
+metrics = MetricsRegistry()
+metrics.gauge("open_fds", open_fds)
+metrics.gauge("connections_open", lambda: metrics.counter("connections_accepted_total")
+              - metrics.counter("connections_closed_total"))
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Sem log por coleta
+
+
+def start_metrics_server(host, port):
+    """Expõe /metrics em texto do Prometheus em uma porta separada (thread em segundo plano)."""
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,56 @@
+try:
+    import numpy as np
+except ImportError:  # Sem NumPy: laço único em Python puro
+    np = None
+
+INF = float("inf")
+
+
+def score_stations(distances, available_slots, next_release, current_time,
+                   current_battery, energy_consumption, travel_speed, charge_time):
+    """Avalia todos os candidatos de uma vez e retorna o índice do melhor e seus tempos.
+
+    `next_release` traz, por posto, o timestamp da próxima vaga a liberar (ou inf).
+    Retorna None se nenhum posto for alcançável e disponível; caso contrário,
+    (índice, travel_time, wait_time, total_time) do posto com menor tempo total.
+    """
+    if len(distances) == 0:  # Também aceita os vetores NumPy coletados pelo armazenamento
+        return None
+    if np is not None:
+        return _score_numpy(distances, available_slots, next_release, current_time,
+                            current_battery, energy_consumption, travel_speed, charge_time)
+
+    best = None
+    for index, distance in enumerate(distances):
+        # Alcançável: bateria restante no destino deve ser positiva
+        if current_battery - distance * energy_consumption <= 0:
+            continue
+        travel_time = distance / travel_speed * 3600
+        wait_time = 0
+        if available_slots[index] <= 0:
+            if next_release[index] == INF:
+                continue  # Posto lotado sem previsão de liberação
+            wait_time = max(0, next_release[index] - current_time - travel_time)
+        total_time = travel_time + wait_time + charge_time
+        if best is None or total_time < best[3]:
+            best = (index, travel_time, wait_time, total_time)
+    return best
+
+
+def _score_numpy(distances, available_slots, next_release, current_time,
+                 current_battery, energy_consumption, travel_speed, charge_time):
+    """Versão vetorizada de score_stations."""
+    distances = np.asarray(distances, dtype=float)
+    full = np.asarray(available_slots) <= 0
+    remaining = np.asarray(next_release, dtype=float) - current_time
+
+    travel_time = distances / travel_speed * 3600
+    wait_time = np.where(full, np.maximum(0, remaining - travel_time), 0.0)
+    total_time = travel_time + wait_time + charge_time
+
+    viable = (current_battery - distances * energy_consumption > 0) & ~(full & np.isinf(remaining))
+    if not viable.any():
+        return None
+    total_time = np.where(viable, total_time, INF)
+    index = int(np.argmin(total_time))
+    return index, float(travel_time[index]), float(wait_time[index]), float(total_time[index])
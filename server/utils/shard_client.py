@@ -0,0 +1,100 @@
+import socket
+import threading
+from utils.codec import dumps, loads
+from utils.hash_ring import node_address
+from utils.metrics import metrics
+
+
+class ShardClient:
+    def __init__(self, timeout=5.0):
+        """Conexões persistentes (protocolo JSON por linha) do roteador com os shards.
+
+        Cada thread usa as suas próprias conexões, então os handlers do motor asyncio
+        podem consultar os shards em paralelo sem lock.
+        """
+        self.timeout = timeout  # Segundos de espera por uma resposta antes de desistir do shard
+        self.local = threading.local()
+
+    def request(self, node, request):
+        """Envia uma requisição ao nó e retorna a resposta."""
+        return self.fan_out({node: request})[node]
+
+    def fan_out(self, requests):
+        """Envia cada requisição ao seu nó e depois lê as respostas: {nó: resposta}.
+
+        Todas são enviadas antes da primeira leitura, então os shards processam em paralelo.
+        Uma conexão reaproveitada que o shard já fechou (ex.: por inatividade) é refeita uma vez;
+        outras falhas de rede são propagadas como OSError.
+        """
+        with metrics.timed("shard_fan_out_seconds"):
+            pending, responses = {}, {}
+            try:
+                for node, request in requests.items():
+                    line = dumps(request) + b"\n"
+                    pending[node] = (line, self._send(node, line))
+
+                for node, (line, reused) in pending.items():
+                    try:
+                        responses[node] = self._receive(node)
+                    except ConnectionError:
+                        if not reused:
+                            raise
+                        self._send(node, line)  # A conexão antiga estava morta: reenvia em uma nova
+                        responses[node] = self._receive(node)
+            except OSError:
+                # Respostas não lidas deixariam as conexões fora de sincronia
+                for node in pending:
+                    if node not in responses and node in self._connections():
+                        self._drop(node)
+                metrics.inc("shard_errors_total")
+                raise
+            return responses
+
+    def close(self):
+        """Fecha as conexões da thread atual."""
+        for node in list(getattr(self.local, "connections", {})):
+            self._drop(node)
+
+    def _connections(self):
+        connections = getattr(self.local, "connections", None)
+        if connections is None:
+            connections = self.local.connections = {}
+        return connections
+
+    def _send(self, node, line):
+        """Envia a linha ao nó; retorna True se usou uma conexão já existente."""
+        connections = self._connections()
+        reused = node in connections
+        if reused:
+            try:
+                connections[node][0].sendall(line)
+                return True
+            except OSError:
+                self._drop(node)
+        sock = socket.create_connection(node_address(node), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connections[node] = (sock, sock.makefile("rb"))
+        metrics.inc("shard_connections_opened_total")
+        try:
+            sock.sendall(line)
+        except OSError:
+            self._drop(node)
+            raise
+        return False
+
+    def _receive(self, node):
+        """Lê a próxima resposta do nó (uma linha JSON)."""
+        try:
+            line = self._connections()[node][1].readline()
+        except OSError:
+            self._drop(node)  # Timeout ou erro no meio da resposta: a conexão não é mais utilizável
+            raise
+        if not line.endswith(b"\n"):
+            self._drop(node)
+            raise ConnectionError(f"Conexão com o shard {node} encerrada")
+        return loads(line)
+
+    def _drop(self, node):
+        sock, stream = self._connections().pop(node)
+        stream.close()
+        sock.close()
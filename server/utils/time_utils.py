@@ -1,8 +1,26 @@
+import threading
 from datetime import datetime, timezone
 
+_pinned = threading.local()  # Instante fixado pela thread do event loop (ver pin_timestamp)
+
+def pin_timestamp():
+    """Fixa o instante atual para a thread até a próxima chamada (uma vez por volta do event loop).
+
+    As respostas montadas na mesma volta compartilham o timestamp, calculado uma única vez.
+    """
+    now = datetime.now(timezone.utc)
+    _pinned.value = (now.timestamp(), now.isoformat())
+
+def unpin_timestamp():
+    """Volta a calcular o instante a cada chamada nesta thread."""
+    _pinned.value = None
+
 def get_current_timestamp(as_float=False):
     """Retorna o timestamp atual em formato ISO 8601 (com UTC) ou em segundos desde epoch."""
+    pinned = getattr(_pinned, "value", None)
+    if pinned is not None:
+        return pinned[0] if as_float else pinned[1]
     now = datetime.now(timezone.utc)
     if as_float:
         return now.timestamp()  # Segundos desde epoch (float)
-    return now.isoformat()  # Ex: '2025-04-06T18:22:30.123456+00:00'
\ No newline at end of file
+    return now.isoformat()  # Ex: '2025-04-06T18:22:30.123456+00:00'
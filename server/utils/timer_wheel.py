@@ -0,0 +1,56 @@
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512, now=0.0):
+        """Roda de temporizadores (hashed timing wheel) com resolução de `tick` segundos.
+
+        Agendar, reagendar e cancelar custam O(1); cada avanço visita apenas as posições
+        dos ticks decorridos. Prazos além de uma volta completa ficam na posição e são
+        reinseridos quando ela é visitada antes do vencimento.
+        """
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # Posição -> {chave: prazo}
+        self.where = {}  # chave -> posição atual
+        self.current = int(now // tick)  # Último tick já processado
+
+    def __len__(self):
+        """Quantidade de temporizadores agendados."""
+        return len(self.where)
+
+    def schedule(self, key, deadline):
+        """Agenda (ou reagenda) `key` para vencer em `deadline`."""
+        self.cancel(key)
+        # Nunca em um tick já processado: o prazo vencido sai no próximo avanço
+        index = max(int(deadline // self.tick), self.current + 1) % len(self.slots)
+        self.slots[index][key] = deadline
+        self.where[key] = index
+
+    def cancel(self, key):
+        """Remove o temporizador de `key`, se houver."""
+        index = self.where.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def advance(self, now):
+        """Avança até `now` e retorna as chaves vencidas (removidas da roda)."""
+        target = int(now // self.tick)
+        if target <= self.current:
+            return []
+        # Mais de uma volta desde o último avanço: basta visitar cada posição uma vez
+        first = max(self.current + 1, target - len(self.slots) + 1)
+        self.current = target
+
+        expired = []
+        for tick in range(first, target + 1):
+            index = tick % len(self.slots)
+            slot = self.slots[index]
+            if not slot:
+                continue
+            self.slots[index] = {}
+            for key, deadline in slot.items():
+                if deadline <= now:
+                    del self.where[key]
+                    expired.append(key)
+                else:
+                    # Prazo em uma volta futura (ou ainda dentro do tick atual)
+                    self.where.pop(key)
+                    self.schedule(key, deadline)
+        return expired
@@ -0,0 +1,105 @@
+import struct
+from utils.codec import PreEncodedResponse, build_response, dumps, loads
+
+try:
+    import msgpack
+except ImportError:  # Sem msgpack: o corpo binário usa JSON compacto
+    msgpack = None
+
+# Cabeçalho dos frames binários: tamanho do corpo, código do tipo, código de status
+HEADER = struct.Struct("!IBH")
+
+# Códigos dos tipos de mensagem no formato binário (0 = erro de protocolo)
+TYPE_CODES = {
+    "error": 0,
+    "START": 1,
+    "LOGIN": 2,
+    "NAVIGATION": 3,
+    "SELECTION_STATION": 4,
+    "PAYMENT": 5,
+    "NEAREST_STATIONS": 6,
+    "STATION_STATUS": 7,
+    "BATCH": 8,
+    "METRICS": 9,
+    "SUBSCRIBE_STATIONS": 10,
+    "STATIONS_DELTA": 11  # Enviado pelo servidor às conexões inscritas
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+# Codificações do corpo em ordem de preferência do servidor: nome -> (serializar, desserializar)
+ENCODINGS = {}
+if msgpack is not None:
+    ENCODINGS["msgpack"] = (msgpack.packb, msgpack.unpackb)
+ENCODINGS["json"] = (dumps, loads)  # orjson/ujson quando instalados (ver utils/codec.py)
+
+
+class BinaryCodec:
+    def __init__(self, encoding):
+        """Framing com prefixo de tamanho e envelope compacto para uma conexão."""
+        self.encoding = encoding
+        self.dumps, self.loads = ENCODINGS[encoding]
+
+    def frames(self, buffer):
+        """Gera (tipo, status, corpo) dos frames completos no FrameBuffer."""
+        return buffer.prefixed_frames(HEADER)
+
+    def decode_request(self, frame):
+        """Reconstrói a requisição no formato do controller (sem timestamp nem mensagem de status).
+
+        Sem envelope no frame, a idempotency_key opcional segue no corpo e é movida para o envelope.
+        """
+        _, type_code, status_code, body = frame
+        data = self.loads(body) if body else {}
+        if not isinstance(data, dict):
+            raise ValueError("corpo da requisição deve ser um objeto")
+        request = {
+            "type": TYPE_NAMES.get(type_code),
+            "data": data,
+            "status": {"code": status_code, "message": ""},
+            "timestamp": ""
+        }
+        if "idempotency_key" in data:
+            request["idempotency_key"] = data.pop("idempotency_key")
+        return request
+
+    def encode_response(self, response):
+        """Serializa a resposta como cabeçalho + [data, mensagem de status]; o timestamp é omitido."""
+        if isinstance(response, PreEncodedResponse):
+            # Corpo constante (ex.: START): serializado uma única vez por codificação
+            cache = response.template.encoded
+            if self.encoding not in cache:
+                cache[self.encoding] = self._pack(response)
+            return cache[self.encoding]
+        return self._pack(response)
+
+    def _pack(self, response):
+        status = response.get("status", {})
+        body = self.dumps([response.get("data", {}), status.get("message", "")])
+        return HEADER.pack(len(body), TYPE_CODES.get(response.get("type"), 0), status.get("code", 200)) + body
+
+
+def negotiate(request):
+    """Trata o handshake HELLO. Retorna (resposta JSON, BinaryCodec ou None para continuar em JSON)."""
+    data = request.get("data")
+    data = data if isinstance(data, dict) else {}
+    protocol = data.get("protocol", "json")
+    if protocol == "json":
+        return _hello_response({"protocol": "json"}, 200, "Sucesso"), None
+    if protocol != "binary":
+        return _hello_response({"protocol": "json"}, 400, f"Protocolo desconhecido: {protocol}"), None
+
+    # Primeira codificação do cliente que o servidor suporta (msgpack exige o pacote instalado)
+    offered = data.get("encodings") or list(ENCODINGS)
+    encoding = next((name for name in offered if isinstance(name, str) and name in ENCODINGS), None)
+    if encoding is None:
+        return _hello_response(
+            {"protocol": "json", "encodings": list(ENCODINGS)}, 400, "Nenhuma codificação suportada"
+        ), None
+    return _hello_response(
+        {"protocol": "binary", "encoding": encoding, "types": TYPE_CODES}, 200, "Sucesso"
+    ), BinaryCodec(encoding)
+
+
+def _hello_response(data, code, message):
+    return build_response("HELLO", data, code, message)